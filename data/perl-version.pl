@@ -18,11 +18,12 @@ my $client = IO::Socket::UNIX->new(
 
 $client->autoflush(1);
 
+# send module version so cached results can be invalidated on updates
+$client->send("$Gentoo::PerlMod::Version::VERSION\n");
+
+# normalize newline-separated versions, replying with one version per line
 while (my $line = <$client>) {
-	if (defined $line) {
-		chomp($line);
-		my $version = gentooize_version($line);
-		$client->send(sprintf("%02d", length $version));
-		$client->send($version);
-	}
+	chomp($line);
+	my $version = gentooize_version($line);
+	$client->send("$version\n");
 }
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
 from distutils import log
 from distutils.command import install_data as dst_install_data
 from distutils.util import byte_compile
@@ -49,37 +48,17 @@ def write_obj_lists(python_base, install_prefix):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     log.info(f'writing config to {path!r}')
 
-    # hack to drop quotes on modules in generated files
-    class _kls(object):
-        def __init__(self, module):
-            self.module = module
-        def __repr__(self):
-            return self.module
-
     with pkgdist.syspath(pkgdist.PACKAGEDIR):
         from pkgcheck import objects
 
-    modules = defaultdict(set)
-    objs = defaultdict(list)
-    for obj in ('KEYWORDS', 'CHECKS', 'REPORTERS'):
-        for name, cls in getattr(objects, obj).items():
-            parent, module = cls.__module__.rsplit('.', 1)
-            modules[parent].add(module)
-            objs[obj].append((name, _kls(f'{module}.{name}')))
-
-    keywords = tuple(objs['KEYWORDS'])
-    checks = tuple(objs['CHECKS'])
-    reporters = tuple(objs['REPORTERS'])
-
     with open(path, 'w') as f:
         os.chmod(path, 0o644)
-        for k, v in sorted(modules.items()):
-            f.write(f"from {k} import {', '.join(sorted(v))}\n")
-        f.write(dedent(f"""\
-            KEYWORDS = {keywords}
-            CHECKS = {checks}
-            REPORTERS = {reporters}
-        """))
+        # registries map object names to their modules and related metadata,
+        # allowing objects to be selected without importing their modules
+        for obj in ('KEYWORDS', 'CHECKS', 'ADDONS', 'REPORTERS'):
+            registry = getattr(objects, obj)
+            data = {k: registry.data(k) for k in registry}
+            f.write(f'{obj} = {data!r}\n')
 
         # write install path constants to config
         if install_prefix != os.path.abspath(sys.prefix):
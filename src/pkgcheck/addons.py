@@ -1,26 +1,43 @@
 """Addon functionality shared by multiple checkers."""
 
+import concurrent.futures
+import hashlib
+import io
 import os
 import pickle
+import re
 import stat
-from collections import UserDict, defaultdict
+import subprocess
+from collections import OrderedDict, UserDict, defaultdict
 from functools import partial
 from itertools import chain, filterfalse
-
-from pkgcore.ebuild import domain, misc
+from operator import attrgetter, itemgetter
+from typing import NamedTuple, Optional, Pattern
+
+from lxml import etree
+from pkgcore import cache as cache_mod
+from pkgcore import const as pkgcore_const
+from pkgcore.cache import fs_template
+from pkgcore.ebuild import domain, misc, processor
 from pkgcore.ebuild import profiles as profiles_mod
+from pkgcore.ebuild.atom import atom as atom_cls
+from pkgcore.ebuild.digest import parse_manifest
+from pkgcore.package.errors import MetadataException, ParseChksumError
 from pkgcore.restrictions import packages, values
+from snakeoil import chksum
 from snakeoil.cli.exceptions import UserException
 from snakeoil.containers import ProtectedSet
 from snakeoil.decorators import coroutine
 from snakeoil.klass import jit_attr
 from snakeoil.mappings import ImmutableDict
 from snakeoil.osutils import pjoin
+from snakeoil.process import spawn
 from snakeoil.sequences import iflatten_instance
 from snakeoil.strings import pluralism
 
 from . import base, caches, results
 from .log import logger
+from .utils import is_binary
 
 
 class ArchesAddon(base.Addon):
@@ -531,6 +548,63 @@ class StableArchesAddon(base.Addon):
         self.options.stable_arches = stable_arches
 
 
+class KeywordsAddon(base.Addon):
+    """Keyword tables for the target repo's arches shared by keyword-related checks.
+
+    The valid keyword forms for all known arches are built once per scan.
+    Splitting and sorting package keywords are cached by KEYWORDS value since
+    the same values are repeated across large numbers of packages.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.arches = frozenset(self.options.target_repo.known_arches)
+        self.stable = self.arches
+        self.unstable = frozenset(f'~{x}' for x in self.arches)
+        self.disabled = frozenset(f'-{x}' for x in self.arches)
+        self.special = frozenset(['-*'])
+        self.valid = self.special | self.stable | self.unstable | self.disabled
+        self._sort_keys = {}
+        self._sorted = {}
+        self._split = {}
+
+    def sort_key(self, keyword):
+        """Key sorting keywords by arch with prefix keywords after regular arches."""
+        try:
+            return self._sort_keys[keyword]
+        except KeyError:
+            arch, _, prefix = keyword.lstrip('~-').partition('-')
+            key = self._sort_keys[keyword] = (prefix, arch)
+            return key
+
+    def sort(self, keywords):
+        """Return keywords sorted in the proper order."""
+        if not isinstance(keywords, tuple):
+            return tuple(sorted(keywords, key=self.sort_key))
+        try:
+            return self._sorted[keywords]
+        except KeyError:
+            sorted_keywords = self._sorted[keywords] = tuple(sorted(keywords, key=self.sort_key))
+            return sorted_keywords
+
+    def split(self, keywords):
+        """Split keywords into sets of stable, unstable, and disabled arches."""
+        try:
+            return self._split[keywords]
+        except KeyError:
+            stable, unstable, disabled = set(), set(), set()
+            for keyword in keywords:
+                if keyword[0] == '~':
+                    unstable.add(keyword[1:])
+                elif keyword[0] == '-':
+                    disabled.add(keyword[1:])
+                else:
+                    stable.add(keyword)
+            split = self._split[keywords] = (
+                frozenset(stable), frozenset(unstable), frozenset(disabled))
+            return split
+
+
 class UnstatedIuse(results.VersionResult, results.Error):
     """Package is reliant on conditionals that aren't in IUSE."""
 
@@ -656,6 +730,1003 @@ class UseAddon(base.Addon):
         return vals, self._unstated_iuse(pkg, attr, unstated)
 
 
+class _LinePattern(NamedTuple):
+    """Line pattern registered with the line scanner."""
+    regex: Pattern
+    trigger: Optional[Pattern]
+    eapis: Optional[frozenset]
+    method: str
+    strip: bool
+    comments: bool
+
+
+class LineScannerAddon(base.Addon):
+    """Single-pass line scanner shared by ebuild content checks.
+
+    Checks register their line regexes during initialization, optionally
+    supplying a cheaper trigger regex that must match somewhere in a line for
+    the full regex to be run against it. Triggers for all patterns relevant to
+    a package's EAPI are combined into one regex so each ebuild is only walked
+    once with lines lacking any trigger matches skipped entirely. Matches are
+    cached for the last scanned package so all checks being fed the same
+    package share the same pass.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._patterns = []
+        self._matchers = {}
+        self._pkg = None
+        self._matches = None
+
+    def register(self, regex, trigger=None, eapis=None, method='match',
+                 strip=False, comments=True):
+        """Register a line regex, returning its key for match queries.
+
+        :param regex: compiled regex or pattern string to run against lines
+        :param trigger: optional regex that must match for the line to be scanned
+        :param eapis: optional iterable of EAPI strings the pattern applies to
+        :param method: regex method to run, either match, search, or finditer
+        :param strip: strip surrounding whitespace from lines before matching
+        :param comments: run the pattern against comment lines
+        """
+        if method not in ('match', 'search', 'finditer'):
+            raise ValueError(f'unknown regex method: {method!r}')
+        if isinstance(regex, str):
+            regex = re.compile(regex)
+        if isinstance(trigger, str):
+            trigger = re.compile(trigger)
+        if eapis is not None:
+            eapis = frozenset(map(str, eapis))
+        self._patterns.append(_LinePattern(regex, trigger, eapis, method, strip, comments))
+        # force matchers to be regenerated
+        self._matchers.clear()
+        self._pkg = None
+        return len(self._patterns) - 1
+
+    def _matcher(self, eapi):
+        """Return the combined trigger regex and relevant pattern keys for an EAPI."""
+        matcher = self._matchers.get(eapi)
+        if matcher is None:
+            keys = tuple(
+                i for i, p in enumerate(self._patterns)
+                if p.eapis is None or eapi in p.eapis)
+            triggers = {self._patterns[i].trigger for i in keys}
+            if None in triggers or not triggers:
+                # untriggered patterns require all lines to be scanned
+                combined = None
+            else:
+                combined = re.compile('|'.join(
+                    f'(?:{t.pattern})' for t in sorted(triggers, key=attrgetter('pattern'))))
+            matcher = self._matchers[eapi] = (combined, keys)
+        return matcher
+
+    def _scan(self, pkg):
+        """Run all registered patterns against a package's lines."""
+        combined, keys = self._matcher(str(pkg.eapi))
+        matches = {k: [] for k in keys}
+        patterns = [(k, self._patterns[k]) for k in keys]
+        for lineno, line in enumerate(pkg.lines, 1):
+            if combined is not None and combined.search(line) is None:
+                continue
+            stripped = line.strip()
+            comment = stripped[:1] == '#'
+            for k, p in patterns:
+                if comment and not p.comments:
+                    continue
+                if p.trigger is not None and p.trigger.search(line) is None:
+                    continue
+                s = stripped if p.strip else line
+                if p.method == 'finditer':
+                    matches[k].extend((lineno, s, m) for m in p.regex.finditer(s))
+                else:
+                    m = getattr(p.regex, p.method)(s)
+                    if m is not None:
+                        matches[k].append((lineno, s, m))
+        return matches
+
+    def matches(self, pkg, *keys):
+        """Yield (key, lineno, line, match) tuples for the given pattern keys.
+
+        Matches are ordered by line, then by the order of the given keys.
+        """
+        if pkg is not self._pkg:
+            self._matches = self._scan(pkg)
+            self._pkg = pkg
+        matches = []
+        for i, k in enumerate(keys):
+            matches.extend(
+                ((lineno, i), (k, lineno, line, m))
+                for lineno, line, m in self._matches.get(k, ()))
+        matches.sort(key=itemgetter(0))
+        for _sort_key, match in matches:
+            yield match
+
+
+class BashSyntaxAddon(base.Addon):
+    """Bash syntax checking via a long-lived bash worker process.
+
+    Instead of spawning bash from python for every file, file paths are
+    written to a persistent bash process over a pipe that runs syntax checks
+    for each path in turn and writes back the exit status and any errors
+    prefixed by their byte length.
+    """
+
+    _worker_script = (
+        'export LC_ALL=C\n'
+        'while IFS= read -r path; do\n'
+        '    err=$(bash -n -- "${path}" 2>&1)\n'
+        '    printf \'%d %d\\n%s\' "$?" "${#err}" "${err}"\n'
+        'done\n'
+    )
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._worker = None
+        self._worker_pid = None
+
+    @property
+    def worker(self):
+        """Bash worker process for the current process, started on demand."""
+        # workers can't be shared with forked scanning processes
+        if self._worker is None or self._worker_pid != os.getpid():
+            self._worker = subprocess.Popen(
+                ['bash', '-c', self._worker_script],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            self._worker_pid = os.getpid()
+        return self._worker
+
+    def _stop_worker(self):
+        """Kill the bash worker process if owned by the current process."""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._worker.kill()
+            self._worker.wait()
+        self._worker = None
+
+    def _worker_check(self, path):
+        """Return the exit status and output of a syntax check run by the worker."""
+        worker = self.worker
+        worker.stdin.write(path.encode() + b'\n')
+        worker.stdin.flush()
+        header = worker.stdout.readline()
+        if not header:
+            raise EOFError('worker exited')
+        ret, size = map(int, header.split())
+        output = worker.stdout.read(size)
+        if len(output) != size:
+            raise EOFError('truncated worker output')
+        return ret, output
+
+    def _check(self, path):
+        """Return the exit status and output of a syntax check, falling back to spawning bash."""
+        try:
+            return self._worker_check(path)
+        except (OSError, EOFError, ValueError) as e:
+            # the worker is restarted for the next file
+            logger.warning(f'bash syntax worker failed checking {path!r}: {e}')
+            self._stop_worker()
+        p = subprocess.run(
+            ['bash', '-n', '--', path], env={**os.environ, 'LC_ALL': 'C'},
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return p.returncode, p.stderr
+
+    def errors(self, path):
+        """Return the list of (lineno, error) tuples for bash syntax errors in a file."""
+        ret, output = self._check(path)
+
+        errors = []
+        if ret != 0:
+            prefix = f'{path}: '
+            for line in output.decode('utf-8', 'replace').splitlines():
+                if line.startswith(prefix):
+                    line = line[len(prefix):]
+                lineno, _sep, msg = line.partition(': ')
+                errors.append((lineno[5:], msg))
+        return errors
+
+    def __del__(self):
+        # at this point, we don't care about being nice to the bash worker
+        self._stop_worker()
+
+
+class _MetadataXmlCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached metadata.xml validation results."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = MetadataXmlAddon.cache
+
+
+class MetadataXmlAddon(base.Addon, caches.CachedAddon):
+    """Shared metadata.xml parsing and XML Schema validation support.
+
+    Parsed documents are cached per scanning process so checks handling the
+    same metadata.xml file only parse it once. Validation results for the
+    targeted category and package metadata.xml files are generated when
+    updating caches, before scanning processes are forked, and stored on disk
+    with the content digests of files passing validation along with the
+    digest of the schema used so unchanged files skip validation in all
+    scanning processes and later runs.
+    """
+
+    # max number of parsed documents to keep around
+    max_docs = 256
+
+    # cache registry
+    cache = caches.CacheData(type='metadata_xml', file='metadata_xml.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        # use xsd file installed with pkgcore
+        metadata_xsd = pjoin(pkgcore_const.DATA_PATH, 'xml-schema', 'metadata.xsd')
+        with open(metadata_xsd, 'rb') as f:
+            data = f.read()
+        self.schema = etree.XMLSchema(etree.parse(io.BytesIO(data), base_url=metadata_xsd))
+        self._schema_digest = hashlib.sha256(data).hexdigest()
+        self.repo = self.options.target_repo
+
+        self._docs = OrderedDict()
+        self._valid = set()
+
+    def _paths(self, pkgs):
+        """Yield the category and package metadata.xml files for the given packages."""
+        categories = set()
+        for cat, pkg in pkgs:
+            if cat not in categories:
+                categories.add(cat)
+                yield pjoin(self.repo.location, cat, 'metadata.xml')
+            yield pjoin(self.repo.location, cat, pkg, 'metadata.xml')
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        if not self.options.cache['metadata_xml']:
+            return
+
+        cache_file = self.cache_file(self.repo)
+        cached = {}
+        if not force:
+            cached = self.load_cache(cache_file, fallback={})
+
+        pkgs = _scan_pkgs(self.options, self.repo)
+        if pkgs is None:
+            pkgs = [(cat, pkg) for cat, pkgs in self.repo.packages.items() for pkg in pkgs]
+            entries = {}
+        else:
+            # keep entries for files that aren't targeted
+            entries = dict(cached)
+
+        for path in self._paths(pkgs):
+            entries.pop(path, None)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except (IOError, OSError):
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            # revalidate changed files and those validated with other schema versions
+            if cached.get(path) != (self._schema_digest, digest):
+                try:
+                    doc = etree.parse(io.BytesIO(data), base_url=path)
+                except etree.XMLSyntaxError:
+                    continue
+                if not self.schema.validate(doc):
+                    continue
+            entries[path] = (self._schema_digest, digest)
+
+        self._valid = {
+            digest for schema, digest in entries.values() if schema == self._schema_digest}
+        if entries != cached:
+            self.save_cache(_MetadataXmlCache(entries), cache_file)
+
+    def _parse(self, path):
+        """Return the content digest and parsed document or parsing exception for a file."""
+        entry = self._docs.get(path)
+        if entry is None:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except (IOError, OSError) as e:
+                entry = (None, e)
+            else:
+                digest = hashlib.sha256(data).hexdigest()
+                try:
+                    entry = (digest, etree.parse(io.BytesIO(data), base_url=path))
+                except etree.XMLSyntaxError as e:
+                    entry = (digest, e)
+            self._docs[path] = entry
+            if len(self._docs) > self.max_docs:
+                self._docs.popitem(last=False)
+        else:
+            self._docs.move_to_end(path)
+        return entry
+
+    def parse(self, path):
+        """Return the parsed document for a given metadata.xml file.
+
+        Raises the related IOError/OSError or XMLSyntaxError on failure.
+        """
+        _digest, doc = self._parse(path)
+        if isinstance(doc, Exception):
+            raise doc
+        return doc
+
+    def validate(self, path):
+        """Validate a given metadata.xml file, returning any schema errors."""
+        digest, doc = self._parse(path)
+        if isinstance(doc, Exception):
+            raise doc
+        if digest in self._valid:
+            return ()
+        if self.schema.validate(doc):
+            self._valid.add(digest)
+            return ()
+        return tuple(self.schema.error_log)
+
+
+class _EclassCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached package inheritance data."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = EclassAddon.cache
+
+
+class EclassAddon(base.Addon, caches.CachedAddon):
+    """Reverse eclass inheritance index for the target repo.
+
+    Inherited eclasses are pulled from md5-cache ``_eclasses_`` data when
+    the entry is current with its ebuild and eclasses, falling back to
+    regular package metadata otherwise. Per-version data is cached on disk
+    keyed by the related file modification times so later runs only
+    reprocess changed versions. The index is generated on first use.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='eclass', file='eclass.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+        self._pkgs = None
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _md5_cache_eclasses(self, path, ebuild_path, eclass_md5):
+        """Return the eclasses listed in a given md5-cache entry if it's current."""
+        try:
+            with open(path) as f:
+                entry = dict(x.rstrip('\n').split('=', 1) for x in f if '=' in x)
+            with open(ebuild_path, 'rb') as f:
+                ebuild_md5 = hashlib.md5(f.read()).hexdigest()
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('_md5_') != ebuild_md5:
+            return None
+        data = entry.get('_eclasses_', '').split('\t')
+        eclasses = dict(zip(data[::2], data[1::2]))
+        if any(eclass_md5(k) != v for k, v in eclasses.items()):
+            return None
+        return frozenset(eclasses)
+
+    def _update(self, force=False):
+        """Update the index, pushing changes to disk if caching is enabled."""
+        cache_file = self.cache_file(self.repo)
+        use_cache = self.options.cache['eclass']
+        cached = {}
+        if use_cache and not force:
+            cached = self.load_cache(cache_file, fallback={})
+
+        eclass_data = self.repo.eclass_cache.eclasses
+        eclass_mtimes = {k: v.mtime for k, v in eclass_data.items()}
+        eclass_md5s = {}
+
+        def eclass_md5(eclass):
+            md5 = eclass_md5s.get(eclass)
+            if md5 is None:
+                try:
+                    md5 = eclass_md5s[eclass] = f'{eclass_data[eclass].md5:032x}'
+                except KeyError:
+                    return None
+            return md5
+
+        pkgs = {}
+        updated = len(cached) == 0
+        md5_cache_dir = pjoin(self.repo.location, 'metadata', 'md5-cache')
+        for (category, package), versions in self.repo.versions.items():
+            for version in versions:
+                cpv = (category, package, version)
+                ebuild_path = pjoin(
+                    self.repo.location, category, package, f'{package}-{version}.ebuild')
+                md5_path = pjoin(md5_cache_dir, category, f'{package}-{version}')
+                key = (self._mtime(ebuild_path), self._mtime(md5_path))
+                entry = cached.get(cpv)
+                if entry is not None and entry[0] == key and all(
+                        eclass_mtimes.get(x) == mtime for x, mtime in entry[1].items()):
+                    pkgs[cpv] = entry
+                    continue
+
+                updated = True
+                eclasses = None
+                if key[1] is not None:
+                    eclasses = self._md5_cache_eclasses(md5_path, ebuild_path, eclass_md5)
+                if eclasses is None:
+                    try:
+                        pkg = next(self.repo.itermatch(
+                            atom_cls(f'={category}/{package}-{version}')))
+                        eclasses = frozenset(pkg.inherited)
+                    except (StopIteration, MetadataException):
+                        eclasses = frozenset()
+                pkgs[cpv] = (key, {x: eclass_mtimes.get(x) for x in eclasses})
+
+        self._pkgs = pkgs
+        if use_cache and (updated or len(pkgs) != len(cached)):
+            self.save_cache(_EclassCache(pkgs), cache_file)
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        # the index is only generated up front when forced, otherwise on first use
+        if force:
+            self._update(force=True)
+
+    @jit_attr
+    def index(self):
+        """Mapping of eclasses to the packages inheriting them."""
+        if self._pkgs is None:
+            self._update()
+        index = defaultdict(set)
+        for (category, package, _version), (_key, eclasses) in self._pkgs.items():
+            for eclass in eclasses:
+                index[eclass].add(f'{category}/{package}')
+        return ImmutableDict({k: frozenset(v) for k, v in index.items()})
+
+    def packages(self, eclass):
+        """Return the packages inheriting a given eclass."""
+        return self.index.get(eclass, frozenset())
+
+
+class _BinaryFileCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached binary file detection results."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = BinaryFileAddon.cache
+
+
+class BinaryFileAddon(base.Addon, caches.CachedAddon):
+    """Binary file detection for files in the target repo.
+
+    Detecting binary files requires reading the start of each file so results
+    are cached on disk keyed by each file's inode, modification time, and
+    size, allowing later runs to skip reading unchanged files. The cache is
+    populated while scanning and is safe to use from multiple threads.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='binary', file='binary.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+        self._files = {}
+
+    @jit_attr
+    def _cached(self):
+        """Previously cached detection results."""
+        if not self.options.cache['binary']:
+            return {}
+        return self.load_cache(self.cache_file(self.repo), fallback={})
+
+    def is_binary(self, path):
+        """Determine if a given file is binary, using cached results if possible."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return is_binary(path)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        entry = self._cached.get(path)
+        if entry is None or entry[0] != key:
+            entry = (key, is_binary(path))
+        self._files[path] = entry
+        return entry[1]
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        # the cache is only populated during scans since all files are read
+
+    def save(self):
+        """Push detection results for all checked files to disk."""
+        if not self.options.cache['binary'] or self._files == self._cached:
+            return
+        self.save_cache(_BinaryFileCache(self._files), self.cache_file(self.repo))
+
+
+def _scan_restricts(options):
+    """Return the package restrictions targeted by the current scan, None for all packages."""
+    try:
+        restrictions = options.restrictions
+    except AttributeError:
+        # running from cache subcommand
+        return None
+    # skip targets piped in via stdin, they can only be iterated over once
+    if not isinstance(restrictions, list):
+        return ()
+
+    restricts = []
+    for scope, restrict in restrictions:
+        if scope is base.repo_scope:
+            return None
+        elif scope > base.repo_scope:
+            # skip non-package targets, e.g. eclass or profiles scans
+            restricts.append(restrict)
+    return restricts
+
+
+def _scan_pkgs(options, repo):
+    """Return the packages targeted by the current scan, None for all packages."""
+    restricts = _scan_restricts(options)
+    if restricts is None:
+        return None
+    # Skip package filtering since it sources ebuilds, this runs in cache
+    # update threads where ebuild daemons can't be requested.
+    return {
+        (x.category, x.package)
+        for restrict in restricts for x in repo.itermatch(restrict, pkg_filter=None)}
+
+
+class _DigestCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached file digests."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = DigestAddon.cache
+
+
+class DigestAddon(base.Addon, caches.CachedAddon):
+    """File digests used for comparing file content.
+
+    Digests are git blob IDs so ones pulled from a git repo's index can be
+    used directly for unmodified files. For repos not managed by git, the
+    digests of package files directory entries sharing the same size within a
+    package are cached on disk before scanning, keyed by each file's inode,
+    modification time, and size.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='digest', file='digest.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+        self._digests = {}
+
+    @staticmethod
+    def blob_id(path):
+        """Return the git blob ID for a given file."""
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            chksum = hashlib.sha1(b'blob %d\0' % size)
+            for data in iter(partial(f.read, 65536), b''):
+                chksum.update(data)
+        return chksum.hexdigest()
+
+    def digest(self, path, blob=None):
+        """Return the digest for a given file.
+
+        :param path: path to the file
+        :param blob: known git blob ID for the file, e.g. from a git index
+        """
+        if blob is not None and len(blob) == 40:
+            return blob
+        st = os.stat(path)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        entry = self._digests.get(path)
+        if entry is None or entry[0] != key:
+            entry = self._digests[path] = (key, self.blob_id(path))
+        return entry[1]
+
+    def _candidates(self, pkgs):
+        """Generator of package files directory entries sharing the same size."""
+        for category, package in pkgs:
+            files_by_size = defaultdict(list)
+            filesdir = pjoin(self.repo.location, category, package, 'files')
+            for root, _dirs, files in os.walk(filesdir):
+                for filename in files:
+                    path = pjoin(root, filename)
+                    try:
+                        file_stat = os.lstat(path)
+                    except FileNotFoundError:
+                        continue
+                    if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size:
+                        files_by_size[file_stat.st_size].append(path)
+            for paths in files_by_size.values():
+                if len(paths) > 1:
+                    yield from paths
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        # git repos use index blob IDs for unmodified files
+        if (not self.options.cache['digest'] or
+                os.path.exists(pjoin(self.repo.location, '.git'))):
+            return
+
+        cache_file = self.cache_file(self.repo)
+        cached = {}
+        if not force:
+            cached = self.load_cache(cache_file, fallback={})
+
+        pkgs = _scan_pkgs(self.options, self.repo)
+        if pkgs is None:
+            pkgs = [(cat, pkg) for cat, pkgs in self.repo.packages.items() for pkg in pkgs]
+            digests = {}
+        else:
+            # keep entries for packages that aren't targeted
+            prefixes = tuple(pjoin(self.repo.location, cat, pkg, '') for cat, pkg in pkgs)
+            digests = {k: v for k, v in cached.items() if not k.startswith(prefixes)}
+
+        def update(path):
+            try:
+                self.digest(path)
+            except OSError:
+                pass
+
+        # reuse cached digests for unchanged files
+        self._digests = dict(cached)
+        paths = list(self._candidates(pkgs))
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            tuple(executor.map(update, paths))
+        digests.update((x, self._digests[x]) for x in paths if x in self._digests)
+        self._digests = digests
+
+        if digests != cached:
+            self.save_cache(_DigestCache(digests), cache_file)
+
+
+def _parse_manifest(path, gpg=False):
+    """Parse a given Manifest file, returning None on failure."""
+    try:
+        return tuple(parse_manifest(path, ignore_gpg=gpg))
+    except (EnvironmentError, ParseChksumError):
+        return None
+
+
+class _ManifestCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached Manifest data."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = ManifestAddon.cache
+
+
+class _IndexedManifest(NamedTuple):
+    """Manifest data from the index, providing pkgcore's Manifest attributes."""
+    thin: bool
+    distfiles: dict
+    aux_files: dict
+    ebuilds: dict
+    misc: dict
+
+
+class ManifestAddon(base.Addon, caches.CachedAddon):
+    """Index of parsed Manifest files for the targeted packages.
+
+    The index is built before scanning and is cached on disk keyed by each
+    Manifest's modification time and size so later runs only reparse changed
+    files. Packages with missing or invalid Manifest files aren't indexed,
+    falling back to regular parsing.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='manifest', file='manifest.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+        self._manifests = {}
+        self._index = None
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        use_cache = self.options.cache['manifest']
+        if not use_cache or force:
+            cached = {}
+        elif self._index is not None:
+            # reuse the index from a previous update, e.g. by the scan daemon
+            cached = self._index
+        else:
+            cached = self.load_cache(self.cache_file(self.repo), fallback={})
+        gpg = getattr(self.repo, 'enable_gpg', False)
+
+        pkgs = _scan_pkgs(self.options, self.repo)
+        if pkgs is None:
+            pkgs = [(cat, pkg) for cat, pkgs in self.repo.packages.items() for pkg in pkgs]
+            index = {}
+        else:
+            # keep entries for packages that aren't targeted
+            index = {k: v for k, v in cached.items() if k not in pkgs}
+
+        manifests = {}
+        for category, package in pkgs:
+            path = pjoin(self.repo.location, category, package, 'Manifest')
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = (st.st_mtime_ns, st.st_size)
+            entry = cached.get((category, package))
+            if entry is None or entry[0] != key:
+                data = _parse_manifest(path, gpg=gpg)
+                if data is None:
+                    continue
+                entry = (key, data)
+            manifests[(category, package)] = entry
+
+        self._manifests = manifests
+        index.update(manifests)
+        self._index = index
+        if use_cache and index != cached:
+            self.save_cache(_ManifestCache(index), self.cache_file(self.repo))
+
+    def manifest(self, pkg):
+        """Return the Manifest for a given package, using the index if possible."""
+        entry = self._manifests.get((pkg.category, pkg.package))
+        if entry is not None:
+            return _IndexedManifest(pkg.manifest.thin, *entry[1])
+        return pkg.manifest
+
+    def indexed(self, pkg):
+        """Determine if a given package's Manifest is indexed."""
+        return (pkg.category, pkg.package) in self._manifests
+
+    def distfiles(self, pkg):
+        """Return the mapping of distfiles to checksums for a given package."""
+        entry = self._manifests.get((pkg.category, pkg.package))
+        if entry is not None:
+            return entry[1][0]
+        return pkg.manifest.distfiles
+
+
+class _MetadataCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached ebuild metadata."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = MetadataCacheAddon.cache
+
+
+class _MetadataCacheDB(cache_mod.bulk):
+    """Ebuild metadata cache backend stored in the pkgcheck cache dir.
+
+    Entries are stored in md5-cache format and validated against their
+    ebuilds and eclasses the same way as a repo's md5-cache entries.
+    """
+
+    chf_type = 'md5'
+    eclass_chf_types = ('md5',)
+    # Flag the backend as committing its own updates, otherwise pkgcore
+    # rewrites the entire cache file every sync_rate updates. Instead,
+    # pending changes are pushed to disk via commit() after regeneration.
+    autocommits = True
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def _read_data(self):
+        return MetadataCacheAddon.load_cache(self.path, fallback={})
+
+    def _getitem(self, key):
+        # entries are stored serialized, matching the on-disk md5-cache format
+        d = dict(self.data[key])
+        d[self._chf_key] = self._chf_deserializer(d[self._chf_key])
+        return d
+
+    def _write_data(self):
+        MetadataCacheAddon.save_cache(_MetadataCache(self.data), self.path)
+
+
+class MetadataCacheAddon(base.Addon, caches.CachedAddon):
+    """Ebuild metadata regeneration run before scanning.
+
+    Packages targeted by a scan that lack current metadata cache entries are
+    sourced up front across a pool of persistent ebuild daemons instead of
+    lazily within each scanning process. A separate cache maintained by
+    pkgcheck is appended to the repo's metadata caches, so pkgcore stores
+    regenerated metadata in it unless one of the repo's caches is writable.
+    The pkgcheck cache is saved to disk for use by later runs.
+
+    Packages are considered stale if none of the repo's cache entries are
+    newer than their ebuilds and the pkgcheck cache lacks a valid entry for
+    them. Entries in the repo's caches that are outdated by eclass changes
+    are regenerated on demand during scanning.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='metadata', file='metadata.pickle', version=1)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+
+    def _pkgs(self):
+        """Yield the packages targeted by the scan, the entire repo otherwise."""
+        restricts = _scan_restricts(self.options)
+        if restricts is None:
+            restricts = [packages.AlwaysTrue]
+        for restrict in restricts:
+            yield from self.repo.itermatch(restrict, pkg_filter=None)
+
+    def _stale(self, pkg, cache_dirs, metadata_cache):
+        """Determine if a package lacks current metadata cache entries."""
+        try:
+            ebuild_mtime = os.stat(pkg.path).st_mtime
+        except OSError:
+            return False
+        for cache_dir in cache_dirs:
+            try:
+                if os.stat(pjoin(cache_dir, pkg.cpvstr)).st_mtime >= ebuild_mtime:
+                    return False
+            except OSError:
+                continue
+        # fall back to validating the pkgcheck cache entry against the ebuild and its eclasses
+        try:
+            entry = metadata_cache[pkg.cpvstr]
+        except KeyError:
+            return True
+        return not metadata_cache.validate_entry(
+            entry, chksum.LazilyHashedPath(pkg.path), self.repo.eclass_cache)
+
+    @staticmethod
+    def _regen(pkgs, force=False):
+        """Regenerate metadata for a sequence of packages using a dedicated ebuild daemon.
+
+        Daemons are spawned directly instead of being pulled from pkgcore's
+        shared pool since checking whether pooled daemons are alive relies on
+        signal handlers that can only be set in the main thread.
+        """
+        sandbox = spawn.is_sandbox_capable()
+        ebp = processor.EbuildProcessor(False, sandbox)
+        try:
+            for pkg in pkgs:
+                try:
+                    # Use pkgcore's internal metadata hook since it's the only
+                    # way to pass in a specific ebuild daemon, regular
+                    # attribute access pulls daemons from the shared pool.
+                    pkg._fetch_metadata(ebp=ebp, force_regen=force)
+                except MetadataException:
+                    # Sourcing failures are reported by checks during the
+                    # scan, but the daemon may be dead so replace it.
+                    ebp.shutdown_processor()
+                    ebp = processor.EbuildProcessor(False, sandbox)
+        finally:
+            # daemons are shut down so forked scanning processes don't share them
+            ebp.shutdown_processor()
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        if not self.options.cache['metadata'] or not hasattr(self.repo, 'package_class'):
+            return
+
+        # fall back to the pkgcheck metadata cache for regenerated entries
+        for metadata_cache in self.repo.cache:
+            if isinstance(metadata_cache, _MetadataCacheDB):
+                break
+        else:
+            metadata_cache = _MetadataCacheDB(self.cache_file(self.repo))
+            self.repo.cache += (metadata_cache,)
+            # recreate the package factory the same way the repo does so it uses the new cache
+            self.repo.package_class = self.repo.package_factory(
+                self.repo, self.repo.cache, self.repo.eclass_cache,
+                self.repo.mirrors, self.repo.default_mirrors)
+        if force:
+            metadata_cache.data.clear()
+
+        if force:
+            stale = list(self._pkgs())
+        else:
+            cache_dirs = [
+                x.location for x in self.repo.cache if isinstance(x, fs_template.FsBased)]
+            stale = [x for x in self._pkgs() if self._stale(x, cache_dirs, metadata_cache)]
+
+        if stale:
+            jobs = min(getattr(self.options, 'jobs', None) or os.cpu_count(), len(stale))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(self._regen, stale[i::jobs], force)
+                    for i in range(jobs)]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+
+        metadata_cache.commit(force=force)
+
+
+class _PkgCostCache(UserDict, caches.Cache):
+    """Class used to encapsulate cached package scanning costs."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._cache = PkgCostAddon.cache
+
+
+class PkgCostAddon(base.Addon, caches.CachedAddon):
+    """Per-package scanning cost estimates used for scheduling.
+
+    Costs are the scanning times of packages during previous runs, packages
+    lacking timings are estimated from their number of versions and ebuild
+    sizes. Estimates are converted to times using the ratio between timings
+    and estimates of packages that were timed for the first time.
+    """
+
+    # cache registry
+    cache = caches.CacheData(type='costs', file='costs.pickle', version=1)
+
+    # estimated cost of loading a package version in terms of ebuild bytes
+    version_cost = 4096
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.repo = self.options.target_repo
+
+    @jit_attr
+    def _cached(self):
+        """Previously cached costs."""
+        if not self.options.cache['costs']:
+            return {}
+        return self.load_cache(self.cache_file(self.repo), fallback={})
+
+    def estimate(self, key):
+        """Estimate the cost of a given package from its ebuilds."""
+        estimate = 0
+        try:
+            with os.scandir(pjoin(self.repo.location, key)) as it:
+                for entry in it:
+                    if entry.name.endswith('.ebuild'):
+                        estimate += self.version_cost + entry.stat().st_size
+        except OSError:
+            pass
+        return estimate
+
+    def costs(self, keys):
+        """Return the costs in seconds for a given sequence of package keys."""
+        timings = self._cached.get('timings', {})
+        rate = self._cached.get('rate', 1e-6)
+        costs = []
+        for key in keys:
+            cost = timings.get(key)
+            if cost is None:
+                cost = self.estimate(key) * rate
+            costs.append(cost)
+        return costs
+
+    def update_cache(self, output_lock, force=False):
+        """Update related cache and push updates to disk."""
+        # the cache is only populated during scans since packages are timed
+
+    def update(self, timings):
+        """Merge package timings from a scan and push them to disk."""
+        if not self.options.cache['costs'] or not timings:
+            return
+
+        cached_timings = self._cached.get('timings', {})
+        data = {
+            'timings': {**cached_timings, **timings},
+            'rate': self._cached.get('rate', 1e-6),
+        }
+        # recalibrate estimates using the timings of newly timed packages
+        estimated = [
+            (timing, self.estimate(key)) for key, timing in timings.items()
+            if key not in cached_timings]
+        estimates = sum(x[1] for x in estimated)
+        if estimates:
+            data['rate'] = sum(x[0] for x in estimated) / estimates
+
+        self.save_cache(_PkgCostCache(data), self.cache_file(self.repo))
+
+
 class NetAddon(base.Addon):
     """Addon supporting network functionality."""
 
@@ -0,0 +1,140 @@
+"""Support for aggregating large amounts of intermediate check data."""
+
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from itertools import groupby
+from operator import itemgetter
+
+
+def _remove_dir(path, pid):
+    """Remove a temporary run directory if owned by the current process."""
+    # forked processes share the directory with the process that created it
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class Aggregator:
+    """Group values by key, spilling sorted runs to disk to bound memory usage.
+
+    Key/value pairs are buffered in memory until the buffer limit is reached,
+    at which point they're sorted by key and written to a run file in a
+    temporary directory. Iterating over the grouped items merges all runs and
+    the buffer, yielding keys in sorted order with their values in insertion
+    order.
+
+    Instances are picklable so they can be used as partial states for
+    map-reduce checks. Aggregators should be created before scanning
+    processes are forked so their runs are written to a directory shared
+    with and owned by the parent process. The directory is removed when the
+    aggregator is closed, either explicitly or when used as a context
+    manager, falling back to removal when the aggregator is garbage
+    collected or the interpreter exits.
+    """
+
+    # maximum number of key/value pairs held in memory
+    limit = 100000
+    # number of pairs serialized per pickle chunk in run files
+    _chunk_size = 1024
+
+    def __init__(self, limit=None):
+        if limit is not None:
+            self.limit = limit
+        self._buffer = []
+        self._runs = []
+        self._open()
+
+    def _open(self):
+        """Create the temporary directory holding run files."""
+        self._dir = tempfile.mkdtemp(prefix='pkgcheck-')
+        self._finalizer = weakref.finalize(self, _remove_dir, self._dir, os.getpid())
+
+    def _ensure_dir(self):
+        """Recreate the run directory if the aggregator was closed."""
+        if self._finalizer is None or not self._finalizer.alive:
+            self._open()
+
+    def __getstate__(self):
+        # unpickled copies don't own the run directory
+        state = self.__dict__.copy()
+        state['_finalizer'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._buffer) + sum(x[1] for x in self._runs)
+
+    def add(self, key, value):
+        """Add a value for a given key."""
+        self._buffer.append((key, value))
+        if len(self._buffer) >= self.limit:
+            self._spill()
+
+    def update(self, other):
+        """Merge the data from another aggregator, taking ownership of its runs."""
+        if other._runs:
+            self._ensure_dir()
+        for path, size in other._runs:
+            if os.path.dirname(path) != self._dir:
+                # move runs from separately created aggregators
+                fd, new_path = tempfile.mkstemp(suffix='.run', dir=self._dir)
+                os.close(fd)
+                os.replace(path, new_path)
+                path = new_path
+            self._runs.append((path, size))
+        other._runs = []
+        for key, value in other._buffer:
+            self.add(key, value)
+
+    def _spill(self):
+        """Write the sorted buffer to a temporary run file."""
+        self._ensure_dir()
+        fd, path = tempfile.mkstemp(suffix='.run', dir=self._dir)
+        items = sorted(self._buffer, key=itemgetter(0))
+        with os.fdopen(fd, 'wb') as f:
+            for i in range(0, len(items), self._chunk_size):
+                pickle.dump(items[i:i + self._chunk_size], f, pickle.HIGHEST_PROTOCOL)
+        self._runs.append((path, len(items)))
+        self._buffer = []
+
+    @staticmethod
+    def _load(path):
+        """Iterate over the key/value pairs from a run file."""
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    yield from pickle.load(f)
+                except EOFError:
+                    break
+
+    def items(self):
+        """Iterate over all keys in sorted order alongside their list of values."""
+        runs = [self._load(path) for path, _size in self._runs]
+        runs.append(sorted(self._buffer, key=itemgetter(0)))
+        # merging is stable so values retain their insertion order
+        for key, group in groupby(heapq.merge(*runs, key=itemgetter(0)), itemgetter(0)):
+            yield key, [value for _key, value in group]
+
+    def clear(self):
+        """Remove all data, including run files."""
+        for path, _size in self._runs:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._runs = []
+        self._buffer = []
+
+    def close(self):
+        """Remove all data along with the run directory if owned by the aggregator."""
+        self.clear()
+        if self._finalizer is not None:
+            self._finalizer()
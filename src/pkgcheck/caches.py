@@ -4,6 +4,7 @@ import concurrent.futures
 import errno
 import os
 import pathlib
+import pickle
 import shutil
 import threading
 from operator import attrgetter
@@ -15,6 +16,7 @@ from snakeoil.mappings import ImmutableDict
 from snakeoil.osutils import pjoin
 
 from . import const
+from .log import logger
 
 
 class CacheData(NamedTuple):
@@ -63,6 +65,40 @@ class CachedAddon(metaclass=_RegisterCache):
         """Return the cache file for a given repository."""
         return pjoin(self.cache_dir(repo), self.cache.file)
 
+    @classmethod
+    def load_cache(cls, path, fallback=None):
+        """Return the data stored in a given cache file.
+
+        The fallback is returned if the file is missing, unreadable, or was
+        created by an outdated cache version.
+        """
+        try:
+            with open(path, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.version == cls.cache.version:
+                return cache.data
+            logger.debug('forcing %s cache regen due to outdated version', cls.cache.type)
+        except FileNotFoundError:
+            pass
+        except (AttributeError, EOFError, ImportError, IndexError,
+                OSError, pickle.UnpicklingError) as e:
+            logger.debug('forcing %s cache regen: %s', cls.cache.type, e)
+        return fallback
+
+    @classmethod
+    def save_cache(cls, data, path):
+        """Dump a given cache object to a cache file."""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temporary file first since multiple processes may update the cache
+            tmp_file = f'{path}.{os.getpid()}'
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(data, f)
+            os.replace(tmp_file, path)
+        except OSError as e:
+            raise UserException(
+                f'failed dumping {cls.cache.type} cache: {path!r}: {e.strerror}')
+
     @classmethod
     def existing(cls):
         """Mapping of all existing cache types to file paths."""
@@ -17,6 +17,7 @@ class Check(feeds.Feed):
     :cvar scope: scope relative to the package repository the check runs under
     :cvar source: source of feed items
     :cvar known_results: result keywords the check can possibly yield
+    :cvar pkg_attrs: package attributes used by the check, None if unknown
     """
 
     # check priority that affects runtime ordering
@@ -24,6 +25,7 @@ class Check(feeds.Feed):
     # flag to allow package feed filtering
     _filtering = True
     known_results = frozenset()
+    pkg_attrs = None
 
     @klass.jit_attr
     def priority(self):
@@ -67,6 +69,38 @@ class Check(feeds.Feed):
         return self.priority < other.priority
 
 
+class MapReduceCheck(Check):
+    """Repo-level check aggregating per-package data that can be split across processes.
+
+    Feeding items maps them into the check's partial state, allowing the
+    pipeline to feed separate package partitions to forked copies of the check
+    in parallel. The partial states of all copies are then merged into the
+    original check via :py:meth:`reduce` before :py:meth:`finish` is called
+    in order to generate results.
+
+    Checks only aggregating data implement :py:meth:`map`, while checks also
+    reporting results for individual items override :py:meth:`feed` instead.
+    """
+
+    scope = base.repo_scope
+
+    def feed(self, item):
+        self.map(item)
+        yield from ()
+
+    def map(self, item):
+        """Map a given item into the check's partial state."""
+        raise NotImplementedError(self.map)
+
+    def state(self):
+        """Return the picklable, partial state mapped from all fed items."""
+        raise NotImplementedError(self.state)
+
+    def reduce(self, state):
+        """Merge a partial state from another copy of the check."""
+        raise NotImplementedError(self.reduce)
+
+
 class GentooRepoCheck(Check):
     """Check that is only run against the gentoo repo."""
 
@@ -160,10 +194,15 @@ class SkipOptionalCheck(UserException):
         super().__init__(f'{check_name}: {msg}')
 
 
-def init_checks(enabled_addons, options):
-    """Initialize selected checks."""
+def init_checks(enabled_addons, options, addons_map=None):
+    """Initialize selected checks.
+
+    Previously initialized addons can be passed in via ``addons_map`` in
+    order to reuse them.
+    """
     enabled = defaultdict(lambda: defaultdict(list))
-    addons_map = {}
+    if addons_map is None:
+        addons_map = {}
     source_map = {}
     caches = []
 
@@ -172,6 +211,7 @@ def init_checks(enabled_addons, options):
     else:
         _disabled, selected_checks = [], []
 
+    checks = []
     for cls in enabled_addons:
         try:
             addon = addons.init_addon(cls, options, addons_map)
@@ -180,12 +220,25 @@ def init_checks(enabled_addons, options):
                 raise
             continue
         if isinstance(addon, Check):
-            source = source_map.get(addon.source)
-            if source is None:
-                source = sources.init_source(addon.source, options, addons_map)
-                source_map[addon.source] = source
-            exec_type = 'async' if isinstance(addon, AsyncCheck) else 'sync'
-            enabled[addon.scope][(source, exec_type)].append(addon)
+            checks.append(addon)
         if isinstance(addon, CachedAddon):
             caches.append(addon)
+
+    # determine the package attributes used by all checks sharing a source
+    pkg_attrs = {}
+    for check in checks:
+        attrs = pkg_attrs.get(check.source, frozenset())
+        if attrs is not None and check.pkg_attrs is not None:
+            pkg_attrs[check.source] = attrs | check.pkg_attrs
+        else:
+            pkg_attrs[check.source] = None
+
+    for check in checks:
+        source = source_map.get(check.source)
+        if source is None:
+            source = sources.init_source(
+                check.source, options, addons_map, pkg_attrs[check.source])
+            source_map[check.source] = source
+        exec_type = 'async' if isinstance(check, AsyncCheck) else 'sync'
+        enabled[check.scope][(source, exec_type)].append(check)
     return enabled, caches
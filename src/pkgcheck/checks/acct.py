@@ -1,15 +1,14 @@
 """Various checks for acct-group and acct-user packages."""
 
 import re
-from collections import defaultdict
-from functools import partial
-from itertools import chain
 
 from pkgcore.ebuild import restricts
+from pkgcore.ebuild.cpv import VersionedCPV
 from pkgcore.restrictions import packages
 
 from .. import base, results, sources
-from . import Check
+from ..aggregate import Aggregator
+from . import MapReduceCheck
 
 
 class MissingAccountIdentifier(results.VersionResult, results.Warning):
@@ -55,7 +54,7 @@ class OutsideRangeAccountIdentifier(results.VersionResult, results.Error):
             f"static allocation range (0..499, 60001+)")
 
 
-class AcctCheck(Check):
+class AcctCheck(MapReduceCheck):
     """Various checks for acct-* packages.
 
     Verify that acct-* packages do not use conflicting, invalid or out-of-range
@@ -75,8 +74,8 @@ class AcctCheck(Check):
         super().__init__(*args)
         self.id_re = re.compile(
             r'ACCT_(?P<var>USER|GROUP)_ID=(?P<quot>[\'"]?)(?P<id>[0-9]+)(?P=quot)')
-        self.seen_uids = defaultdict(partial(defaultdict, list))
-        self.seen_gids = defaultdict(partial(defaultdict, list))
+        self.seen_uids = Aggregator()
+        self.seen_gids = Aggregator()
         self.category_map = {
             'acct-user': (self.seen_uids, 'USER', (65534,)),
             'acct-group': (self.seen_gids, 'GROUP', (65533, 65534)),
@@ -104,12 +103,21 @@ class AcctCheck(Check):
             yield OutsideRangeAccountIdentifier(expected_var.lower(), found_id, pkg=pkg)
             return
 
-        seen_id_map[found_id][pkg.key].append(pkg)
+        # store bare CPVs so partial states can be pickled
+        seen_id_map.add(found_id, VersionedCPV(pkg.cpvstr))
+
+    def state(self):
+        return self.seen_uids, self.seen_gids
+
+    def reduce(self, state):
+        for seen, partial_seen in zip((self.seen_uids, self.seen_gids), state):
+            seen.update(partial_seen)
 
     def finish(self):
         # report overlapping ID usage
         for seen, expected_var, _ids in self.category_map.values():
-            for found_id, pkgs in sorted(seen.items()):
-                if len(pkgs) > 1:
-                    pkgs = (x.cpvstr for x in sorted(chain.from_iterable(pkgs.values())))
-                    yield ConflictingAccountIdentifiers(expected_var.lower(), found_id, pkgs)
+            with seen:
+                for found_id, pkgs in seen.items():
+                    if len({x.key for x in pkgs}) > 1:
+                        pkgs = (x.cpvstr for x in sorted(pkgs))
+                        yield ConflictingAccountIdentifiers(expected_var.lower(), found_id, pkgs)
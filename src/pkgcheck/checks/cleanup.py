@@ -33,6 +33,7 @@ class RedundantVersionCheck(Check):
     scope = base.package_scope
     _source = sources.PackageRepoSource
     known_results = frozenset([RedundantVersion])
+    pkg_attrs = frozenset(['fullver', 'keywords', 'live', 'slot'])
 
     def feed(self, pkgset):
         if len(pkgset) == 1:
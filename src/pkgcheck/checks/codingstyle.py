@@ -4,12 +4,11 @@ import re
 from collections import defaultdict
 
 from pkgcore.ebuild.eapi import EAPI
-from snakeoil.klass import jit_attr
 from snakeoil.mappings import ImmutableDict
 from snakeoil.sequences import stable_unique
 from snakeoil.strings import pluralism
 
-from .. import results, sources
+from .. import addons, results, sources
 from . import Check
 
 PREFIX_VARIABLES = ('EROOT', 'ED', 'EPREFIX')
@@ -65,45 +64,32 @@ class BadCommandsCheck(Check):
     """Scan ebuild for various deprecated and banned command usage."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([DeprecatedEapiCommand, BannedEapiCommand])
 
     CMD_USAGE_REGEX = r'^(\s*|.*[|&{{(]+\s*)\b(?P<cmd>{})(?!\.)\b'
 
-    def _cmds_regex(self, cmds):
-        return re.compile(self.CMD_USAGE_REGEX.format(r'|'.join(cmds)))
-
-    @jit_attr
-    def regexes(self):
-        d = {}
+    def __init__(self, *args, line_scanner_addon):
+        super().__init__(*args)
+        self.scanner = line_scanner_addon
+        self.regexes = {}
         for eapi_str, eapi in EAPI.known_eapis.items():
-            regexes = []
-            if eapi.bash_cmds_banned:
-                regexes.append((
-                    self._cmds_regex(eapi.bash_cmds_banned),
-                    BannedEapiCommand,
-                    {'eapi': eapi_str},
-                ))
-            if eapi.bash_cmds_deprecated:
-                regexes.append((
-                    self._cmds_regex(eapi.bash_cmds_deprecated),
-                    DeprecatedEapiCommand,
-                    {'eapi': eapi_str},
-                ))
-            d[eapi_str] = tuple(regexes)
-        return ImmutableDict(d)
+            keys = []
+            for cmds, result_cls in (
+                    (eapi.bash_cmds_banned, BannedEapiCommand),
+                    (eapi.bash_cmds_deprecated, DeprecatedEapiCommand)):
+                if cmds:
+                    cmds = r'|'.join(sorted(cmds))
+                    key = self.scanner.register(
+                        self.CMD_USAGE_REGEX.format(cmds), trigger=rf'\b(?:{cmds})\b',
+                        eapis=(eapi_str,), strip=True, comments=False)
+                    self.regexes[key] = (result_cls, {'eapi': eapi_str})
+        self.regexes = ImmutableDict(self.regexes)
 
     def feed(self, pkg):
-        regexes = self.regexes[str(pkg.eapi)]
-        for lineno, line in enumerate(pkg.lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-            if line[0] != '#':
-                for regex, result_cls, kwargs in regexes:
-                    match = regex.match(line)
-                    if match is not None:
-                        yield result_cls(
-                            match.group('cmd'), line=line, lineno=lineno, pkg=pkg, **kwargs)
+        for key, lineno, line, match in self.scanner.matches(pkg, *self.regexes):
+            result_cls, kwargs = self.regexes[key]
+            yield result_cls(match.group('cmd'), line=line, lineno=lineno, pkg=pkg, **kwargs)
 
 
 class MissingSlash(results.VersionResult, results.Error):
@@ -163,6 +149,7 @@ class PathVariablesCheck(Check):
     """Scan ebuild for path variables with various issues."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([MissingSlash, UnnecessarySlashStrip, DoublePrefixInPath])
     prefixed_dir_functions = (
         'insinto', 'exeinto',
@@ -203,55 +190,56 @@ class PathVariablesCheck(Check):
         'PYTHON_CONFIG', 'PYTHON_SCRIPTDIR',
     )
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
-        self.missing_regex = re.compile(r'(\${(%s)})"?\w+/' % r'|'.join(PATH_VARIABLES))
-        self.unnecessary_regex = re.compile(r'(\${(%s)%%/})' % r'|'.join(PATH_VARIABLES))
-        self.double_prefix_regex = re.compile(
+        self.scanner = line_scanner_addon
+        path_vars = r'|'.join(PATH_VARIABLES)
+        prefix_vars = r'|'.join(PREFIX_VARIABLES)
+        dir_functions = r'|'.join(self.prefixed_dir_functions)
+        getters = r'|'.join(self.prefixed_getters)
+        rhs_variables = r'|'.join(self.prefixed_rhs_variables)
+
+        # skip EAPIs that don't require trailing slashes
+        eapis = [k for k, v in EAPI.known_eapis.items() if not v.options.trailing_slash]
+        self.missing_key = self.scanner.register(
+            r'(\${(%s)})"?\w+/' % path_vars, trigger=r'\${(?:%s)}' % path_vars,
+            eapis=eapis, method='search', strip=True)
+        self.unnecessary_key = self.scanner.register(
+            r'(\${(%s)%%/})' % path_vars, trigger=r'\${(?:%s)%%/}' % path_vars,
+            eapis=eapis, method='search', strip=True)
+
+        # flag double path prefix usage on uncommented lines only
+        self.double_prefix_key = self.scanner.register(
             r'(\${(%s)(%%/)?}/?\$(\((%s)\)|{(%s)}))' % (
-                r'|'.join(PREFIX_VARIABLES),
-                r'|'.join(self.prefixed_getters),
-                r'|'.join(self.prefixed_rhs_variables)))
-        self.double_prefix_func_regex = re.compile(
+                prefix_vars, getters, rhs_variables),
+            trigger=r'\${(?:%s)' % prefix_vars,
+            method='search', strip=True, comments=False)
+        self.double_prefix_func_key = self.scanner.register(
             r'\b(%s)\s[^&|;]*\$(\((%s)\)|{(%s)})' % (
-                r'|'.join(self.prefixed_dir_functions),
-                r'|'.join(self.prefixed_getters),
-                r'|'.join(self.prefixed_rhs_variables)))
+                dir_functions, getters, rhs_variables),
+            trigger=r'\b(?:%s)\s' % dir_functions,
+            method='search', strip=True, comments=False)
         # do not catch ${foo#${EPREFIX}} and similar
         self.double_prefix_func_false_positive_regex = re.compile(
-            r'.*?[#]["]?\$(\((%s)\)|{(%s)})' % (
-                r'|'.join(self.prefixed_getters),
-                r'|'.join(self.prefixed_rhs_variables)))
+            r'.*?[#]["]?\$(\((%s)\)|{(%s)})' % (getters, rhs_variables))
 
     def feed(self, pkg):
         missing = defaultdict(list)
         unnecessary = defaultdict(list)
         double_prefix = defaultdict(list)
 
-        for lineno, line in enumerate(pkg.lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-
-            # flag double path prefix usage on uncommented lines only
-            if line[0] != '#':
-                match = self.double_prefix_regex.search(line)
-                if match is not None:
-                    double_prefix[match.group(1)].append(lineno)
-                match = self.double_prefix_func_regex.search(line)
-                if (match is not None and
-                        self.double_prefix_func_false_positive_regex.match(
-                            match.group(0)) is None):
+        matches = self.scanner.matches(
+            pkg, self.double_prefix_key, self.double_prefix_func_key,
+            self.missing_key, self.unnecessary_key)
+        for key, lineno, _line, match in matches:
+            if key == self.double_prefix_key:
+                double_prefix[match.group(1)].append(lineno)
+            elif key == self.double_prefix_func_key:
+                if self.double_prefix_func_false_positive_regex.match(match.group(0)) is None:
                     double_prefix[match.group(0)].append(lineno)
-
-            # skip EAPIs that don't require trailing slashes
-            if pkg.eapi.options.trailing_slash:
-                continue
-            match = self.missing_regex.search(line)
-            if match is not None:
+            elif key == self.missing_key:
                 missing[match.group(1)].append(lineno)
-            match = self.unnecessary_regex.search(line)
-            if match is not None:
+            else:
                 unnecessary[match.group(1)].append(lineno)
 
         for match, lines in missing.items():
@@ -278,25 +266,25 @@ class AbsoluteSymlinkCheck(Check):
     """Scan ebuild for dosym absolute path usage instead of relative."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([AbsoluteSymlink])
 
     DIRS = ('bin', 'etc', 'lib', 'opt', 'sbin', 'srv', 'usr', 'var')
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
+        self.scanner = line_scanner_addon
         dirs = '|'.join(self.DIRS)
         path_vars = '|'.join(PATH_VARIABLES)
         prefixed_regex = rf'"\${{({path_vars})(%/)?}}(?P<cp>")?(?(cp)\S*|.*?")'
         non_prefixed_regex = rf'(?P<op>["\'])?/({dirs})(?(op).*?(?P=op)|\S*)'
-        self.regex = re.compile(rf'^\s*(?P<cmd>dosym\s+({prefixed_regex}|{non_prefixed_regex}))')
+        self.key = self.scanner.register(
+            rf'^\s*(?P<cmd>dosym\s+({prefixed_regex}|{non_prefixed_regex}))',
+            trigger=r'dosym\s')
 
     def feed(self, pkg):
-        for lineno, line in enumerate(pkg.lines, 1):
-            if not line.strip():
-                continue
-            matches = self.regex.match(line)
-            if matches is not None:
-                yield AbsoluteSymlink(matches.group('cmd'), line=line, lineno=lineno, pkg=pkg)
+        for _key, lineno, line, match in self.scanner.matches(pkg, self.key):
+            yield AbsoluteSymlink(match.group('cmd'), line=line, lineno=lineno, pkg=pkg)
 
 
 class DeprecatedInsinto(results.LineResult, results.Warning):
@@ -318,6 +306,7 @@ class InsintoCheck(Check):
     """Scan ebuild for deprecated insinto usage."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([DeprecatedInsinto])
 
     path_mapping = ImmutableDict({
@@ -328,33 +317,34 @@ class InsintoCheck(Check):
         '/usr/share/applications': 'domenu or newmenu from desktop.eclass',
     })
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
+        self.scanner = line_scanner_addon
         paths = '|'.join(s.replace('/', '/+') + '/?' for s in self.path_mapping)
-        self._insinto_re = re.compile(
-            rf'(?P<insinto>insinto[ \t]+(?P<path>{paths})(?!/\w+))(?:$|[/ \t])')
-        self._insinto_doc_re = re.compile(
-            r'(?P<insinto>insinto[ \t]+/usr/share/doc/(")?\$\{PF?\}(?(2)\2)(/\w+)*)(?:$|[/ \t])')
+        self.insinto_key = self.scanner.register(
+            rf'(?P<insinto>insinto[ \t]+(?P<path>{paths})(?!/\w+))(?:$|[/ \t])',
+            trigger='insinto', method='search')
+        # Check for insinto usage that should be replaced with
+        # docinto/dodoc [-r] under supported EAPIs.
+        eapis = [k for k, v in EAPI.known_eapis.items() if v.options.dodoc_allow_recursive]
+        self.insinto_doc_key = self.scanner.register(
+            r'(?P<insinto>insinto[ \t]+/usr/share/doc/(")?\$\{PF?\}(?(2)\2)(/\w+)*)(?:$|[/ \t])',
+            trigger='insinto', eapis=eapis, method='search')
 
     def feed(self, pkg):
-        for lineno, line in enumerate(pkg.lines, 1):
-            if not line.strip():
-                continue
-            matches = self._insinto_re.search(line)
-            if matches is not None:
-                path = re.sub('//+', '/', matches.group('path'))
+        matched_lineno = None
+        matches = self.scanner.matches(pkg, self.insinto_key, self.insinto_doc_key)
+        for key, lineno, line, match in matches:
+            if key == self.insinto_key:
+                path = re.sub('//+', '/', match.group('path'))
                 cmd = self.path_mapping[path.rstrip('/')]
                 yield DeprecatedInsinto(
-                    cmd, line=matches.group('insinto'), lineno=lineno, pkg=pkg)
-                continue
-            # Check for insinto usage that should be replaced with
-            # docinto/dodoc [-r] under supported EAPIs.
-            if pkg.eapi.options.dodoc_allow_recursive:
-                matches = self._insinto_doc_re.search(line)
-                if matches is not None:
-                    yield DeprecatedInsinto(
-                        'docinto/dodoc', line=matches.group('insinto'),
-                        lineno=lineno, pkg=pkg)
+                    cmd, line=match.group('insinto'), lineno=lineno, pkg=pkg)
+                matched_lineno = lineno
+            elif lineno != matched_lineno:
+                yield DeprecatedInsinto(
+                    'docinto/dodoc', line=match.group('insinto'),
+                    lineno=lineno, pkg=pkg)
 
 
 class ObsoleteUri(results.VersionResult, results.Warning):
@@ -383,34 +373,36 @@ class ObsoleteUriCheck(Check):
     """Scan ebuild for obsolete URIs."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([ObsoleteUri])
 
     REGEXPS = (
         (r'.*\b(?P<uri>(?P<prefix>https?://github\.com/.*?/.*?/)'
          r'(?:tar|zip)ball(?P<ref>\S*))',
-         r'\g<prefix>archive\g<ref>.tar.gz'),
+         r'\g<prefix>archive\g<ref>.tar.gz',
+         r'github\.com/'),
         (r'.*\b(?P<uri>(?P<prefix>https?://gitlab\.com/.*?/(?P<pkg>.*?)/)'
          r'repository/archive\.(?P<format>tar|tar\.gz|tar\.bz2|zip)'
          r'\?ref=(?P<ref>\S*))',
-         r'\g<prefix>-/archive/\g<ref>/\g<pkg>-\g<ref>.\g<format>'),
+         r'\g<prefix>-/archive/\g<ref>/\g<pkg>-\g<ref>.\g<format>',
+         r'gitlab\.com/'),
     )
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
-        self.regexes = []
-        for regexp, repl in self.REGEXPS:
-            self.regexes.append((re.compile(regexp), repl))
+        self.scanner = line_scanner_addon
+        self.regexes = {}
+        for regexp, repl, trigger in self.REGEXPS:
+            key = self.scanner.register(regexp, trigger=trigger)
+            self.regexes[key] = repl
 
     def feed(self, pkg):
-        for lineno, line in enumerate(pkg.lines, 1):
-            if not line.strip() or line.startswith('#'):
+        # searching for multiple matches on a single line is too slow
+        for key, lineno, line, match in self.scanner.matches(pkg, *self.regexes):
+            if line.startswith('#'):
                 continue
-            # searching for multiple matches on a single line is too slow
-            for regexp, repl in self.regexes:
-                matches = regexp.match(line)
-                if matches is not None:
-                    uri = matches.group('uri')
-                    yield ObsoleteUri(lineno, uri, regexp.sub(repl, uri), pkg=pkg)
+            uri = match.group('uri')
+            yield ObsoleteUri(lineno, uri, match.re.sub(self.regexes[key], uri), pkg=pkg)
 
 
 class HomepageInSrcUri(results.VersionResult, results.Warning):
@@ -493,7 +485,7 @@ class RawEbuildCheck(Check):
             yield StaticSrcUri(static_str, pkg=pkg)
 
     def feed(self, pkg):
-        for match in self.attr_regex.finditer(''.join(pkg.lines)):
+        for match in self.attr_regex.finditer(pkg.text):
             attr = match.lastgroup
             func = getattr(self, f'check_{attr}')
             yield from func(pkg, match.group(attr))
@@ -515,25 +507,31 @@ class RedundantDodirCheck(Check):
     """Scan ebuild for redundant dodir usage."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([RedundantDodir])
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
+        self.scanner = line_scanner_addon
         cmds = r'|'.join(('insinto', 'exeinto', 'docinto'))
         self.cmds_regex = re.compile(rf'^\s*(?P<cmd>({cmds}))\s+(?P<path>\S+)')
-        self.dodir_regex = re.compile(rf'^\s*(?P<call>dodir\s+(?P<path>\S+))')
+        self.dodir_key = self.scanner.register(
+            r'^\s*(?P<call>dodir\s+(?P<path>\S+))',
+            trigger='dodir', strip=True, comments=False)
 
     def feed(self, pkg):
-        lines = enumerate(pkg.lines, 1)
-        for lineno, line in lines:
-            line = line.strip()
-            if not line or line[0] == '#':
+        # line following the previous dodir call, skipped as a dodir candidate
+        next_lineno = None
+        for _key, lineno, _line, dodir in self.scanner.matches(pkg, self.dodir_key):
+            if lineno == next_lineno:
                 continue
-            dodir = self.dodir_regex.match(line)
-            if dodir:
-                lineno, line = next(lines)
-                cmd = self.cmds_regex.match(line)
-                if cmd and dodir.group('path') == cmd.group('path'):
-                    yield RedundantDodir(
-                        cmd.group('cmd'), line=dodir.group('call'),
-                        lineno=lineno - 1, pkg=pkg)
+            next_lineno = lineno + 1
+            try:
+                line = pkg.lines[lineno]
+            except IndexError:
+                break
+            cmd = self.cmds_regex.match(line)
+            if cmd and dodir.group('path') == cmd.group('path'):
+                yield RedundantDodir(
+                    cmd.group('cmd'), line=dodir.group('call'),
+                    lineno=lineno, pkg=pkg)
@@ -23,6 +23,7 @@ class DroppedKeywordsCheck(Check):
     _source = sources.PackageRepoSource
     required_addons = (addons.ArchesAddon,)
     known_results = frozenset([DroppedKeywords])
+    pkg_attrs = frozenset(['keywords', 'live'])
 
     def __init__(self, *args, arches_addon):
         super().__init__(*args)
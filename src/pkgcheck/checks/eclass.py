@@ -1,8 +1,7 @@
 from snakeoil.mappings import ImmutableDict
-from snakeoil.process.spawn import spawn_get_output
 from snakeoil.strings import pluralism
 
-from .. import base, results, sources
+from .. import addons, base, results, sources
 from . import Check
 
 
@@ -182,16 +181,16 @@ class EclassCheck(Check):
 
     scope = base.eclass_scope
     _source = sources.EclassRepoSource
+    required_addons = (addons.BashSyntaxAddon,)
     known_results = frozenset([EclassBashSyntaxError])
 
+    def __init__(self, *args, bash_syntax_addon):
+        super().__init__(*args)
+        self.bash = bash_syntax_addon
+
     def feed(self, eclass):
-        ret, err = spawn_get_output(['bash', '-n', eclass.path], collect_fds=(2,))
-        if ret != 0 and err:
-            lineno = 0
-            error = []
-            for line in err:
-                path, line, msg = line.split(': ', 2)
-                lineno = line[5:]
-                error.append(msg.strip('\n'))
-            error = ': '.join(error)
+        errors = self.bash.errors(eclass.path)
+        if errors:
+            lineno = errors[-1][0]
+            error = ': '.join(msg for _lineno, msg in errors)
             yield EclassBashSyntaxError(lineno, error, eclass=eclass)
@@ -4,13 +4,14 @@ import subprocess
 import tarfile
 from collections import defaultdict
 from datetime import datetime
-from itertools import chain
+from itertools import chain, groupby
+from operator import attrgetter
 from tempfile import TemporaryDirectory
-from urllib.parse import urlparse
 
 from pkgcore.ebuild.misc import sort_keywords
 from pkgcore.ebuild.repository import UnconfiguredTree
 from pkgcore.exceptions import PkgcoreException
+from pkgcore.restrictions import packages
 from snakeoil import klass
 from snakeoil.demandload import demand_compile_regexp
 from snakeoil.osutils import pjoin
@@ -32,6 +33,10 @@ demand_compile_regexp(
     'git_cat_file_regex',
     r'^(?P<object>.+?) (?P<status>.+)$')
 
+demand_compile_regexp(
+    'url_scheme_regex',
+    r'^(?P<scheme>[a-zA-Z][a-zA-Z0-9+.-]*):')
+
 
 class GitCommitsRepoSource(sources.RepoSource):
     """Repository source for locally changed packages in git history.
@@ -164,12 +169,18 @@ class RdependChange(results.PackageResult, results.Warning):
 
 
 class _RemovalRepo(UnconfiguredTree):
-    """Repository of removed packages stored in a temporary directory."""
+    """Repository of removed packages stored in a temporary directory.
 
-    def __init__(self, repo):
+    Historical packages are extracted in batches, running a single git archive
+    call per parent commit for all packages changed by a commit.
+    """
+
+    def __init__(self, repo, pkgs=()):
         self.__parent_repo = repo
         self.__tmpdir = TemporaryDirectory()
-        self.__created = False
+        self.__eclasses = False
+        self.__populated = set()
+        self.__errors = {}
         repo_dir = self.__tmpdir.name
 
         # set up some basic repo files so pkgcore doesn't complain
@@ -180,33 +191,57 @@ class _RemovalRepo(UnconfiguredTree):
         with open(pjoin(repo_dir, 'profiles', 'repo_name'), 'w') as f:
             f.write('old-repo\n')
         super().__init__(repo_dir)
+        self._populate(pkgs)
 
     def __call__(self, pkgs):
         """Update the repo with a given sequence of packages."""
-        self._populate(pkgs, eclasses=(not self.__created))
-        if self.__created:
+        pkg = pkgs[0]
+        if pkg.key not in self.__populated:
+            self._populate([pkg])
             # notify the repo object that new pkgs were added
-            for pkg in pkgs:
-                self.notify_add_package(pkg)
-        self.__created = True
+            for x in pkgs:
+                self.notify_add_package(x)
+        error = self.__errors.get(pkg.key)
+        if error is not None:
+            raise error
         return self
 
-    def _populate(self, pkgs, eclasses=False):
+    def _populate(self, pkgs):
         """Populate the repo with a given sequence of historical packages."""
-        pkg = pkgs[0]
-        paths = [pjoin(pkg.category, pkg.package)]
+        commits = defaultdict(list)
+        for pkg in pkgs:
+            commits[str(pkg.commit)].append(pkg.key)
+        for commit, keys in commits.items():
+            self._extract(commit, keys)
+
+    def _extract(self, commit, keys):
+        """Extract historical package directories from a commit's parent."""
+        paths = list(keys)
+        eclasses = not self.__eclasses
         if eclasses:
             paths.append('eclass')
 
         old_files = subprocess.Popen(
-            ['git', 'archive', f'{pkg.commit}~1'] + paths,
+            ['git', 'archive', f'{commit}~1'] + paths,
             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
             cwd=self.__parent_repo.location)
-        with tarfile.open(mode='r|', fileobj=old_files.stdout) as tar:
-            tar.extractall(path=self.location)
-        if old_files.poll():
+        try:
+            with tarfile.open(mode='r|', fileobj=old_files.stdout) as tar:
+                tar.extractall(path=self.location)
+        except tarfile.ReadError:
+            pass
+        old_files.wait()
+        if old_files.returncode:
+            if len(keys) > 1:
+                # extract packages separately to isolate failures
+                for key in keys:
+                    self._extract(commit, [key])
+                return
             error = old_files.stderr.read().decode().strip()
-            raise PkgcoreException(error)
+            self.__errors[keys[0]] = PkgcoreException(error)
+        elif eclasses:
+            self.__eclasses = True
+        self.__populated.update(keys)
 
     def __del__(self):
         self.__tmpdir.cleanup()
@@ -230,15 +265,53 @@ class GitPkgCommitsCheck(GentooRepoCheck, GitCheck):
         self.valid_arches = self.options.target_repo.known_arches
         self._git_addon = git_addon
 
+    @staticmethod
+    def _changes(pkgset):
+        """Split a package's changes into removed, old, and modified packages."""
+        removed = [pkg for pkg in pkgset if pkg.status == 'D']
+        renamed = [pkg for pkg in pkgset if pkg.status == 'R']
+        # packages not available in current repo
+        old = set(removed + renamed)
+        modified = [pkg for pkg in pkgset if pkg.status == 'M' and pkg not in old]
+        return removed, old, modified
+
+    def _scan_restrict(self):
+        """Return the restriction matching all packages targeted by the scan."""
+        restrictions = self.options.restrictions
+        # match all packages for targets piped in via stdin
+        if not isinstance(restrictions, list):
+            return packages.AlwaysTrue
+        restricts = []
+        for scope, restrict in restrictions:
+            if scope is base.repo_scope:
+                return packages.AlwaysTrue
+            elif scope > base.repo_scope:
+                restricts.append(restrict)
+        return packages.OrRestriction(*restricts)
+
+    @klass.jit_attr
+    def _historical_pkgs(self):
+        """Removed and modified packages for all targeted, locally changed packages."""
+        removed, modified = [], []
+        commits_repo = self._git_addon.commits_repo(git.GitChangedRepo)
+        pkgs = commits_repo.itermatch(self._scan_restrict(), sorter=sorted)
+        for _key, pkgset in groupby(pkgs, key=attrgetter('key')):
+            pkg_removed, _old, pkg_modified = self._changes(list(pkgset))
+            if pkg_removed:
+                removed.append(pkg_removed[0])
+            if pkg_modified:
+                modified.append(pkg_modified[0])
+        return removed, modified
+
     @klass.jit_attr
     def removal_repo(self):
-        """Create a repository of packages removed from git."""
-        return _RemovalRepo(self.repo)
+        """Repo of removed packages, extracting all targeted packages on first use."""
+        return _RemovalRepo(self.repo, self._historical_pkgs[0])
 
     @klass.jit_attr
     def modified_repo(self):
-        """Create a repository of old packages newly modified in git."""
-        return _RemovalRepo(self.repo)
+        """Repo of modified packages, extracting all targeted packages on first use."""
+        return _RemovalRepo(self.repo, self._historical_pkgs[1])
 
     @klass.jit_attr
     def added_repo(self):
@@ -296,13 +369,9 @@ class GitPkgCommitsCheck(GentooRepoCheck, GitCheck):
             yield RdependChange(pkg=new_pkg)
 
     def feed(self, pkgset):
-        removed = [pkg for pkg in pkgset if pkg.status == 'D']
-        renamed = [pkg for pkg in pkgset if pkg.status == 'R']
-        # packages not available in current repo
-        old = set(removed + renamed)
+        removed, old, modified = self._changes(pkgset)
         if removed:
             yield from self.removal_checks(removed)
-        modified = [pkg for pkg in pkgset if pkg.status == 'M' and pkg not in old]
         if modified:
             yield from self.modified_checks(modified)
 
@@ -409,12 +478,24 @@ def verify_tags(*tags, required=False):
 
 
 class GitCommitsCheck(GentooRepoCheck, GitCheck):
-    """Check unpushed git commits for various issues."""
+    """Check unpushed git commits for various issues.
+
+    Commits referenced by Fixes/Reverts tags are collected from all commits
+    while feeding and verified in bulk when finishing.
+    """
 
     scope = base.commit_scope
     _source = GitCommitsSource
     known_results = frozenset([MissingSignOff, InvalidCommitTag, InvalidCommitMessage])
 
+    # tags referencing commits
+    _commit_ref_tags = frozenset(['Fixes', 'Reverts'])
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        # commit references from Fixes/Reverts tags across all commits
+        self._commit_refs = []
+
     @verify_tags('Signed-off-by', required=True)
     def _signed_off_by_tag(self, tag, values, commit):
         """Verify commit contains all required sign offs in accordance with GLEP 76."""
@@ -434,41 +515,59 @@ class GitCommitsCheck(GentooRepoCheck, GitCheck):
     def _bug_tag(self, tag, values, commit):
         """Verify values are URLs for Bug/Closes tags."""
         for value in values:
-            parsed = urlparse(value)
-            if not parsed.scheme:
+            m = url_scheme_regex.match(value)
+            if m is None:
                 yield InvalidCommitTag(tag, value, "value isn't a URL", commit=commit)
                 continue
-            if parsed.scheme.lower() not in ("http", "https"):
+            if m.group('scheme').lower() not in ("http", "https"):
                 yield InvalidCommitTag(
                     tag, value, "invalid protocol; should be http or https", commit=commit)
 
-    @klass.jit_attr_none
-    def git_cat_file(self):
-        """Start a `git cat-file` process to verify git repo hashes."""
-        return subprocess.Popen(
-            ['git', 'cat-file', '--batch-check'],
-            cwd=self.options.target_repo.location,
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-            encoding='utf8', bufsize=1)
-
-    @verify_tags('Fixes', 'Reverts')
-    def _commit_tag(self, tag, values, commit):
+    def _resolve_refs(self, refs):
+        """Determine the status of all given git object references in a single call."""
+        try:
+            p = subprocess.run(
+                ['git', 'cat-file', '--batch-check'],
+                cwd=self.options.target_repo.location,
+                input=''.join(f'{x}\n' for x in refs),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8')
+        except OSError as e:
+            logger.warning('skipping git commit reference checks: %s', e)
+            return {}
+        if p.returncode:
+            logger.warning(
+                'skipping git commit reference checks: git cat-file failed: %s',
+                p.stderr.strip())
+            return {}
+
+        lines = p.stdout.splitlines()
+        if len(lines) != len(refs):
+            logger.warning(
+                'skipping git commit reference checks: '
+                'git cat-file returned %d replies for %d references', len(lines), len(refs))
+            return {}
+
+        statuses = {}
+        # output lines are returned in the same order as the input references
+        for ref, line in zip(refs, lines):
+            m = git_cat_file_regex.match(line.strip())
+            if m is not None:
+                statuses[ref] = (m.group('object'), m.group('status'))
+        return statuses
+
+    def finish(self):
         """Verify referenced commits exist for Fixes/Reverts tags."""
-        self.git_cat_file.stdin.write('\n'.join(values) + '\n')
-        if self.git_cat_file.poll() is None:
-            for _ in range(len(values)):
-                line = self.git_cat_file.stdout.readline().strip()
-                m = git_cat_file_regex.match(line)
-                if m is not None:
-                    value = m.group('object')
-                    status = m.group('status')
-                    if not status.startswith('commit '):
-                        yield InvalidCommitTag(tag, value, f'{status} commit', commit=commit)
-
-    def __del__(self):
-        # at this point, we don't care about being nice to the `git cat-file` process
-        if getattr(self, '_git_cat_file', None) is not None:
-            self.git_cat_file.kill()
+        refs = list(dict.fromkeys(chain.from_iterable(x[1] for x in self._commit_refs)))
+        statuses = self._resolve_refs(refs) if refs else {}
+        for tag, values, commit in self._commit_refs:
+            for value in values:
+                try:
+                    value, status = statuses[value]
+                except KeyError:
+                    continue
+                if not status.startswith('commit '):
+                    yield InvalidCommitTag(tag, value, f'{status} commit', commit=commit)
+        self._commit_refs = []
 
     def feed(self, commit):
         if len(commit.message) == 0:
@@ -510,6 +609,8 @@ class GitCommitsCheck(GentooRepoCheck, GitCheck):
 
         # mapping of defined tags to any existing verification methods
         tag_mapping = defaultdict(list)
+        # referenced commits for Fixes/Reverts tags, verified in bulk
+        commit_refs = defaultdict(list)
         # forcibly run verifications methods for required tags
         tag_mapping.update(
             ((tag, verify), [])
@@ -526,8 +627,11 @@ class GitCommitsCheck(GentooRepoCheck, GitCheck):
             if m is None:
                 yield InvalidCommitMessage(f'non-tag in footer, line {lineno}: {line!r}', commit=commit)
             else:
-                # register known tags for verification
                 tag = m.group('tag')
+                if tag in self._commit_ref_tags:
+                    commit_refs[tag].append(m.group('value'))
+                    continue
+                # register known tags for verification
                 try:
                     func, required = _known_tags[tag]
                     tag_mapping[(tag, func)].append(m.group('value'))
@@ -537,6 +641,7 @@ class GitCommitsCheck(GentooRepoCheck, GitCheck):
         # run tag verification methods
         for (tag, func), values in tag_mapping.items():
             yield from func(self, tag, values, commit)
+        self._commit_refs.extend((tag, values, commit) for tag, values in commit_refs.items())
 
 
 class EclassIncorrectCopyright(IncorrectCopyright, results.EclassResult):
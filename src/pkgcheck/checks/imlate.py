@@ -1,7 +1,5 @@
 from collections import defaultdict
-from itertools import chain
 
-from pkgcore.restrictions import packages, values
 from snakeoil.strings import pluralism
 
 from .. import addons, base, results, sources
@@ -48,7 +46,7 @@ class ImlateCheck(Check):
 
     scope = base.package_scope
     _source = sources.PackageRepoSource
-    required_addons = (addons.StableArchesAddon,)
+    required_addons = (addons.StableArchesAddon, addons.KeywordsAddon)
     known_results = frozenset([PotentialStable, LaggingStable])
 
     @staticmethod
@@ -63,55 +61,51 @@ class ImlateCheck(Check):
                 The default arches are all stable arches (unless --arches is specified).
             """)
 
-    def __init__(self, *args, stable_arches_addon=None):
+    def __init__(self, *args, stable_arches_addon=None, keywords_addon):
         super().__init__(*args)
+        self.keywords = keywords_addon
         self.all_arches = frozenset(self.options.arches)
         self.stable_arches = frozenset(arch.strip().lstrip("~") for arch in self.options.stable_arches)
-        self.target_arches = frozenset(f'~{arch}' for arch in self.stable_arches)
 
         source_arches = self.options.source_arches
         if source_arches is None:
             source_arches = self.options.stable_arches
         self.source_arches = frozenset(
             arch.lstrip("~") for arch in source_arches)
-        self.source_filter = packages.PackageRestriction(
-            "keywords", values.ContainmentMatch2(self.source_arches))
 
     def feed(self, pkgset):
         pkg_slotted = defaultdict(list)
         for pkg in pkgset:
             pkg_slotted[pkg.slot].append(pkg)
 
-        fmatch = self.source_filter.match
+        split = self.keywords.split
         for slot, pkgs in sorted(pkg_slotted.items()):
-            slot_keywords = set(chain.from_iterable(pkg.keywords for pkg in pkgs))
-            stable_slot_keywords = self.all_arches.intersection(slot_keywords)
-            potential_slot_stables = {'~' + x for x in stable_slot_keywords}
+            slot_stable = frozenset().union(*(split(pkg.keywords)[0] for pkg in pkgs))
+            potential_slot_stables = self.all_arches & slot_stable
             newer_slot_stables = set()
             for pkg in reversed(pkgs):
+                pkg_stable, pkg_unstable, _disabled = split(pkg.keywords)
+
                 # only consider pkgs with keywords that contain the targeted arches
-                if not fmatch(pkg):
-                    newer_slot_stables.update(self.all_arches.intersection(pkg.keywords))
+                if self.source_arches.isdisjoint(pkg_stable):
+                    newer_slot_stables.update(self.all_arches & pkg_stable)
                     continue
 
                 # current pkg stable keywords
-                stable = {'~' + x for x in self.source_arches.intersection(pkg.keywords)}
+                stable = self.source_arches & pkg_stable
 
-                lagging = potential_slot_stables.intersection(pkg.keywords)
+                lagging = potential_slot_stables & pkg_unstable
                 # skip keywords that have newer stable versions
-                lagging -= {'~' + x for x in newer_slot_stables}
+                lagging -= newer_slot_stables
                 lagging -= stable
                 if lagging:
-                    stable_kwds = (x for x in pkg.keywords if not x[0] in ('~', '-'))
                     yield LaggingStable(
-                        slot, sorted(stable_kwds), sorted(lagging), pkg=pkg)
+                        slot, sorted(pkg_stable), sorted(f'~{x}' for x in lagging), pkg=pkg)
 
-                unstable_keywords = {x for x in pkg.keywords if x[0] == '~'}
-                potential = self.target_arches.intersection(unstable_keywords)
+                potential = self.stable_arches & pkg_unstable
                 potential -= lagging | stable
                 if potential:
-                    stable_kwds = (x for x in pkg.keywords if not x[0] in ('~', '-'))
                     yield PotentialStable(
-                        slot, sorted(stable_kwds), sorted(potential), pkg=pkg)
+                        slot, sorted(pkg_stable), sorted(f'~{x}' for x in potential), pkg=pkg)
 
                 break
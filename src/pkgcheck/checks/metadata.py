@@ -9,7 +9,6 @@ from operator import attrgetter
 from pkgcore.ebuild import atom as atom_mod
 from pkgcore.ebuild.atom import atom as atom_cls
 from pkgcore.ebuild.eapi import get_eapi
-from pkgcore.ebuild.misc import sort_keywords
 from pkgcore.fetch import fetchable, unknown_mirror
 from pkgcore.package.errors import MetadataException
 from pkgcore.restrictions import packages, values, boolean
@@ -882,22 +881,18 @@ class MissingVirtualKeywords(results.VersionResult, results.Warning):
 class KeywordsCheck(Check):
     """Check package keywords for sanity; empty keywords, and -* are flagged."""
 
-    required_addons = (addons.UseAddon,)
+    required_addons = (addons.UseAddon, addons.KeywordsAddon)
     known_results = frozenset([
         BadKeywords, UnknownKeywords, OverlappingKeywords, DuplicateKeywords,
         UnsortedKeywords, MissingVirtualKeywords,
     ])
 
-    def __init__(self, *args, use_addon):
+    def __init__(self, *args, use_addon, keywords_addon):
         super().__init__(*args)
         self.iuse_filter = use_addon.get_filter()
-        self.valid_arches = self.options.target_repo.known_arches
-        special_keywords = {'-*'}
-        stable_keywords = self.valid_arches
-        unstable_keywords = {'~' + x for x in self.valid_arches}
-        disabled_keywords = {'-' + x for x in self.valid_arches}
-        self.valid_keywords = (
-            special_keywords | stable_keywords | unstable_keywords | disabled_keywords)
+        self.keywords = keywords_addon
+        self.valid_arches = keywords_addon.arches
+        self.valid_keywords = keywords_addon.valid
 
         # Note: '*' and '~*' are portage-only special KEYWORDS atm, i.e. not
         # specified in PMS, so they don't belong in the main tree.
@@ -908,16 +903,16 @@ class KeywordsCheck(Check):
             yield BadKeywords(pkg)
         else:
             # check for unknown keywords
-            unknown = set(pkg.keywords) - self.valid_keywords
-            # portage-only KEYWORDS are allowed in overlays
-            if not self.options.gentoo_repo:
-                unknown -= self.portage_keywords
-            if unknown:
-                yield UnknownKeywords(sorted(unknown), pkg=pkg)
+            if not self.valid_keywords.issuperset(pkg.keywords):
+                unknown = set(pkg.keywords) - self.valid_keywords
+                # portage-only KEYWORDS are allowed in overlays
+                if not self.options.gentoo_repo:
+                    unknown -= self.portage_keywords
+                if unknown:
+                    yield UnknownKeywords(sorted(unknown), pkg=pkg)
 
             # check for overlapping keywords
-            unstable = {x[1:] for x in pkg.keywords if x[0] == '~'}
-            stable = {x for x in pkg.keywords if x[0] != '~'}
+            stable, unstable, _disabled = self.keywords.split(pkg.keywords)
             overlapping = unstable & stable
             if overlapping:
                 keywords = ', '.join(map(
@@ -925,23 +920,24 @@ class KeywordsCheck(Check):
                 yield OverlappingKeywords(keywords, pkg=pkg)
 
             # check for duplicate keywords
-            duplicates = set()
-            seen = set()
-            for x in pkg.keywords:
-                if x not in seen:
-                    seen.add(x)
-                else:
-                    duplicates.add(x)
-            if duplicates:
-                yield DuplicateKeywords(sort_keywords(duplicates), pkg=pkg)
+            if len(set(pkg.keywords)) != len(pkg.keywords):
+                duplicates = set()
+                seen = set()
+                for x in pkg.keywords:
+                    if x not in seen:
+                        seen.add(x)
+                    else:
+                        duplicates.add(x)
+                yield DuplicateKeywords(self.keywords.sort(duplicates), pkg=pkg)
 
             # check for unsorted keywords
-            if pkg.sorted_keywords != pkg.keywords:
+            sorted_keywords = self.keywords.sort(pkg.keywords)
+            if sorted_keywords != pkg.keywords:
                 if self.options.verbosity < 1:
                     yield UnsortedKeywords(pkg.keywords, pkg=pkg)
                 else:
                     yield UnsortedKeywords(
-                        pkg.keywords, sorted_keywords=pkg.sorted_keywords, pkg=pkg)
+                        pkg.keywords, sorted_keywords=sorted_keywords, pkg=pkg)
 
             if pkg.category == 'virtual':
                 keywords = set()
@@ -951,10 +947,10 @@ class KeywordsCheck(Check):
                         keywords.update(
                             x for x in p.keywords if x.lstrip('~') in self.valid_arches)
                 pkg_keywords = set(pkg.keywords)
-                pkg_keywords.update(f'~{x}' for x in pkg.keywords if x[0] != '~')
+                pkg_keywords.update(f'~{x}' for x in stable)
                 missing_keywords = keywords - pkg_keywords
                 if missing_keywords:
-                    yield MissingVirtualKeywords(sort_keywords(missing_keywords), pkg=pkg)
+                    yield MissingVirtualKeywords(self.keywords.sort(missing_keywords), pkg=pkg)
 
 
 class MissingUri(results.VersionResult, results.Warning):
@@ -2,12 +2,11 @@ import os
 from difflib import SequenceMatcher
 
 from lxml import etree
-from pkgcore import const as pkgcore_const
 from pkgcore.ebuild.atom import MalformedAtom, atom
 from snakeoil.osutils import pjoin
 from snakeoil.strings import pluralism
 
-from .. import base, results, sources
+from .. import addons, base, results, sources
 from . import Check
 
 
@@ -274,24 +273,21 @@ class RedundantLongDescription(results.PackageResult, results.Warning):
 class _XmlBaseCheck(Check):
     """Base class for metadata.xml scans."""
 
-    schema = None
+    required_addons = (addons.MetadataXmlAddon,)
 
     misformed_error = None
     invalid_error = None
     missing_error = None
 
-    def __init__(self, *args):
+    def __init__(self, *args, metadata_xml_addon):
         super().__init__(*args)
+        self.metadata_xml = metadata_xml_addon
         self.repo_base = self.options.target_repo.location
         self.pkgref_cache = {}
         # content validation checks to run after parsing XML doc
         self._checks = tuple(
             getattr(self, x) for x in dir(self) if x.startswith('_check_'))
 
-        # use xsd file installed with pkgcore
-        metadata_xsd = pjoin(pkgcore_const.DATA_PATH, 'xml-schema', 'metadata.xsd')
-        self.schema = etree.XMLSchema(etree.parse(metadata_xsd))
-
     def _check_doc(self, pkg, loc, doc):
         """Perform additional document structure checks."""
         # find all root descendant elements that are empty
@@ -340,7 +336,7 @@ class _XmlBaseCheck(Check):
 
     def _parse_xml(self, pkg, loc):
         try:
-            doc = etree.parse(loc)
+            doc = self.metadata_xml.parse(loc)
         except (IOError, OSError):
             # it's only an error when missing in the main gentoo repo
             if self.options.gentoo_repo:
@@ -352,8 +348,9 @@ class _XmlBaseCheck(Check):
 
         # note: while doc is available, do not pass it here as it may
         # trigger undefined behavior due to incorrect structure
-        if self.schema is not None and not self.schema.validate(doc):
-            message = '\n'.join(self._format_lxml_errors(self.schema.error_log))
+        errors = self.metadata_xml.validate(loc)
+        if errors:
+            message = '\n'.join(self._format_lxml_errors(errors))
             yield self.invalid_error(os.path.basename(loc), message, pkg=pkg)
             return
 
@@ -261,9 +261,11 @@ class MetadataUrlCheck(_UrlCheck):
 
     scope = base.package_scope
     _source = sources.PackageRepoSource
+    required_addons = (addons.MetadataXmlAddon,)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, metadata_xml_addon, **kwargs):
         super().__init__(*args, **kwargs)
+        self.metadata_xml = metadata_xml_addon
         self.protocols = ('http://', 'https://', 'ftp://')
         self.remote_map = {
             'bitbucket': 'https://bitbucket.org/{project}',
@@ -279,7 +281,7 @@ class MetadataUrlCheck(_UrlCheck):
 
     def _get_urls(self, pkg):
         try:
-            tree = etree.parse(pkg._shared_pkg_data.metadata_xml._source)
+            tree = self.metadata_xml.parse(pkg._shared_pkg_data.metadata_xml._source)
         except etree.XMLSyntaxError:
             return
 
@@ -1,15 +1,15 @@
-import errno
-import multiprocessing
 import os
 import re
 import socket
 import subprocess
 import tempfile
+import threading
 
 from pkgcore.restrictions import packages, values
 from snakeoil.osutils import pjoin
 
 from .. import const, results, sources
+from ..log import logger
 from . import Check, SkipOptionalCheck
 
 
@@ -26,63 +26,169 @@ class MismatchedPerlVersion(results.VersionResult, results.Warning):
         return f'DIST_VERSION={self.dist_version} normalizes to {self.normalized}'
 
 
+class _PerlClient:
+    """Perl script process and its socket connection."""
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.reader = connection.makefile('r', encoding='utf-8', errors='replace')
+        self.lock = threading.Lock()
+        self.module_version = self.reader.readline().strip()
+
+    def normalize(self, version):
+        """Normalize a given version number."""
+        with self.lock:
+            self.connection.sendall(f'{version}\n'.encode())
+            line = self.reader.readline()
+        if not line:
+            raise EOFError('perl client exited')
+        return line.rstrip('\n')
+
+    def close(self):
+        """Close the connection and kill the perl process."""
+        self.reader.close()
+        self.connection.close()
+        self.process.kill()
+
+
 class _PerlConnection:
-    """Connection to perl script the check is going to communicate with."""
+    """Connection to perl scripts the check is going to communicate with.
+
+    Each scanning process starts its own perl client on first use in order to
+    avoid serializing a parallel scan on a single perl process and sharing
+    connections between processes. Normalized versions are memoized and
+    persisted between runs.
+    """
 
     def __init__(self, options):
-        self.connection = None
-        self.perl_client = None
-        self.process_lock = multiprocessing.Lock()
+        self.options = options
+        # perl clients mapped by the pid of the process using them, None if failed
+        self.clients = {}
         self.socket_dir = tempfile.TemporaryDirectory(prefix='pkgcheck-')
-
-        # set up Unix domain socket to communicate with perl client
+        self._cache = {}
+        self._cache_file = pjoin(const.USER_CACHE_DIR, 'perl-versions')
+        client = self._start_client()
+        self._load_cache(client.module_version)
+
+    def _start_client(self):
+        """Start a perl client for the current process."""
+        # set up Unix domain socket to communicate with the perl client
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        socket_path = os.path.join(self.socket_dir.name, 'perl.socket')
         try:
+            socket_path = pjoin(self.socket_dir.name, f'perl-{os.getpid()}.socket')
             sock.bind(socket_path)
-        except OSError as e:
-            if e.errno == errno.EADDRINUSE:
-                # socket already set up by a previous run
-                return
-            raise
-        sock.listen()
-
-        # start perl client for normalizing perl module versions into package versions
-        perl_script = pjoin(const.DATA_PATH, 'perl-version.pl')
+            sock.listen()
+
+            # start perl client for normalizing perl module versions into package versions
+            perl_script = pjoin(const.DATA_PATH, 'perl-version.pl')
+            sock.settimeout(1)
+            try:
+                perl_client = subprocess.Popen(
+                    ['perl', perl_script, socket_path], stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                raise SkipOptionalCheck(self, 'perl not installed on system')
+
+            try:
+                connection, _address = sock.accept()
+            except socket.timeout:
+                perl_client.kill()
+                err_msg = 'failed to connect to perl client'
+                if self.options.verbosity > 0:
+                    stderr = perl_client.stderr.read().decode().strip()
+                    err_msg += f': {stderr}'
+                raise SkipOptionalCheck(self, err_msg)
+        finally:
+            sock.close()
+
+        client = self.clients[os.getpid()] = _PerlClient(perl_client, connection)
+        return client
+
+    def _load_cache(self, module_version):
+        """Load persistent normalized version cache, resetting it on module updates."""
+        header = f'# Gentoo::PerlMod::Version {module_version}\n'
         try:
-            self.perl_client = subprocess.Popen(
-                ['perl', perl_script, socket_path], stderr=subprocess.PIPE)
+            with open(self._cache_file) as f:
+                if f.readline() == header:
+                    for line in f:
+                        version, _sep, normalized = line.rstrip('\n').partition(' ')
+                        if normalized:
+                            self._cache[version] = normalized
+                    return
         except FileNotFoundError:
-            raise SkipOptionalCheck(self, 'perl not installed on system')
+            pass
+        except IOError as e:
+            logger.warning(f'failed loading perl version cache: {e}')
 
-        sock.settimeout(1)
         try:
-            self.connection, _address = sock.accept()
-        except socket.timeout:
-            err_msg = 'failed to connect to perl client'
-            if options.verbosity > 0:
-                stderr = self.perl_client.stderr.read().decode().strip()
-                err_msg += f': {stderr}'
-            raise SkipOptionalCheck(self, err_msg)
+            os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+            # replace the cache atomically since other processes may be appending to it
+            tmp_file = f'{self._cache_file}.{os.getpid()}'
+            with open(tmp_file, 'w') as f:
+                f.write(header)
+            os.replace(tmp_file, self._cache_file)
+        except IOError as e:
+            logger.warning(f'failed creating perl version cache: {e}')
+            self._cache_file = None
+
+    def _update_cache(self, version, normalized):
+        """Append a newly normalized version to the persistent cache."""
+        if self._cache_file is None:
+            return
+        data = f'{version} {normalized}\n'.encode()
+        try:
+            # appends are atomic so multiple scanning processes can update the file
+            fd = os.open(self._cache_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except IOError as e:
+            logger.warning(f'failed updating perl version cache: {e}')
+            self._cache_file = None
 
     def normalize(self, version):
-        """Normalize a given version number to its perl equivalent."""
-        with self.process_lock:
-            self.connection.send(version.encode() + b'\n')
-            size = int(self.connection.recv(2))
-            return self.connection.recv(size).decode('utf-8', 'replace')
+        """Normalize a given version number to its perl equivalent, None on failure."""
+        normalized = self._cache.get(version)
+        if normalized is not None:
+            return normalized
+
+        pid = os.getpid()
+        if pid not in self.clients:
+            try:
+                self._start_client()
+            except (OSError, SkipOptionalCheck) as e:
+                logger.warning(f'failed starting perl client: {e}')
+                self.clients[pid] = None
+        client = self.clients[pid]
+        if client is None:
+            return None
+
+        try:
+            normalized = client.normalize(version)
+        except (EOFError, OSError) as e:
+            # drop failed clients, skipping normalization for the process
+            logger.warning(f'failed normalizing perl version {version!r}: {e}')
+            client.close()
+            self.clients[pid] = None
+            return None
+
+        if normalized:
+            self._cache[version] = normalized
+            self._update_cache(version, normalized)
+            return normalized
+        return None
 
     def __del__(self):
         # Clean up perl cruft if it exists, we don't care about being nice to
         # the perl side at this point.
-        if self.connection is not None:
-            self.connection.close()
+        for client in self.clients.values():
+            if client is not None:
+                client.close()
         try:
             self.socket_dir.cleanup()
         except FileNotFoundError:
             pass
-        if self.perl_client is not None:
-            self.perl_client.kill()
 
 
 class PerlCheck(Check):
@@ -97,15 +203,15 @@ class PerlCheck(Check):
         super().__init__(*args)
         self.dist_version_re = re.compile('DIST_VERSION=(?P<dist_version>\d+(\.\d+)*)\s*\n')
         # Initialize connection with perl script. This is done during
-        # __init__() since only one running version of the script is shared
-        # between however many scanning processes will be run. Also, it makes
-        # it easier to disable this check if required perl deps are missing.
+        # __init__() since it makes it easier to disable this check if
+        # required perl deps are missing, scanning processes forked afterwards
+        # start their own perl clients as required.
         self.perl = _PerlConnection(self.options)
 
     def feed(self, pkg):
-        match = self.dist_version_re.search(''.join(pkg.lines))
+        match = self.dist_version_re.search(pkg.text)
         if match is not None:
             dist_version = match.group('dist_version')
             normalized = self.perl.normalize(dist_version)
-            if normalized != pkg.version:
+            if normalized is not None and normalized != pkg.version:
                 yield MismatchedPerlVersion(dist_version, normalized, pkg=pkg)
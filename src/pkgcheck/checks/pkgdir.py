@@ -4,11 +4,10 @@ from collections import defaultdict
 
 from pkgcore.ebuild.atom import MalformedAtom
 from pkgcore.ebuild.atom import atom as atom_cls
-from snakeoil.chksum import get_chksums
 from snakeoil.osutils import listdir, pjoin, sizeof_fmt
 from snakeoil.strings import pluralism
 
-from .. import base, git, results, sources
+from .. import addons, base, git, results, sources
 from . import Check
 
 allowed_filename_chars = "a-zA-Z0-9._-+:"
@@ -170,20 +169,73 @@ class PkgDirCheck(Check):
 
     scope = base.package_scope
     _source = (sources.PackageRepoSource, (), (('source', sources.RawRepoSource),))
+    pkg_attrs = frozenset(['category', 'package'])
 
     ignore_dirs = frozenset(["cvs", ".svn", ".bzr"])
-    required_addons = (git.GitAddon,)
+    required_addons = (git.GitAddon, addons.DigestAddon)
     known_results = frozenset([
         DuplicateFiles, EmptyFile, ExecutableFile, UnknownPkgDirEntry, SizeViolation,
         BannedCharacter, InvalidUTF8, MismatchedPN, InvalidPN,
     ])
 
-    # TODO: put some 'preferred algorithms by purpose' into snakeoil?
-    digest_algo = 'sha256'
-
-    def __init__(self, *args, git_addon):
+    def __init__(self, *args, git_addon, digest_addon):
         super().__init__(*args)
+        self.git_addon = git_addon
+        self.digest = digest_addon.digest
         self.gitignored = git_addon.gitignored
+        # For repo-wide scans, list git repo files before scanning processes
+        # are forked so the listing is shared instead of being run separately
+        # per process. Otherwise, the targeted packages are listed on first use.
+        if addons._scan_restricts(self.options) is None:
+            git_addon.files
+
+    def _pkg_entries(self, pkg_path):
+        """Generator of (filename, is_executable) tuples for a package directory."""
+        git_files = self.git_addon.files
+        if git_files is not None:
+            rel_path = pkg_path[len(self.options.target_repo.location) + 1:]
+            for filename in git_files.listdir(rel_path):
+                entry = git_files.get(pjoin(rel_path, filename))
+                path = pjoin(pkg_path, filename)
+                if entry is not None and entry.mode is not None and stat.S_ISREG(entry.mode):
+                    yield filename, bool(entry.mode & 0o111)
+                else:
+                    yield filename, os.path.isfile(path) and bool(os.stat(path).st_mode & 0o111)
+            return
+
+        # note we don't use os.walk, we need size info also
+        for filename in listdir(pkg_path):
+            path = pjoin(pkg_path, filename)
+            if self.gitignored(path):
+                continue
+            yield filename, os.path.isfile(path) and bool(os.stat(path).st_mode & 0o111)
+
+    def _filesdir_files(self, pkg_path):
+        """Generator of (path, blob ID) tuples for files under a package's filesdir.
+
+        Paths are relative to the package directory and blob IDs are only
+        known for unmodified files tracked by git.
+        """
+        git_files = self.git_addon.files
+        if git_files is not None:
+            repo_prefix_len = len(self.options.target_repo.location) + 1
+            pkg_prefix_len = len(pkg_path) - repo_prefix_len + 1
+            for path, entry in git_files.walk(pjoin(pkg_path[repo_prefix_len:], 'files')):
+                path = path[pkg_prefix_len:]
+                # skip any ignored directories
+                if not self.ignore_dirs.intersection(path.split(os.sep)[1:-1]):
+                    yield path, entry.blob
+            return
+
+        pkg_path_len = len(pkg_path) + 1
+        for root, dirs, files in os.walk(pjoin(pkg_path, 'files')):
+            # don't visit any ignored directories
+            for d in self.ignore_dirs.intersection(dirs):
+                dirs.remove(d)
+            base_dir = root[pkg_path_len:]
+            for filename in files:
+                if not self.gitignored(pjoin(root, filename)):
+                    yield pjoin(base_dir, filename), None
 
     def feed(self, pkgset):
         pkg = pkgset[0]
@@ -192,14 +244,10 @@ class PkgDirCheck(Check):
         mismatched = []
         invalid = []
         unknown = []
-        # note we don't use os.walk, we need size info also
-        for filename in listdir(pkg_path):
+        for filename, executable in self._pkg_entries(pkg_path):
             path = pjoin(pkg_path, filename)
 
-            if self.gitignored(path):
-                continue
-
-            if os.path.isfile(path) and  os.stat(path).st_mode & 0o111:
+            if executable:
                 yield ExecutableFile(filename, pkg=pkg)
 
             # While this may seem odd, written this way such that the filtering
@@ -235,37 +283,30 @@ class PkgDirCheck(Check):
             yield UnknownPkgDirEntry(sorted(unknown), pkg=pkg)
 
         files_by_size = defaultdict(list)
-        pkg_path_len = len(pkg_path) + 1
-        for root, dirs, files in os.walk(pjoin(pkg_path, 'files')):
-            # don't visit any ignored directories
-            for d in self.ignore_dirs.intersection(dirs):
-                dirs.remove(d)
-            base_dir = root[pkg_path_len:]
-            for filename in files:
-                path = pjoin(root, filename)
-                if self.gitignored(path):
-                    continue
-                file_stat = os.lstat(path)
-                if stat.S_ISREG(file_stat.st_mode):
-                    if file_stat.st_mode & 0o111:
-                        yield ExecutableFile(pjoin(base_dir, filename), pkg=pkg)
-                    if file_stat.st_size == 0:
-                        yield EmptyFile(pjoin(base_dir, filename), pkg=pkg)
-                    else:
-                        files_by_size[file_stat.st_size].append(pjoin(base_dir, filename))
-                        if file_stat.st_size > 20480:
-                            yield SizeViolation(
-                                pjoin(base_dir, filename), file_stat.st_size, pkg=pkg)
-                    banned_chars = set(filename) - allowed_filename_chars_set
-                    if banned_chars:
-                        yield BannedCharacter(
-                            pjoin(base_dir, filename), sorted(banned_chars), pkg=pkg)
+        for path, blob in self._filesdir_files(pkg_path):
+            try:
+                file_stat = os.lstat(pjoin(pkg_path, path))
+            except FileNotFoundError:
+                # skip files removed since being listed
+                continue
+            if stat.S_ISREG(file_stat.st_mode):
+                if file_stat.st_mode & 0o111:
+                    yield ExecutableFile(path, pkg=pkg)
+                if file_stat.st_size == 0:
+                    yield EmptyFile(path, pkg=pkg)
+                else:
+                    files_by_size[file_stat.st_size].append((path, blob))
+                    if file_stat.st_size > 20480:
+                        yield SizeViolation(path, file_stat.st_size, pkg=pkg)
+                banned_chars = set(os.path.basename(path)) - allowed_filename_chars_set
+                if banned_chars:
+                    yield BannedCharacter(path, sorted(banned_chars), pkg=pkg)
 
         files_by_digest = defaultdict(list)
         for size, files in files_by_size.items():
             if len(files) > 1:
-                for f in files:
-                    digest = get_chksums(pjoin(pkg_path, f), self.digest_algo)[0]
+                for f, blob in files:
+                    digest = self.digest(pjoin(pkg_path, f), blob)
                     files_by_digest[digest].append(f)
 
         for digest, files in files_by_digest.items():
@@ -279,6 +320,7 @@ class EqualVersionsCheck(Check):
     scope = base.package_scope
     _source = sources.PackageRepoSource
     known_results = frozenset([EqualVersions])
+    pkg_attrs = frozenset(['versioned_atom', 'fullver'])
 
     def feed(self, pkgset):
         equal_versions = defaultdict(set)
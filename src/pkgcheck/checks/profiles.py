@@ -1,6 +1,6 @@
 import os
 from collections import defaultdict
-from itertools import chain, filterfalse
+from itertools import filterfalse
 
 from pkgcore.ebuild import atom, misc
 from pkgcore.ebuild import profiles as profiles_mod
@@ -92,7 +92,7 @@ class _ProfileNode(profiles_mod.ProfileNode):
 class ProfilesCheck(Check):
     """Scan repo profiles for unknown flags/packages."""
 
-    required_addons = (addons.UseAddon,)
+    required_addons = (addons.UseAddon, addons.KeywordsAddon)
     scope = base.profiles_scope
     _source = (sources.EmptySource, (), (('scope', base.profiles_scope),))
     known_results = frozenset([
@@ -100,7 +100,7 @@ class ProfilesCheck(Check):
         UnknownProfilePackageKeywords, ProfileWarning, ProfileError,
     ])
 
-    def __init__(self, *args, use_addon):
+    def __init__(self, *args, use_addon, keywords_addon):
         super().__init__(*args)
         self.repo = self.options.target_repo
         self.search_repo = self.options.search_repo
@@ -109,13 +109,9 @@ class ProfilesCheck(Check):
         self.non_profile_dirs = frozenset(
             pjoin(self.profiles_dir, x) for x in addons.ProfileAddon.non_profile_dirs)
 
-        # TODO: move this and the same support in metadata.KeywordsCheck to a shared addon
-        special_keywords = {'-*'}
-        stable_keywords = self.options.target_repo.known_arches
-        unstable_keywords = {'~' + x for x in stable_keywords}
-        disabled_keywords = {'-' + x for x in chain(stable_keywords, unstable_keywords)}
-        self.valid_keywords = (
-            special_keywords | stable_keywords | unstable_keywords | disabled_keywords)
+        # profiles can also disable unstable keywords
+        self.valid_keywords = keywords_addon.valid | {
+            f'-{x}' for x in keywords_addon.unstable}
 
     @jit_attr
     def available_iuse(self):
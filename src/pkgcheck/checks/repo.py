@@ -1,10 +1,10 @@
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from snakeoil.osutils import pjoin
 
-from .. import base, git, results, sources
+from .. import addons, base, git, results, sources
 from ..packages import RawCPV
-from ..utils import is_binary
 from . import GentooRepoCheck
 
 
@@ -21,35 +21,71 @@ class BinaryFile(results.Error):
 
 
 class RepoDirCheck(GentooRepoCheck):
-    """Scan all files in the repository for issues."""
+    """Scan all files in the repository for issues.
+
+    Files are pulled from the git index for git repos, otherwise directories
+    are scanned in parallel using a thread pool with gitignored subtrees
+    being skipped entirely.
+    """
 
     scope = base.repo_scope
     _source = sources.EmptySource
-    required_addons = (git.GitAddon,)
+    required_addons = (git.GitAddon, addons.BinaryFileAddon)
     known_results = frozenset([BinaryFile])
 
     # repo root level directories that are ignored
     ignored_root_dirs = frozenset(['.git'])
 
-    def __init__(self, *args, git_addon):
+    def __init__(self, *args, git_addon, binary_file_addon):
         super().__init__(*args)
-        self.gitignored = git_addon.gitignored
+        self.git_addon = git_addon
+        self.gitignored = git_addon.gitignore_match
+        self.is_binary = binary_file_addon.is_binary
+        self.binary_file_addon = binary_file_addon
         self.repo = self.options.target_repo
-        self.ignored_paths = {
-            pjoin(self.repo.location, x) for x in self.ignored_root_dirs}
-        self.dirs = [self.repo.location]
 
-    def finish(self):
-        while self.dirs:
-            for entry in os.scandir(self.dirs.pop()):
+    def _scan_dir(self, path, rel_path):
+        """Scan a directory, returning its subdirectories and binary files."""
+        dirs, binaries = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                entry_path = rel_path + entry.name
                 if entry.is_dir(follow_symlinks=False):
-                    if entry.path in self.ignored_paths or self.gitignored(entry.path):
-                        continue
-                    self.dirs.append(entry.path)
-                elif is_binary(entry.path):
-                    if not self.gitignored(entry.path):
-                        rel_path = entry.path[len(self.repo.location) + 1:]
-                        yield BinaryFile(rel_path)
+                    if rel_path or entry.name not in self.ignored_root_dirs:
+                        if not self.gitignored(entry_path):
+                            dirs.append((entry.path, entry_path + os.sep))
+                elif not self.gitignored(entry_path) and self.is_binary(entry.path):
+                    binaries.append(entry_path)
+        return dirs, binaries
+
+    def _walk_binaries(self, executor):
+        """Generator of binary files found by walking the repo."""
+        futures = {executor.submit(self._scan_dir, self.repo.location, '')}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirs, binaries = future.result()
+                yield from binaries
+                futures.update(executor.submit(self._scan_dir, *x) for x in dirs)
+
+    def _git_binaries(self, executor, git_files):
+        """Generator of binary files found in the repo's git file listing."""
+        paths = [path for path, _entry in git_files.walk()]
+        location = self.repo.location
+        binaries = executor.map(self.is_binary, (pjoin(location, x) for x in paths))
+        return (path for path, binary in zip(paths, binaries) if binary)
+
+    def finish(self):
+        git_files = self.git_addon.files
+        with ThreadPoolExecutor() as executor:
+            if git_files is not None:
+                binaries = sorted(self._git_binaries(executor, git_files))
+            else:
+                binaries = sorted(self._walk_binaries(executor))
+        self.binary_file_addon.save()
+
+        for path in binaries:
+            yield BinaryFile(path)
 
 
 class EmptyCategoryDir(results.CategoryResult, results.Warning):
@@ -1,15 +1,18 @@
 from collections import defaultdict
 from difflib import SequenceMatcher
 from itertools import chain
+from operator import itemgetter
 
 from pkgcore import fetch
+from pkgcore.ebuild.cpv import VersionedCPV
 from snakeoil.contexts import patch
 from snakeoil.klass import jit_attr
 from snakeoil.sequences import iflatten_instance
 from snakeoil.strings import pluralism
 
 from .. import addons, base, results, sources
-from . import Check
+from ..aggregate import Aggregator
+from . import Check, MapReduceCheck
 
 
 class MultiMovePackageUpdate(results.ProfilesResult, results.Warning):
@@ -149,7 +152,7 @@ class UnusedLicenses(results.Warning):
         return f'unused license{s}: {licenses}'
 
 
-class UnusedLicensesCheck(Check):
+class UnusedLicensesCheck(MapReduceCheck):
     """Check for unused license files."""
 
     scope = base.repo_scope
@@ -166,9 +169,14 @@ class UnusedLicensesCheck(Check):
             master_licenses.update(repo.licenses)
         self.unused_licenses = set(self.options.target_repo.licenses) - master_licenses
 
-    def feed(self, pkg):
+    def map(self, pkg):
         self.unused_licenses.difference_update(iflatten_instance(pkg.license))
-        yield from ()
+
+    def state(self):
+        return self.unused_licenses
+
+    def reduce(self, state):
+        self.unused_licenses.intersection_update(state)
 
     def finish(self):
         if self.unused_licenses:
@@ -210,7 +218,7 @@ class _MirrorsCheck(Check):
         return set(mirrors)
 
 
-class UnusedMirrorsCheck(_MirrorsCheck):
+class UnusedMirrorsCheck(_MirrorsCheck, MapReduceCheck):
     """Check for unused mirrors."""
 
     scope = base.repo_scope
@@ -223,10 +231,15 @@ class UnusedMirrorsCheck(_MirrorsCheck):
             master_mirrors.update(repo.mirrors.keys())
         self.unused_mirrors = set(self.options.target_repo.mirrors.keys()) - master_mirrors
 
-    def feed(self, pkg):
+    def map(self, pkg):
         if self.unused_mirrors:
             self.unused_mirrors.difference_update(self._get_mirrors(pkg))
-        yield from ()
+
+    def state(self):
+        return self.unused_mirrors
+
+    def reduce(self, state):
+        self.unused_mirrors.intersection_update(state)
 
     def finish(self):
         if self.unused_mirrors:
@@ -251,27 +264,23 @@ class UnusedEclassesCheck(Check):
     """Check for unused eclasses."""
 
     scope = base.repo_scope
-    _source = sources.RepositoryRepoSource
+    _source = sources.EmptySource
+    required_addons = (addons.EclassAddon,)
     known_results = frozenset([UnusedEclasses])
 
-    def __init__(self, *args):
+    def __init__(self, *args, eclass_addon):
         super().__init__(*args)
-        self.unused_eclasses = None
+        self.eclass_addon = eclass_addon
 
-    def start(self):
+    def finish(self):
         master_eclasses = set()
         for repo in self.options.target_repo.masters:
             master_eclasses.update(repo.eclass_cache.eclasses.keys())
-        self.unused_eclasses = set(
+        unused_eclasses = set(
             self.options.target_repo.eclass_cache.eclasses.keys()) - master_eclasses
-
-    def feed(self, pkg):
-        self.unused_eclasses.difference_update(pkg.inherited)
-        yield from ()
-
-    def finish(self):
-        if self.unused_eclasses:
-            yield UnusedEclasses(sorted(self.unused_eclasses))
+        unused_eclasses.difference_update(self.eclass_addon.index)
+        if unused_eclasses:
+            yield UnusedEclasses(sorted(unused_eclasses))
 
 
 class UnknownLicenses(results.Warning):
@@ -363,7 +372,7 @@ def _dfs(graph, start, visited=None):
     return visited
 
 
-class GlobalUseCheck(Check):
+class GlobalUseCheck(MapReduceCheck):
     """Check global USE and USE_EXPAND flags for various issues."""
 
     scope = base.repo_scope
@@ -373,7 +382,7 @@ class GlobalUseCheck(Check):
 
     def __init__(self, *args, use_addon):
         super().__init__(*args)
-        self.global_flag_usage = defaultdict(set)
+        self.global_flag_usage = Aggregator()
         self.repo = self.options.target_repo
 
     @jit_attr
@@ -395,14 +404,20 @@ class GlobalUseCheck(Check):
         for repo in self.options.target_repo.masters:
             master_flags.update(flag for matcher, (flag, desc) in repo.config.use_desc)
 
-    def feed(self, pkgs):
+    def map(self, pkgs):
         # ignore bad XML, it will be caught by metadata.xml checks
         local_use = set(pkgs[0].local_use.keys())
+        pkg_global_use = set()
         for pkg in pkgs:
-            pkg_global_use = pkg.iuse_stripped.difference(local_use)
-            for flag in pkg_global_use:
-                self.global_flag_usage[flag].add(pkg.unversioned_atom)
-        yield from ()
+            pkg_global_use.update(pkg.iuse_stripped.difference(local_use))
+        for flag in pkg_global_use:
+            self.global_flag_usage.add(flag, pkgs[0].key)
+
+    def state(self):
+        return self.global_flag_usage
+
+    def reduce(self, state):
+        self.global_flag_usage.update(state)
 
     @staticmethod
     def _similar_flags(pkgs):
@@ -440,20 +455,28 @@ class GlobalUseCheck(Check):
                 yield [pkgs[i][0] for i in component]
 
     def finish(self):
+        # stream aggregated flag usage, only retaining rarely used global flags
+        used_flags = set()
+        rare_flags = {}
+        with self.global_flag_usage:
+            for flag, pkgs in self.global_flag_usage.items():
+                used_flags.add(flag)
+                pkgs = set(pkgs)
+                if len(pkgs) < 5 and flag in self.global_use:
+                    rare_flags[flag] = pkgs
+
         unused_global_flags = []
         potential_locals = []
         for flag in self.global_use.keys():
-            pkgs = self.global_flag_usage[flag]
-            if not pkgs:
+            if flag not in used_flags:
                 unused_global_flags.append(flag)
-            elif len(pkgs) < 5:
-                potential_locals.append((flag, pkgs))
+            elif flag in rare_flags:
+                potential_locals.append((flag, rare_flags[flag]))
 
         if unused_global_flags:
             yield UnusedGlobalUse(sorted(unused_global_flags))
         for flag, pkgs in sorted(potential_locals, key=lambda x: len(x[1])):
-            pkgs = sorted(map(str, pkgs))
-            yield PotentialLocalUse(flag, pkgs)
+            yield PotentialLocalUse(flag, sorted(pkgs))
 
         local_use = defaultdict(list)
         for pkg, (flag, desc) in self.local_use:
@@ -550,7 +573,7 @@ class ManifestCheck(Check):
     extraneous entries, and that the required hashes are in use.
     """
 
-    required_addons = (addons.UseAddon,)
+    required_addons = (addons.UseAddon, addons.ManifestAddon)
     scope = base.package_scope
     _source = sources.PackageRepoSource
     known_results = frozenset([
@@ -558,8 +581,9 @@ class ManifestCheck(Check):
         DeprecatedChksum,
     ])
 
-    def __init__(self, *args, use_addon):
+    def __init__(self, *args, use_addon, manifest_addon):
         super().__init__(*args)
+        self.manifest_addon = manifest_addon
         repo = self.options.target_repo
         self.preferred_checksums = frozenset(
             repo.config.manifests.hashes if hasattr(repo, 'config') else ())
@@ -568,7 +592,7 @@ class ManifestCheck(Check):
         self.iuse_filter = use_addon.get_filter('fetchables')
 
     def feed(self, pkgset):
-        pkg_manifest = pkgset[0].manifest
+        pkg_manifest = self.manifest_addon.manifest(pkgset[0])
         manifest_distfiles = set(pkg_manifest.distfiles.keys())
         seen = set()
         for pkg in pkgset:
@@ -648,60 +672,95 @@ class MatchingChksums(results.VersionResult, results.Warning):
         return msg
 
 
-class ManifestCollisionCheck(Check):
+class ManifestCollisionCheck(MapReduceCheck):
     """Search Manifest entries for different types of distfile collisions.
 
     In particular, search for matching filenames with different checksums and
     different filenames with matching checksums.
+
+    Results are generated once Manifest entries from all package partitions
+    are merged, with entries compared in repo order so the same packages are
+    reported as colliding regardless of how packages were partitioned.
     """
 
     scope = base.repo_scope
     _source = (sources.RepositoryRepoSource, (), (('source', sources.PackageRepoSource),))
+    required_addons = (addons.ManifestAddon,)
     known_results = frozenset([ConflictingChksums, MatchingChksums])
 
-    def __init__(self, *args):
+    def __init__(self, *args, manifest_addon):
         super().__init__(*args)
-        self.seen_files = {}
-        self.seen_chksums = {}
+        self.manifest_addon = manifest_addon
+        # Manifest entries grouped by distfile name and by checksums
+        self.distfiles = Aggregator()
+        self.chksums_map = Aggregator()
 
-    def _conflicts(self, pkg):
-        """Check for similarly named distfiles with different checksums."""
-        for filename, chksums in pkg.manifest.distfiles.items():
-            existing = self.seen_files.get(filename)
-            if existing is None:
-                self.seen_files[filename] = (
-                    [pkg.key], dict(chksums.items()))
-                continue
-            seen_pkgs, seen_chksums = existing
-            conflicting_chksums = []
-            for chf_type, value in seen_chksums.items():
-                our_value = chksums.get(chf_type)
-                if our_value is not None and our_value != value:
-                    conflicting_chksums.append(chf_type)
-            if conflicting_chksums:
-                pkgs = map(str, sorted(seen_pkgs))
-                yield ConflictingChksums(filename, sorted(conflicting_chksums), pkgs, pkg=pkg)
-            else:
-                seen_chksums.update(chksums)
-                seen_pkgs.append(pkg.key)
+    @staticmethod
+    def _feed_order(entry):
+        """Sort key for entries matching the order packages are fed during sequential scans."""
+        pkg, pos = entry[:2]
+        return pkg.category, pkg.package, pos
 
-    def _matching(self, pkg):
+    def _conflicts(self, distfiles):
+        """Check for similarly named distfiles with different checksums."""
+        for filename, entries in distfiles.items():
+            # merged partial states can be out of order
+            entries.sort(key=self._feed_order)
+            pkg, _pos, chksums = entries[0]
+            seen_pkgs = [pkg.key]
+            seen_chksums = dict(chksums.items())
+            for pkg, pos, chksums in entries[1:]:
+                conflicting_chksums = []
+                for chf_type, value in seen_chksums.items():
+                    our_value = chksums.get(chf_type)
+                    if our_value is not None and our_value != value:
+                        conflicting_chksums.append(chf_type)
+                if conflicting_chksums:
+                    pkgs = map(str, sorted(seen_pkgs))
+                    yield pkg, (0, pos), ConflictingChksums(
+                        filename, sorted(conflicting_chksums), pkgs, pkg=pkg)
+                else:
+                    seen_chksums.update(chksums)
+                    seen_pkgs.append(pkg.key)
+
+    def _matching(self, chksums_map):
         """Check for distfiles with matching checksums and different names."""
-        for filename, chksums in pkg.manifest.distfiles.items():
-            key = tuple(chksums.values())
-            existing = self.seen_chksums.get(key)
-            if existing is None:
-                self.seen_chksums[key] = (pkg.key, filename)
-                continue
-            seen_pkg, seen_file = existing
-            if seen_file == filename:
-                continue
-            yield MatchingChksums(filename, seen_file, seen_pkg, pkg=pkg)
-
-    def feed(self, pkgs):
+        for _chksums, entries in chksums_map.items():
+            # merged partial states can be out of order
+            entries.sort(key=self._feed_order)
+            seen_pkg, _pos, seen_file = entries[0]
+            for pkg, pos, filename in entries[1:]:
+                if seen_file != filename:
+                    yield pkg, (1, pos), MatchingChksums(
+                        filename, seen_file, seen_pkg.key, pkg=pkg)
+
+    def map(self, pkgs):
         pkg = pkgs[0]
-        yield from self._conflicts(pkg)
-        yield from self._matching(pkg)
+        # store bare CPVs so partial states can be pickled
+        cpv = VersionedCPV(pkg.cpvstr)
+        distfiles = self.manifest_addon.distfiles(pkg)
+        for pos, (filename, chksums) in enumerate(distfiles.items()):
+            self.distfiles.add(filename, (cpv, pos, chksums))
+            self.chksums_map.add(tuple(chksums.values()), (cpv, pos, filename))
+
+    def state(self):
+        return self.distfiles, self.chksums_map
+
+    def reduce(self, state):
+        distfiles, chksums_map = state
+        self.distfiles.update(distfiles)
+        self.chksums_map.update(chksums_map)
+
+    def finish(self):
+        # output results per package in Manifest order, conflicts first
+        pkg_results = defaultdict(list)
+        with self.distfiles, self.chksums_map:
+            for pkg, key, result in chain(
+                    self._conflicts(self.distfiles), self._matching(self.chksums_map)):
+                pkg_results[(pkg.category, pkg.package)].append((key, result))
+        for _pkg, pkg_results in sorted(pkg_results.items(), key=itemgetter(0)):
+            for _key, result in sorted(pkg_results, key=itemgetter(0)):
+                yield result
 
 
 class EmptyProject(results.Warning):
@@ -5,7 +5,7 @@ from typing import NamedTuple
 from snakeoil.demandload import demand_compile_regexp
 from snakeoil.strings import pluralism
 
-from .. import results, sources
+from .. import addons, results, sources
 from . import Check
 
 demand_compile_regexp('indent_regexp', '^\t* \t+')
@@ -122,17 +122,26 @@ class WhitespaceCheck(Check):
     """Scan ebuild for useless whitespace."""
 
     _source = sources.EbuildFileRepoSource
+    required_addons = (addons.LineScannerAddon,)
     known_results = frozenset([
         WhitespaceFound, WrongIndentFound, DoubleEmptyLine,
         TrailingEmptyLine, NoFinalNewline, BadWhitespaceCharacter
     ])
 
-    def __init__(self, *args):
+    def __init__(self, *args, line_scanner_addon):
         super().__init__(*args)
+        self.scanner = line_scanner_addon
         bad_whitespace = ''.join(whitespace_data.chars)
-        self.bad_whitespace_regex = re.compile(rf'(?P<char>[{bad_whitespace}])')
+        self.bad_whitespace_key = self.scanner.register(
+            rf'(?P<char>[{bad_whitespace}])', trigger=rf'[{bad_whitespace}]',
+            method='finditer')
 
     def feed(self, pkg):
+        for _key, lineno, line, match in self.scanner.matches(pkg, self.bad_whitespace_key):
+            yield BadWhitespaceCharacter(
+                repr(match.group('char')), match.end('char'),
+                line=repr(line), lineno=lineno, pkg=pkg)
+
         lastlineempty = False
         trailing = []
         leading = []
@@ -140,11 +149,6 @@ class WhitespaceCheck(Check):
         double_empty = []
 
         for lineno, line in enumerate(pkg.lines, 1):
-            for match in self.bad_whitespace_regex.finditer(line):
-                yield BadWhitespaceCharacter(
-                    repr(match.group('char')), match.end('char'),
-                    line=repr(line), lineno=lineno, pkg=pkg)
-
             if line != '\n':
                 lastlineempty = False
                 if line[-2:-1] == ' ' or line[-2:-1] == '\t':
@@ -3,12 +3,14 @@
 import argparse
 import os
 import pickle
+import re
 import shlex
 import subprocess
 import sys
 from collections import UserDict
 from contextlib import AbstractContextManager
 from functools import partial
+from typing import NamedTuple, Optional
 
 from pathspec import PathSpec
 from pkgcore.ebuild import cpv
@@ -26,8 +28,7 @@ from snakeoil.process import CommandNotFound, find_binary
 from snakeoil.process.spawn import spawn_get_output
 from snakeoil.strings import pluralism
 
-from . import base, caches, objects
-from .checks import GitCheck
+from . import addons, base, caches, objects
 from .log import logger
 
 # hacky path regexes for git log parsing, proper validation is handled later
@@ -36,6 +37,7 @@ _ebuild_path_regex = '(?P<category>[^/]+)/(?P<PN>[^/]+)/(?P<P>[^/]+)\\.ebuild'
 demand_compile_regexp('ebuild_ADM_regex', fr'^(?P<status>[ADM])\t{_ebuild_path_regex}$')
 demand_compile_regexp('ebuild_R_regex', fr'^(?P<status>R)\d+\t{_ebuild_path_regex}\t{_ebuild_path_regex_raw}$')
 demand_compile_regexp('eclass_regex', r'^eclass/(?P<eclass>\S+)\.eclass$')
+demand_compile_regexp('_named_group_re', r'(?<!\\)\(\?P<\w+>')
 
 
 class GitCommit:
@@ -64,6 +66,122 @@ class GitPkgChange:
         self.commit = commit
 
 
+class GitFile(NamedTuple):
+    """File entry from a git repo's index."""
+    # file mode, None for untracked or modified files
+    mode: Optional[int]
+    # blob ID, None if the working tree content doesn't match the index
+    blob: Optional[str]
+
+
+class GitFiles:
+    """Prefix-queryable tree of the files in a git repo's working tree.
+
+    Includes all tracked files along with untracked files that aren't ignored.
+    Tracked files have their mode and blob ID from the index if their working
+    tree state matches the index.
+    """
+
+    # git command listing files, tagging each entry with its status
+    _git_cmd = (
+        'git', 'ls-files', '-z', '-t', '--stage', '--others',
+        '--exclude-standard', '--deleted', '--modified')
+
+    def __init__(self, entries=()):
+        self._tree = {}
+        for path, entry in entries:
+            node = self._tree
+            *dirs, name = path.split('/')
+            for d in dirs:
+                node = node.setdefault(d, {})
+            node[name] = entry
+
+    @classmethod
+    def from_repo(cls, path, paths=()):
+        """Create a file tree for a given git repo path, optionally limited to the given paths."""
+        cmd = cls._git_cmd
+        if paths:
+            cmd += ('--',) + tuple(paths)
+        p = subprocess.run(
+            cmd, cwd=path, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return cls(cls._parse(p.stdout))
+
+    @staticmethod
+    def _parse(data):
+        """Parse tagged ``git ls-files --stage`` output into file entries."""
+        files = {}
+        removed = set()
+        for record in data.split(b'\0'):
+            if not record:
+                continue
+            tag, record = record[:1], record[2:]
+            if tag == b'?':
+                files[os.fsdecode(record)] = GitFile(None, None)
+                continue
+            info, path = record.split(b'\t', 1)
+            path = os.fsdecode(path)
+            if tag in (b'R', b'S'):
+                # removed from or skipped in the working tree
+                removed.add(path)
+            elif tag == b'C':
+                files[path] = GitFile(None, None)
+            elif path not in files:
+                mode, blob, stage = info.split()
+                if stage == b'0':
+                    files[path] = GitFile(int(mode, 8), blob.decode())
+                else:
+                    # unmerged entries with conflicting content
+                    files[path] = GitFile(None, None)
+        return ((k, v) for k, v in files.items() if k not in removed)
+
+    def _node(self, path):
+        node = self._tree
+        if path:
+            for name in path.strip('/').split('/'):
+                node = node.get(name)
+                if not isinstance(node, dict):
+                    return None
+        return node
+
+    def __contains__(self, path):
+        return self.get(path) is not None or self._node(path) is not None
+
+    def get(self, path):
+        """Return the entry for a given file, None if it doesn't exist."""
+        d, _, name = path.rpartition('/')
+        node = self._node(d)
+        if node is not None:
+            entry = node.get(name)
+            if isinstance(entry, GitFile):
+                return entry
+        return None
+
+    def isdir(self, path):
+        """Determine if a given directory exists, implying it contains files."""
+        return self._node(path) is not None
+
+    def listdir(self, path=''):
+        """Return the names of all files and directories in a given directory."""
+        node = self._node(path)
+        return list(node) if node is not None else []
+
+    def walk(self, path=''):
+        """Generator of (path, entry) tuples for all files under a given directory."""
+        node = self._node(path)
+        if node is None:
+            return
+        prefix = f"{path.strip('/')}/" if path.strip('/') else ''
+        stack = [(prefix, node)]
+        while stack:
+            prefix, node = stack.pop()
+            for name, entry in node.items():
+                if isinstance(entry, dict):
+                    stack.append((f'{prefix}{name}/', entry))
+                else:
+                    yield f'{prefix}{name}', entry
+
+
 class ParsedGitRepo(UserDict, caches.Cache):
     """Parse repository git logs."""
 
@@ -114,8 +232,15 @@ class ParsedGitRepo(UserDict, caches.Cache):
 
     @classmethod
     def parse_git_log(cls, repo_path, git_cmd=None, commit=None,
-                      pkgs=False, debug=False):
-        """Parse git log output."""
+                      pkgs=False, commits=None, debug=False):
+        """Parse git log output.
+
+        Commit objects are yielded by default while package changes are
+        yielded if ``pkgs`` is enabled. Both can be yielded from a single pass
+        by enabling ``pkgs`` and ``commits``.
+        """
+        if commits is None:
+            commits = not pkgs
         if git_cmd is None:
             git_cmd = cls._git_cmd
         cmd = shlex.split(git_cmd) if isinstance(git_cmd, str) else git_cmd
@@ -172,7 +297,7 @@ class ParsedGitRepo(UserDict, caches.Cache):
                 count += 1
 
                 commit = GitCommit(hash, commit_date, author, committer, message)
-                if not pkgs:
+                if commits:
                     yield commit
 
                 # file changes
@@ -186,12 +311,14 @@ class ParsedGitRepo(UserDict, caches.Cache):
                             atom, status = parsed
                             yield GitPkgChange(atom, status, commit)
 
-    def _pkg_changes(self, local=False, **kwargs):
-        """Parse package changes from git log output."""
-        cmd = shlex.split(self._git_cmd)
+    def _pkg_changes(self, local=False, changes=None, **kwargs):
+        """Parse package changes from git log output if not passed in."""
+        if changes is None:
+            cmd = shlex.split(self._git_cmd)
+            changes = self.parse_git_log(self.location, cmd, pkgs=True, **kwargs)
 
         seen = set()
-        for pkg in self.parse_git_log(self.location, cmd, pkgs=True, **kwargs):
+        for pkg in changes:
             atom = pkg.atom
             key = (atom, pkg.status)
             if key not in seen:
@@ -270,8 +397,7 @@ class _ScanCommits(argparse.Action):
         super().__init__(*args, **kwargs)
 
     def __call__(self, parser, namespace, value, option_string=None):
-        namespace.forced_checks.extend(
-            name for name, cls in objects.CHECKS.items() if issubclass(cls, GitCheck))
+        namespace.forced_checks.extend(objects.CHECKS.select('checks.GitCheck'))
         setattr(namespace, self.dest, value)
 
 
@@ -318,6 +444,88 @@ class GitStash(AbstractContextManager):
                 self.parser.error(f'git failed applying stash: {error}')
 
 
+class GitRepoSnapshot:
+    """Memoized git data for a repo, shared by all its consumers during a scan.
+
+    Ref resolutions and changed path queries are cached while local commits
+    and their related package changes are parsed from a single git log pass
+    on first use.
+    """
+
+    # commit range for local changes that haven't been pushed upstream yet
+    local_range = 'origin/HEAD..master'
+
+    def __init__(self, location):
+        self.location = location
+        self._refs = {}
+        self._changed_paths = {}
+
+    def get_commit_hash(self, commit='origin/HEAD'):
+        """Retrieve the commit hash for a specific commit object."""
+        try:
+            hash = self._refs[commit]
+        except KeyError:
+            try:
+                hash = GitAddon.get_commit_hash(self.location, commit)
+            except ValueError as e:
+                hash = e
+            self._refs[commit] = hash
+        if isinstance(hash, ValueError):
+            raise ValueError(*hash.args)
+        return hash
+
+    def changed_paths(self, ref, paths=()):
+        """Return the paths with committed or staged changes compared to a given ref.
+
+        Raises ValueError if git fails to compare against the ref.
+        """
+        key = (ref, tuple(paths))
+        try:
+            return self._changed_paths[key]
+        except KeyError:
+            pass
+        p = subprocess.run(
+            ['git', 'diff', '--cached', ref, '--name-only'] + list(paths),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=self.location, encoding='utf8')
+        if p.returncode != 0:
+            raise ValueError(p.stderr.splitlines()[0])
+        changed = self._changed_paths[key] = tuple(p.stdout.splitlines())
+        return changed
+
+    @jit_attr
+    def _local_log(self):
+        """Local commits and package changes parsed from git log output."""
+        commits, changes = [], []
+        for x in ParsedGitRepo.parse_git_log(
+                self.location, commit=self.local_range, pkgs=True, commits=True):
+            if isinstance(x, GitCommit):
+                commits.append(x)
+            else:
+                changes.append(x)
+        return tuple(commits), tuple(changes)
+
+    @property
+    def local(self):
+        """Determine if local commits exist that haven't been pushed upstream."""
+        return self.get_commit_hash() != self.get_commit_hash('master')
+
+    @property
+    def commits(self):
+        """Tuple of local commits."""
+        return self._local_log[0]
+
+    @property
+    def pkg_changes(self):
+        """Tuple of package changes from local commits."""
+        return self._local_log[1]
+
+    @jit_attr
+    def pkg_repo(self):
+        """Parsed git repo of package changes from local commits."""
+        return ParsedGitRepo(self, local=True, changes=self.pkg_changes)
+
+
 class GitAddon(base.Addon, caches.CachedAddon):
     """Git repo support for various checks.
 
@@ -338,6 +546,9 @@ class GitAddon(base.Addon, caches.CachedAddon):
     # cache registry
     cache = caches.CacheData(type='git', file='git.pickle', version=3)
 
+    # max number of targeted packages that file listings are limited to
+    _max_listed_pkgs = 1000
+
     @classmethod
     def mangle_argparser(cls, parser):
         group = parser.add_argument_group('git', docs=cls.__doc__)
@@ -358,6 +569,15 @@ class GitAddon(base.Addon, caches.CachedAddon):
                 Note that will also enable eclass-specific checks if it
                 determines any commits have been made to eclasses.
             """)
+        group.add_argument(
+            '--eclass-consumers', action='store_true',
+            help='scan packages inheriting eclasses changed by --commits',
+            docs="""
+                When eclass changes are found while determining scan targets
+                via --commits, also scan all packages inheriting the changed
+                eclasses. Inheriting packages are determined using the
+                eclass cache, which is generated on first use.
+            """)
 
     @staticmethod
     def _committed_eclass(committed, eclass):
@@ -386,27 +606,31 @@ class GitAddon(base.Addon, caches.CachedAddon):
             targets = list(repo.category_dirs)
             if os.path.isdir(pjoin(repo.location, 'eclass')):
                 targets.append('eclass')
+            # git data snapshot reused by the addon during the scan
+            snapshot = GitRepoSnapshot(repo.location)
             try:
-                p = subprocess.run(
-                    ['git', 'diff', '--cached', ref, '--name-only'] + targets,
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                    cwd=repo.location, encoding='utf8')
+                paths = snapshot.changed_paths(ref, targets)
             except FileNotFoundError:
                 parser.error('git not available to determine targets for --commits')
+            except ValueError as e:
+                parser.error(f'failed running git: {e}')
 
-            if p.returncode != 0:
-                error = p.stderr.splitlines()[0]
-                parser.error(f'failed running git: {error}')
-            elif not p.stdout:
+            if not paths:
                 # no changes exist, exit early
                 parser.exit()
 
             pkgs, eclasses = partition(
-                p.stdout.splitlines(), predicate=lambda x: x.startswith('eclass/'))
-            pkgs = sorted(cls._pkg_atoms(pkgs))
+                paths, predicate=lambda x: x.startswith('eclass/'))
+            pkgs = set(cls._pkg_atoms(pkgs))
             eclasses = filter(None, (eclass_regex.match(x) for x in eclasses))
             eclasses = sorted(x.group('eclass') for x in eclasses)
 
+            if eclasses and namespace.eclass_consumers:
+                eclass_addon = addons.EclassAddon(namespace)
+                for eclass in eclasses:
+                    pkgs.update(map(atom_cls, eclass_addon.packages(eclass)))
+            pkgs = sorted(pkgs)
+
             restrictions = []
             if pkgs:
                 restrict = packages.OrRestriction(*pkgs)
@@ -422,6 +646,7 @@ class GitAddon(base.Addon, caches.CachedAddon):
 
             namespace.contexts.append(GitStash(parser, repo))
             namespace.restrictions = restrictions
+            namespace.git_snapshot = snapshot
 
     def __init__(self, *args):
         super().__init__(*args)
@@ -434,6 +659,17 @@ class GitAddon(base.Addon, caches.CachedAddon):
 
         # mapping of repo locations to their corresponding git repo caches
         self._cached_repos = {}
+        self.reset_snapshots()
+
+    def reset_snapshots(self):
+        """Drop git data snapshots and file listings from previous scans."""
+        # file listings are limited to the targets of the scan they're created for
+        vars(self).pop('_files', None)
+        # mapping of repo locations to their git data snapshots
+        self._snapshots = {}
+        snapshot = vars(self.options).get('git_snapshot')
+        if snapshot is not None:
+            self._snapshots[snapshot.location] = snapshot
 
     @jit_attr
     def gitignore(self):
@@ -449,12 +685,63 @@ class GitAddon(base.Addon, caches.CachedAddon):
                 logger.warning(f'failed reading {path!r}: {e}')
         return PathSpec.from_lines('gitwildmatch', patterns)
 
+    @jit_attr
+    def files(self):
+        """Tree of the files in the target repo's git working tree.
+
+        Files are listed from the git index along with untracked files that
+        aren't ignored, allowing checks to avoid walking the filesystem and
+        matching .gitignore settings. Scans targeting specific packages only
+        list the files in their package directories. None is returned for
+        repos not managed by git.
+        """
+        repo = self.options.target_repo
+        if not os.path.exists(pjoin(repo.location, '.git')):
+            return None
+        paths = ()
+        restricts = addons._scan_restricts(self.options)
+        if restricts:
+            pkgs = {
+                (x.category, x.package)
+                for restrict in restricts for x in repo.itermatch(restrict, pkg_filter=None)}
+            if not pkgs:
+                return GitFiles()
+            # fall back to listing the entire repo for large numbers of packages
+            if len(pkgs) <= self._max_listed_pkgs:
+                paths = sorted(pjoin(*x) for x in pkgs)
+        try:
+            return GitFiles.from_repo(repo.location, paths)
+        except FileNotFoundError:
+            logger.debug('git not available for listing repo files')
+        except subprocess.CalledProcessError as e:
+            error = e.stderr.decode(errors='replace').strip()
+            logger.debug(f'failed listing git repo files: {error}')
+        return None
+
+    @jit_attr
+    def gitignore_match(self):
+        """Compiled matching function for repo relative paths against .gitignore settings.
+
+        Without negated patterns, a path is ignored if any pattern matches so
+        all patterns are combined into a single regex. Otherwise pattern order
+        matters and matching falls back to the related path spec.
+        """
+        patterns = [x for x in self.gitignore.patterns if x.include is not None]
+        if any(not x.include for x in patterns):
+            return self.gitignore.match_file
+        if not patterns:
+            return lambda path: False
+        # strip group names since they're duplicated across patterns
+        regex = re.compile('|'.join(
+            _named_group_re.sub('(?:', x.regex.pattern) for x in patterns))
+        return lambda path: regex.match(path) is not None
+
     def gitignored(self, path):
         """Determine if a given path in a repository is matched by .gitignore settings."""
         if path.startswith(self.options.target_repo.location):
             repo_prefix_len = len(self.options.target_repo.location) + 1
             path = path[repo_prefix_len:]
-        return self.gitignore.match_file(path)
+        return self.gitignore_match(path)
 
     @staticmethod
     def get_commit_hash(repo_location, commit='origin/HEAD'):
@@ -469,6 +756,16 @@ class GitAddon(base.Addon, caches.CachedAddon):
                 f'for git repo: {repo_location}')
         return out[0].strip()
 
+    def snapshot(self, location=None):
+        """Return the git data snapshot for a given repo location."""
+        if location is None:
+            location = self.options.target_repo.location
+        try:
+            return self._snapshots[location]
+        except KeyError:
+            snapshot = self._snapshots[location] = GitRepoSnapshot(location)
+            return snapshot
+
     def update_cache(self, output_lock, force=False):
         """Update related cache and push updates to disk."""
         try:
@@ -481,7 +778,7 @@ class GitAddon(base.Addon, caches.CachedAddon):
         if self.options.cache['git']:
             for repo in repos:
                 try:
-                    commit = self.get_commit_hash(repo.location)
+                    commit = self.snapshot(repo.location).get_commit_hash()
                 except ValueError as e:
                     continue
 
@@ -491,6 +788,9 @@ class GitAddon(base.Addon, caches.CachedAddon):
                 git_repo = None
                 cache_repo = True
                 if not force:
+                    # reuse repo data loaded by a previous update, e.g. by the scan daemon
+                    git_repo = self._cached_repos.get(repo.location)
+                if not force and git_repo is None:
                     # try loading cached, historical repo data
                     try:
                         with open(cache_file, 'rb') as f:
@@ -571,11 +871,10 @@ class GitAddon(base.Addon, caches.CachedAddon):
         repo_id = f'{target_repo.repo_id}-commits'
 
         if options.cache['git']:
+            snapshot = self.snapshot(target_repo.location)
             try:
-                origin = self.get_commit_hash(target_repo.location)
-                master = self.get_commit_hash(target_repo.location, commit='master')
-                if origin != master:
-                    git_repo = ParsedGitRepo(target_repo, local=True)
+                if snapshot.local:
+                    git_repo = snapshot.pkg_repo
             except ValueError as e:
                 if str(e):
                     logger.warning('skipping git commit checks: %s', e)
@@ -587,15 +886,15 @@ class GitAddon(base.Addon, caches.CachedAddon):
         commits = iter(())
 
         if self.options.cache['git']:
+            snapshot = self.snapshot(path)
             try:
-                origin = self.get_commit_hash(path)
-                master = self.get_commit_hash(path, commit='master')
+                local = snapshot.local
             except ValueError as e:
                 if str(e):
                     logger.warning('skipping git commit checks: %s', e)
                 return commits
 
-            if origin != master:
-                commits = ParsedGitRepo.parse_git_log(path, commit='origin/HEAD..master')
+            if local:
+                commits = iter(snapshot.commits)
 
         return commits
@@ -0,0 +1,140 @@
+"""Recursive filesystem watching support using inotify."""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from itertools import chain
+
+from snakeoil.cli.exceptions import UserException
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# events signifying file content or directory entry changes
+_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event header: wd, mask, cookie, len
+_event = struct.Struct('iIII')
+
+
+def _libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise UserException('inotify support is required for watching files')
+    return libc
+
+
+def _ignored(name):
+    """Skip hidden files and common editor backup files."""
+    return name.startswith('.') or name.endswith(('~', '.swp', '.swx'))
+
+
+class Watcher:
+    """Recursive directory watcher yielding batches of changed paths.
+
+    :param path: root directory to watch
+    :param delay: seconds to wait for further changes before yielding a batch
+    """
+
+    def __init__(self, path, delay=0.2):
+        self.path = path
+        self.delay = delay
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise UserException(f'failed initializing inotify: {os.strerror(e)}')
+        self._watches = {}
+        self._add_tree(path)
+
+    def _add(self, path):
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), _mask | IN_ONLYDIR)
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e == errno.ENOSPC:
+                raise UserException(
+                    'inotify watch limit reached, increase '
+                    'fs.inotify.max_user_watches to watch this repo')
+            # directory was removed or replaced by a file
+            return
+        self._watches[wd] = path
+
+    def _add_tree(self, path):
+        """Watch a directory and all its non-hidden subdirectories.
+
+        Returns all paths found under the directory since they may have been
+        created before the watches were added.
+        """
+        paths = []
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [x for x in dirs if not _ignored(x)]
+            self._add(root)
+            paths.extend(os.path.join(root, x) for x in chain(dirs, files) if not _ignored(x))
+        return paths
+
+    def _read(self):
+        """Return the set of changed paths for all pending events."""
+        paths = set()
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return paths
+
+            i = 0
+            while i < len(data):
+                wd, mask, _cookie, length = _event.unpack_from(data, i)
+                i += _event.size
+                name = data[i:i + length].rstrip(b'\0')
+                i += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped so everything may have changed
+                    paths.add(self.path)
+                    continue
+                elif mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+
+                name = os.fsdecode(name)
+                if _ignored(name) or wd not in self._watches:
+                    continue
+                path = os.path.join(self._watches[wd], name)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.update(self._add_tree(path))
+                paths.add(path)
+
+    def __iter__(self):
+        while True:
+            select.select([self._fd], [], [])
+            paths = self._read()
+            # collect related changes, e.g. editors saving via renames
+            while select.select([self._fd], [], [], self.delay)[0]:
+                paths.update(self._read())
+            if paths:
+                yield paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excinfo):
+        self.close()
@@ -1,4 +1,10 @@
-"""Registration for keywords, checks, and reporters."""
+"""Registration for keywords, checks, addons, and reporters.
+
+Object mappings are backed by registries mapping object names to the modules
+they're defined in along with related metadata, allowing objects to be
+selected by name, class hierarchy, or scope without importing their modules.
+Modules are only imported when their objects are accessed.
+"""
 
 from collections.abc import Mapping
 import inspect
@@ -66,47 +72,138 @@ def _find_obj_classes(module_name, target_cls):
     return classes
 
 
+def _obj_path(cls):
+    """Return the module path relative to the package for a given class."""
+    return cls.__module__.split('.', 1)[1]
+
+
+def _obj_bases(cls):
+    """Return the package-relative names of all package classes a given class inherits."""
+    return tuple(
+        f'{_obj_path(x)}.{x.__name__}' for x in cls.__mro__
+        if x.__module__.startswith(f'{_pkg}.'))
+
+
+def _get_addons(objs):
+    """Return tuple of required addons for a given sequence of objects."""
+    required = {}
+
+    def _required_addons(objs):
+        for addon in objs:
+            if addon not in required:
+                if addon.required_addons:
+                    _required_addons(addon.required_addons)
+                required[addon] = None
+
+    _required_addons(objs)
+    return tuple(required)
+
+
+def _keyword_data(cls):
+    """Registry data for a given keyword class."""
+    return {
+        'module': _obj_path(cls),
+        'bases': _obj_bases(cls),
+        'name': cls.name,
+        'scope': cls.scope.desc,
+    }
+
+
+def _check_data(cls):
+    """Registry data for a given check class."""
+    base_cls = getattr(import_module('.base', _pkg), 'Addon')
+    argparser_cls = next(x for x in cls.__mro__ if 'mangle_argparser' in x.__dict__)
+    return {
+        'module': _obj_path(cls),
+        'bases': _obj_bases(cls),
+        'scope': cls.scope.desc,
+        'results': tuple(sorted(x.__name__ for x in cls.known_results)),
+        'addons': tuple(x.__name__ for x in _get_addons(cls.required_addons)),
+        'argparser': argparser_cls is not base_cls,
+    }
+
+
+def _reporter_data(cls):
+    """Registry data for a given reporter class."""
+    return {
+        'module': _obj_path(cls),
+        'bases': _obj_bases(cls),
+        'priority': cls.priority,
+    }
+
+
+def _find_addon_data():
+    """Registry data for all addons required by registered checks."""
+    checks = import_module('.checks', _pkg)
+    classes = _find_obj_classes('checks', 'checks.Check').values()
+    addons = (x for x in _get_addons(classes) if not issubclass(x, checks.Check))
+    return {
+        cls.__name__: {'module': _obj_path(cls), 'bases': _obj_bases(cls)}
+        for cls in addons}
+
+
+def _find_obj_data(module_name, target_cls, data_func):
+    """Determine registry mapping of object class names to their metadata."""
+    classes = _find_obj_classes(module_name, target_cls)
+    return {name: data_func(cls) for name, cls in classes.items()}
+
+
 class _LazyDict(Mapping):
     """Lazy dictionary of object mappings.
 
-    Used to stall module imports to avoid cyclic import issues."""
+    Used to stall module imports to avoid cyclic import issues and to only
+    import the modules for objects that are actually used.
+    """
 
-    def __init__(self, attr, func_args):
+    def __init__(self, attr, func, *func_args):
         self._attr = attr
+        self._func = func
         self._func_args = func_args
-
-        # Forcibly collapse mapping when running from the git repo, used to
-        # force cache registration to occur as related modules are imported.
-        if _defaults is klass._sentinel:
-            self._dict
+        self._objs = {}
 
     @klass.jit_attr
-    def _dict(self):
+    def _registry(self):
         try:
             result = getattr(_defaults, self._attr)
         except AttributeError:
-            result = _find_obj_classes(*self._func_args)
+            result = self._func(*self._func_args)
         return dict(result)
 
     def __iter__(self):
-        return iter(self._dict.keys())
+        return iter(self._registry.keys())
 
     def __len__(self):
-        return len(list(self._dict.keys()))
+        return len(self._registry)
+
+    def __contains__(self, key):
+        return key in self._registry
 
     def __getitem__(self, key):
-        return self._dict[key]
+        obj = self._objs.get(key)
+        if obj is None:
+            module = import_module(f".{self._registry[key]['module']}", _pkg)
+            obj = self._objs[key] = getattr(module, key)
+        return obj
 
     def keys(self):
-        return iter(self._dict.keys())
+        return iter(self._registry.keys())
 
     def values(self):
-        return iter(self._dict.values())
+        return (self[k] for k in self._registry)
 
     def items(self):
-        return iter(self._dict.items())
+        return ((k, self[k]) for k in self._registry)
+
+    def data(self, key):
+        """Return the registry data for a given object without importing it."""
+        return self._registry[key]
+
+    def select(self, base):
+        """Return the names of objects inheriting from a given package-relative class path."""
+        return tuple(k for k, v in self._registry.items() if base in v['bases'])
 
 
-KEYWORDS = _LazyDict('KEYWORDS', ('checks', 'results.Result'))
-CHECKS = _LazyDict('CHECKS', ('checks', 'checks.Check'))
-REPORTERS = _LazyDict('REPORTERS', ('reporters', 'reporters.Reporter'))
+KEYWORDS = _LazyDict('KEYWORDS', _find_obj_data, 'checks', 'results.Result', _keyword_data)
+CHECKS = _LazyDict('CHECKS', _find_obj_data, 'checks', 'checks.Check', _check_data)
+ADDONS = _LazyDict('ADDONS', _find_addon_data)
+REPORTERS = _LazyDict('REPORTERS', _find_obj_data, 'reporters', 'reporters.Reporter', _reporter_data)
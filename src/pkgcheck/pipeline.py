@@ -1,21 +1,41 @@
 """Pipeline building support for connecting sources and checks."""
 
+import queue
+import time
 import traceback
 from collections import defaultdict, deque
 from concurrent.futures import ThreadPoolExecutor
-from multiprocessing import Pool, Process, SimpleQueue
+from itertools import chain
+from multiprocessing import Process, Queue, Semaphore, SimpleQueue
 
 from pkgcore.package.errors import MetadataException
 from pkgcore.restrictions import boolean, packages
 
-from . import base
+from . import addons, base
+from .checks import MapReduceCheck
 from .results import MetadataError
-from .sources import UnversionedSource, VersionedSource
+from .sources import UnversionedSource, VersionedSource, fused_pkgs
+
+
+class SequencedResults(list):
+    """Results for a scanning task tagged with the task's position in producer order."""
+
+    def __init__(self, seq, results=()):
+        super().__init__(results)
+        self.seq = seq
 
 
 class Pipeline:
     """Check-running pipeline leveraging scope-based parallelism."""
 
+    # fraction of the mean per-job scanning cost a package task must exceed
+    # in order to be dispatched before all other package tasks
+    _hoist_ratio = 1 / 16
+    # number of tasks per job allowed to run ahead of in-order result output
+    _reorder_tasks = 64
+    # seconds between checks for consumers exiting without reporting completion
+    _poll_interval = 1
+
     def __init__(self, options, scan_scope, pipes, restrict):
         self.options = options
         self.scan_scope = scan_scope
@@ -25,24 +45,79 @@ class Pipeline:
         self.pkg_scan = (
             scan_scope in (base.version_scope, base.package_scope) and
             isinstance(restrict, boolean.AndRestriction))
+        self.costs = addons.init_addon(addons.PkgCostAddon, options)
+        # Bound the number of sequenced tasks that can be queued before their
+        # results are output, limiting the results buffered for reordering.
+        self._window = Semaphore(self.jobs * self._reorder_tasks)
+
+    def release(self, tasks=1):
+        """Signal that results for sequenced tasks have been output."""
+        for _ in range(tasks):
+            self._window.release()
+
+    def _schedule(self, restricts):
+        """Order package tasks so the most expensive packages are dispatched first.
+
+        Packages costly enough to stall a worker at the end of a scan are
+        queued first, longest first, while all remaining packages are queued
+        in their original, sorted order. Returns the indices of the hoisted
+        and remaining packages.
+        """
+        if self.jobs == 1 or len(restricts) <= self.jobs:
+            return [], range(len(restricts))
+
+        costs = self.costs.costs(x.key for x in restricts)
+        threshold = sum(costs) / self.jobs * self._hoist_ratio
+        hoisted = sorted(
+            (i for i, cost in enumerate(costs) if cost > threshold),
+            key=lambda i: costs[i], reverse=True)
+        hoisted_set = frozenset(hoisted)
+        return hoisted, [i for i in range(len(restricts)) if i not in hoisted_set]
+
+    def _queue_work(self, scoped_pipes, mapreduce_pipes, work_q, results_q):
+        """Producer that queues scanning tasks against granular scope restrictions.
+
+        Synchronous tasks are tagged with their position in the producer
+        order, allowing their results to be output in a deterministic order.
+        """
+        def put(seq, *task):
+            self._window.acquire()
+            work_q.put((seq,) + task)
 
-    def _queue_work(self, scoped_pipes, work_q, results_q):
-        """Producer that queues scanning tasks against granular scope restrictions."""
         try:
-            for scope in sorted(scoped_pipes['sync'], reverse=True):
+            seq = 0
+            scopes = set(scoped_pipes['sync'])
+            # map-reduce checks are run alongside package level checks
+            if mapreduce_pipes:
+                scopes.add(base.package_scope)
+
+            for scope in sorted(scopes, reverse=True):
                 pipes = scoped_pipes['sync'][scope]
                 if scope is base.version_scope:
                     versioned_source = VersionedSource(self.options)
-                    for restrict in versioned_source.itermatch(self.restrict):
-                        for i in range(len(pipes)):
-                            work_q.put((scope, restrict, i))
+                    restricts = list(versioned_source.itermatch(self.restrict))
+                    # Run all pipes for a version within the same task, only
+                    # splitting them into groups when there are fewer versions
+                    # than consumers.
+                    groups = min(len(pipes), -(-self.jobs // max(len(restricts), 1)))
+                    for restrict in restricts:
+                        for i in range(groups):
+                            put(seq, scope, restrict, tuple(range(i, len(pipes), groups)))
+                            seq += 1
                 elif scope is base.package_scope:
                     unversioned_source = UnversionedSource(self.options)
-                    for restrict in unversioned_source.itermatch(self.restrict):
-                        work_q.put((scope, restrict, 0))
+                    restricts = list(unversioned_source.itermatch(self.restrict))
+                    hoisted, remaining = self._schedule(restricts)
+                    # hoisted tasks run ahead of their output position so
+                    # they're not counted against the reorder window
+                    self.release(len(hoisted))
+                    for i in chain(hoisted, remaining):
+                        put(seq + i, scope, restricts[i], 0)
+                    seq += len(restricts)
                 else:
                     for i in range(len(pipes)):
-                        work_q.put((scope, self.restrict, i))
+                        put(seq, scope, self.restrict, i)
+                        seq += 1
 
             # insert flags to notify consumers that no more work exists
             for i in range(self.jobs):
@@ -57,40 +132,72 @@ class Pipeline:
             tb = traceback.format_exc()
             results_q.put((e, tb))
 
-    def _run_checks(self, pipes, work_q, results_q):
+    def _run_checks(self, pipes, mapreduce_pipes, work_q, results_q, done_q):
         """Consumer that runs scanning tasks, queuing results for output."""
+        timings = {}
+        states = None
+        # skip resolving packages up front if no pipes use sourced packages
+        resolve = defaultdict(bool)
+        for scope, scope_pipes in chain(pipes.items(), [(base.package_scope, mapreduce_pipes)]):
+            resolve[scope] |= any(pipe.source.sourced for pipe in scope_pipes)
         try:
-            for scope, restrict, pipe_idx in iter(work_q.get, None):
-                if scope is base.version_scope:
-                    results_q.put(list(pipes[scope][pipe_idx].run(restrict)))
-                elif scope in (base.package_scope, base.category_scope):
-                    results = []
+            for seq, scope, restrict, pipe_idx in iter(work_q.get, None):
+                results = SequencedResults(seq)
+                if scope == base.version_scope:
+                    # resolve the version once for all pipes
+                    with fused_pkgs(self.options.target_repo, restrict, resolve[scope]):
+                        for i in pipe_idx:
+                            results.extend(pipes[scope][i].run(restrict))
+                    results_q.put(results)
+                elif scope == base.package_scope:
+                    start = time.monotonic()
+                    # resolve packages once for all pipes
+                    with fused_pkgs(self.options.target_repo, restrict, resolve[scope]):
+                        for pipe in chain(pipes[scope], mapreduce_pipes):
+                            results.extend(pipe.run(restrict))
+                    results_q.put(results)
+                    timings[restrict.key] = time.monotonic() - start
+                elif scope == base.category_scope:
                     for pipe in pipes[scope]:
                         results.extend(pipe.run(restrict))
                     results_q.put(results)
                 else:
-                    results = []
                     pipe = pipes[scope][pipe_idx]
                     pipe.start()
                     results.extend(pipe.run(restrict))
                     results.extend(pipe.finish())
                     results_q.put(results)
+            states = [pipe.state() for pipe in mapreduce_pipes]
         except Exception as e:
             # traceback can't be pickled so serialize it
             tb = traceback.format_exc()
             results_q.put((e, tb))
+        finally:
+            # each consumer returns its package timings and partial states exactly once
+            done_q.put((timings, states))
 
     def run(self, results_q):
         """Run the scanning pipeline in parallel by check and scanning scope."""
+        processes = []
         # initialize checkrunners per source type, using separate runner for async checks
         try:
             checkrunners = defaultdict(list)
+            mapreduce_pipes = []
             for pipe_mapping in self.pipes:
                 for (source, exec_type), checks in pipe_mapping.items():
                     if exec_type == 'async':
                         runner = AsyncCheckRunner(
                             self.options, source, checks, results_q=results_q)
                     else:
+                        # split out map-reduce checks for repo scans, running them per package
+                        if not self.pkg_scan and source.feed_type is base.repo_scope:
+                            mapreduce_checks = [x for x in checks if isinstance(x, MapReduceCheck)]
+                            if mapreduce_checks:
+                                mapreduce_pipes.append(
+                                    CheckRunner(self.options, source, mapreduce_checks))
+                                checks = [x for x in checks if not isinstance(x, MapReduceCheck)]
+                                if not checks:
+                                    continue
                         runner = CheckRunner(self.options, source, checks)
                     checkrunners[(source.feed_type, exec_type)].append(runner)
 
@@ -110,18 +217,67 @@ class Pipeline:
                         scoped_pipes[exec_type][scope].extend(runners)
 
             work_q = SimpleQueue()
+            done_q = Queue()
+
+            # consumers inherit started map-reduce checks
+            for pipe in mapreduce_pipes:
+                pipe.start()
 
             # split target restriction into tasks for parallelization
-            p = Process(target=self._queue_work, args=(scoped_pipes, work_q, results_q))
+            p = Process(
+                target=self._queue_work,
+                args=(scoped_pipes, mapreduce_pipes, work_q, results_q))
             p.start()
-            # run synchronous checks using process pool, queuing generated results for reporting
-            pool = Pool(self.jobs, self._run_checks, (scoped_pipes['sync'], work_q, results_q))
-            pool.close()
-            p.join()
-            pool.join()
+            processes.append(p)
+            # run synchronous checks using consumer processes, queuing generated results for reporting
+            consumers = []
+            for _ in range(self.jobs):
+                consumer = Process(
+                    target=self._run_checks,
+                    args=(scoped_pipes['sync'], mapreduce_pipes, work_q, results_q, done_q),
+                    daemon=True)
+                consumer.start()
+                consumers.append(consumer)
+                processes.append(consumer)
+
+            # collect package timings and merge partial states from all
+            # consumers, draining them before joining
+            timings = {}
+            done = 0
+            while done < self.jobs:
+                # Check for exited consumers before waiting, so anything they
+                # queued before exiting is received prior to timing out.
+                exited = sum(x.exitcode is not None for x in consumers)
+                try:
+                    consumer_timings, states = done_q.get(timeout=self._poll_interval)
+                except queue.Empty:
+                    if exited > done:
+                        raise RuntimeError('scanning process exited unexpectedly') from None
+                    continue
+                done += 1
+                timings.update(consumer_timings)
+                if states is not None:
+                    for pipe, pipe_states in zip(mapreduce_pipes, states):
+                        pipe.reduce(pipe_states)
+
+            for process in processes:
+                process.join()
+
+            results = []
+            for pipe in mapreduce_pipes:
+                results.extend(pipe.finish())
+            if results:
+                results_q.put(results)
+
+            if not self.pkg_scan:
+                self.costs.update(timings)
 
             results_q.put(None)
         except Exception as e:
+            # stop remaining scanning processes that could be blocked on queues
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
             # traceback can't be pickled so serialize it
             tb = traceback.format_exc()
             results_q.put((e, tb))
@@ -200,6 +356,15 @@ class CheckRunner:
         for check in self.checks:
             yield from check.finish()
 
+    def state(self):
+        """Return the partial states for all registered map-reduce checks."""
+        return [check.state() for check in self.checks]
+
+    def reduce(self, states):
+        """Merge partial states from another copy of the runner into its checks."""
+        for check, state in zip(self.checks, states):
+            check.reduce(state)
+
     def __eq__(self, other):
         return (
             self.__class__ is other.__class__ and
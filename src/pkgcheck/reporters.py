@@ -15,6 +15,7 @@ from snakeoil import pickling
 from snakeoil.decorators import coroutine
 
 from . import base, objects, results
+from .pipeline import SequencedResults
 
 
 class _ResultsIter:
@@ -37,7 +38,8 @@ class _ResultsIter:
     def __next__(self):
         while True:
             results = next(self.iter)
-            if results:
+            # empty sequenced results are kept to signal task completion
+            if results or isinstance(results, SequencedResults):
                 # Catch propagated exceptions, output their traceback, and
                 # signal the scanning process to end.
                 if isinstance(results, tuple):
@@ -78,7 +80,11 @@ class Reporter:
             # Running on a package scope level, i.e. running within a package
             # directory in an ebuild repo. This sorts all generated results,
             # removing duplicate MetadataError results.
-            results = set(chain.from_iterable(results_iter))
+            results = set()
+            for task_results in results_iter:
+                if isinstance(task_results, SequencedResults):
+                    pipe.release()
+                results.update(task_results)
             for result in sorted(results):
                 self.report(result)
         else:
@@ -89,18 +95,37 @@ class Reporter:
             # fashion in order of their scope level from greatest to least
             # (displaying repo results first) after all
             # version/package/category results have been output.
+            #
+            # Streamed results are output in the order their tasks were
+            # queued, holding results for tasks that finish early in a reorder
+            # buffer bounded by the pipeline's window of queued tasks. Results
+            # from unsequenced tasks, e.g. async checks, are sorted and output
+            # after all streamed results.
             ordered_results = {
                 scope: [] for scope in reversed(list(base.scopes.values()))
                 if scope.level <= base.repo_scope
             }
+            unsequenced = []
+            pending = {}
+            seq = 0
             for results in results_iter:
-                for result in sorted(results):
-                    try:
-                        ordered_results[result.scope].append(result)
-                    except KeyError:
-                        self.report(result)
+                if not isinstance(results, SequencedResults):
+                    for result in results:
+                        ordered_results.get(result.scope, unsequenced).append(result)
+                    continue
+                pending[results.seq] = results
+                while seq in pending:
+                    for result in sorted(pending.pop(seq)):
+                        try:
+                            ordered_results[result.scope].append(result)
+                        except KeyError:
+                            self.report(result)
+                    pipe.release()
+                    seq += 1
             for result in chain.from_iterable(sorted(x) for x in ordered_results.values()):
                 self.report(result)
+            for result in sorted(unsequenced):
+                self.report(result)
 
         p.join()
 
@@ -16,21 +16,24 @@ from itertools import chain
 from operator import attrgetter
 
 from pkgcore import const as pkgcore_const
+from pkgcore.ebuild.atom import atom as atom_cls
 from pkgcore.repository import multiplex
-from pkgcore.restrictions import boolean, packages
+from pkgcore.restrictions import boolean, packages, values
 from pkgcore.restrictions.util import collect_package_restrictions
 from pkgcore.util import commandline, parserestrict
 from snakeoil.cli import arghparse
 from snakeoil.cli.exceptions import UserException
+from snakeoil.decorators import coroutine
 from snakeoil.formatters import decorate_forced_wrapping
 from snakeoil.osutils import abspath, pjoin
 from snakeoil.strings import pluralism
 
-from .. import base, const, objects, pipeline, reporters, results
+# git module import registers its cache type
+from .. import base, const, git, inotify, objects, pipeline, reporters, server
 from ..caches import CachedAddon
-from ..addons import init_addon
-from ..checks import NetworkCheck, init_checks
-from ..cli import ConfigArgumentParser
+from ..addons import EclassAddon, MetadataCacheAddon, init_addon
+from ..checks import Check, init_checks
+from ..cli import ConfigArgumentParser, Tool
 
 pkgcore_config_opts = commandline.ArgumentParser(script=(__file__, __name__))
 argparser = ConfigArgumentParser(
@@ -215,6 +218,20 @@ main_options.add_argument(
         When disabled, no caches will be saved to disk and results requiring
         caches (e.g. git-related checks) will be skipped.
     """)
+main_options.add_argument(
+    '--client', action='store_true',
+    help='run scan using a resident scan daemon',
+    docs="""
+        Forward the scan to a running ``pkgcheck daemon`` instance that
+        already has the repos, config, and checks loaded, outputting results
+        to the current terminal as usual.
+
+        Use ``--socket`` to connect to a daemon listening on a non-default
+        socket path.
+    """)
+main_options.add_argument(
+    '--socket', default=server.DEFAULT_SOCKET,
+    help='scan daemon socket path used in client mode')
 
 
 class ScopeArgs(arghparse.CommaSeparatedNegations):
@@ -244,9 +261,9 @@ class KeywordArgs(arghparse.CommaSeparatedNegations):
     def __call__(self, parser, namespace, values, option_string=None):
         disabled, enabled = self.parse_values(values)
 
-        error = (k for k, v in objects.KEYWORDS.items() if issubclass(v, results.Error))
-        warning = (k for k, v in objects.KEYWORDS.items() if issubclass(v, results.Warning))
-        info = (k for k, v in objects.KEYWORDS.items() if issubclass(v, results.Info))
+        error = objects.KEYWORDS.select('results.Error')
+        warning = objects.KEYWORDS.select('results.Warning')
+        info = objects.KEYWORDS.select('results.Info')
 
         alias_map = {'error': error, 'warning': warning, 'info': info}
         replace_aliases = lambda x: alias_map.get(x, [x])
@@ -272,7 +289,7 @@ class CheckArgs(arghparse.CommaSeparatedNegations):
         disabled, enabled = self.parse_values(values)
 
         available = set(objects.CHECKS)
-        network = (c for c, v in objects.CHECKS.items() if issubclass(v, NetworkCheck))
+        network = objects.CHECKS.select('checks.NetworkCheck')
 
         alias_map = {'all': available, 'net': network}
         replace_aliases = lambda x: alias_map.get(x, [x])
@@ -451,8 +468,11 @@ def get_addons(objects):
 
 @scan.bind_pre_parse
 def _setup_scan_addons(parser, namespace):
-    """Load all checks and their argparser changes before parsing."""
-    for addon in get_addons(objects.CHECKS.values()):
+    """Load all addons and checks altering the argparser before parsing."""
+    checks = (
+        objects.CHECKS[k] for k in objects.CHECKS
+        if objects.CHECKS.data(k)['argparser'])
+    for addon in get_addons(chain(objects.ADDONS.values(), checks)):
         addon.mangle_argparser(parser)
 
 
@@ -461,6 +481,10 @@ def _setup_scan(parser, namespace, args):
     # determine target repo early in order to load relevant config settings if they exist
     namespace, _ = parser._parse_known_args(args, namespace)
 
+    # forward the scan to a resident daemon when running in client mode
+    if namespace.client:
+        parser.exit(server.client([x for x in args if x != '--client'], namespace.socket))
+
     # load default args from system/user configs if config-loading is allowed
     if namespace.config_file is None:
         namespace = parser.parse_config_options(namespace)
@@ -575,61 +599,72 @@ def _validate_scan_args(parser, namespace):
             scope = base.repo_scope
         namespace.restrictions = [(scope, restrict)]
 
-    # determine enabled checks and keywords
+    # determine enabled checks and keywords, selecting them by name so only
+    # modules for the checks that are going to be run get imported
     namespace.enabled_checks = set()
     namespace.disabled_keywords = set()
     namespace.enabled_keywords = set()
 
     # selected scopes
     if namespace.selected_scopes is not None:
-        namespace.disabled_keywords |= {
-            k for k in objects.KEYWORDS.values() if k.scope in namespace.selected_scopes[0]}
-        namespace.enabled_keywords |= {
-            k for k in objects.KEYWORDS.values() if k.scope in namespace.selected_scopes[1]}
+        disabled_scopes = {x.desc for x in namespace.selected_scopes[0]}
+        enabled_scopes = {x.desc for x in namespace.selected_scopes[1]}
+        for k in objects.KEYWORDS:
+            scope = objects.KEYWORDS.data(k)['scope']
+            if scope in disabled_scopes:
+                namespace.disabled_keywords.add(k)
+            if scope in enabled_scopes:
+                namespace.enabled_keywords.add(k)
 
     # selected checks
     if namespace.selected_checks is not None:
         if namespace.selected_checks[1]:
-            namespace.enabled_checks |= {objects.CHECKS[c] for c in namespace.selected_checks[1]}
+            namespace.enabled_checks |= set(namespace.selected_checks[1])
         elif namespace.selected_checks[0]:
             # only specifying disabled checks enables all checks by default and removes selected checks
-            namespace.enabled_checks = (
-                set(objects.CHECKS.values()) - {objects.CHECKS[c] for c in namespace.selected_checks[0]})
+            namespace.enabled_checks = set(objects.CHECKS) - set(namespace.selected_checks[0])
 
     # selected keywords
     if namespace.selected_keywords is not None:
-        namespace.disabled_keywords |= {objects.KEYWORDS[k] for k in namespace.selected_keywords[0]}
-        namespace.enabled_keywords |= {objects.KEYWORDS[k] for k in namespace.selected_keywords[1]}
+        namespace.disabled_keywords.update(namespace.selected_keywords[0])
+        namespace.enabled_keywords.update(namespace.selected_keywords[1])
         # allow keyword args to be filtered by output name in addition to class name
-        namespace.disabled_keywords |= {
-            k for k in objects.KEYWORDS.values() if k.name in namespace.selected_keywords[0]}
-        namespace.enabled_keywords |= {
-            k for k in objects.KEYWORDS.values() if k.name in namespace.selected_keywords[1]}
+        for k in objects.KEYWORDS:
+            name = objects.KEYWORDS.data(k)['name']
+            if name in namespace.selected_keywords[0]:
+                namespace.disabled_keywords.add(k)
+            if name in namespace.selected_keywords[1]:
+                namespace.enabled_keywords.add(k)
 
     # determine keywords to filter
     namespace.filtered_keywords = None
     if namespace.enabled_keywords or namespace.disabled_keywords:
         # all keywords are selected by default
         if not namespace.enabled_keywords:
-            namespace.enabled_keywords = set(objects.KEYWORDS.values())
+            namespace.enabled_keywords = set(objects.KEYWORDS)
 
         # translate requested keywords to their actual classes
         namespace.filtered_keywords = defaultdict(set)
         for keyword in namespace.enabled_keywords - namespace.disabled_keywords:
-            for check in objects.CHECKS.values():
-                for result in check.known_results:
-                    if issubclass(result, keyword):
+            keyword_path = f"{objects.KEYWORDS.data(keyword)['module']}.{keyword}"
+            for check in objects.CHECKS:
+                for result in objects.CHECKS.data(check)['results']:
+                    if keyword_path in objects.KEYWORDS.data(result)['bases']:
                         namespace.filtered_keywords[result].add(check)
 
         # only enable checks for the requested keywords
         if not namespace.enabled_checks:
             namespace.enabled_checks = frozenset(
                 chain.from_iterable(namespace.filtered_keywords.values()))
-        namespace.filtered_keywords = frozenset(namespace.filtered_keywords)
+        namespace.filtered_keywords = frozenset(
+            objects.KEYWORDS[k] for k in namespace.filtered_keywords)
 
     # all checks are run by default
     if not namespace.enabled_checks:
-        namespace.enabled_checks = list(objects.CHECKS.values())
+        namespace.enabled_checks = objects.CHECKS
+
+    # import the modules of checks that are going to be run
+    namespace.enabled_checks = [objects.CHECKS[c] for c in namespace.enabled_checks]
 
     # skip checks that may be disabled
     namespace.enabled_checks = [
@@ -643,7 +678,11 @@ def _validate_scan_args(parser, namespace):
     if not namespace.enabled_checks:
         parser.error('no active checks')
 
-    namespace.addons = get_addons(namespace.enabled_checks)
+    # regenerate stale ebuild metadata up front for version level checks
+    addons = namespace.enabled_checks
+    if any(c.scope is base.version_scope for c in namespace.enabled_checks):
+        addons = chain(addons, [MetadataCacheAddon])
+    namespace.addons = get_addons(addons)
     try:
         for addon in namespace.addons:
             addon.check_args(parser, namespace)
@@ -677,7 +716,9 @@ def _selected_check(options, scan_scope, scope):
 
 @scan.bind_main_func
 def _scan(options, out, err):
-    enabled_checks, caches = init_checks(options.pop('addons'), options)
+    # reuse addons preloaded by the scan daemon if available
+    options, addons_map = _preloaded_scan(options)
+    enabled_checks, caches = init_checks(options.pop('addons'), options, addons_map)
 
     if options.verbosity >= 1:
         msg = f'target repo: {options.target_repo.repo_id!r}'
@@ -841,6 +882,339 @@ def _replay(options, out, err):
     return 0
 
 
+watch = subparsers.add_parser(
+    'watch', description='rescan targets as they change',
+    docs="""
+        Run an initial scan and then watch the target repo for changes,
+        rescanning only the affected packages, categories, or eclasses with
+        the checks covering their scope. Newly appearing and resolved results
+        are output after each rescan.
+
+        Eclass changes also rescan all packages inheriting the modified
+        eclasses while changes to licenses, repo metadata, or profiles rescan
+        the entire repo.
+
+        All arguments are passed through to ``pkgcheck scan`` in order to
+        select the target repo, checks, and reporter to use.
+    """)
+
+
+@watch.bind_early_parse
+def _setup_watch(parser, namespace, args):
+    # pass all non-help arguments through to the scan subcommand
+    if any(x in ('-h', '--help') for x in args):
+        return namespace, args
+    namespace.scan_args = args
+    return namespace, []
+
+
+class _ResultsCollector(reporters.Reporter):
+    """Reporter collecting results for comparison instead of outputting them."""
+
+    def __init__(self, **kwargs):
+        self.results = set()
+        super().__init__(None, **kwargs)
+
+    @coroutine
+    def _process_report(self):
+        while True:
+            self.results.add((yield))
+
+
+def _watch_target(repo, path):
+    """Determine the rescan target for a given changed path.
+
+    Returns None for paths that don't affect scanning results and the empty
+    string if the entire repo should be rescanned. License, repo metadata, and
+    profile changes can alter results across all scopes (e.g. license groups,
+    USE flag descriptions, and package masks) so they trigger full rescans
+    while regenerated metadata cache entries are skipped since their source
+    ebuilds are watched directly.
+    """
+    relpath = os.path.relpath(path, repo.location)
+    if relpath == os.curdir:
+        return ''
+    parts = relpath.split(os.sep)
+    if parts[0] == 'eclass':
+        if len(parts) == 2 and parts[1].endswith('.eclass'):
+            return relpath
+    elif parts[0] == 'metadata':
+        if len(parts) == 1 or parts[1] != 'md5-cache':
+            return ''
+    elif parts[0] in ('licenses', 'profiles'):
+        return ''
+    elif parts[0] in repo.categories:
+        if len(parts) == 1 or parts[1] == 'metadata.xml':
+            return parts[0]
+        return pjoin(*parts[:2])
+    return None
+
+
+def _result_target(result):
+    """Determine the rescan target a given result belongs to."""
+    if result.scope is base.eclass_scope:
+        return pjoin('eclass', f'{result.eclass}.eclass')
+    elif hasattr(result, 'package'):
+        return pjoin(result.category, result.package)
+    elif hasattr(result, 'category'):
+        return result.category
+    return result.scope.desc
+
+
+def _watch_restrictions(options, targets):
+    """Determine scanning restrictions for a given set of rescan targets.
+
+    Targets for packages inheriting changed eclasses are added to the given set.
+    """
+    if '' in targets:
+        return [(base.repo_scope, packages.AlwaysTrue)]
+
+    restrictions = []
+    repo = options.target_repo
+    eclasses = {
+        os.path.basename(x)[:-len('.eclass')]
+        for x in targets if x.startswith(f'eclass{os.sep}')}
+    pkgs = {x for x in targets if x.count(os.sep) == 1} - {
+        pjoin('eclass', f'{x}.eclass') for x in eclasses}
+
+    if eclasses:
+        # rescan all packages inheriting changed eclasses
+        eclass_addon = EclassAddon(options)
+        for eclass in eclasses:
+            pkgs.update(eclass_addon.packages(eclass))
+        targets.update(pkgs)
+        restrict = values.AnyMatch(values.FunctionRestriction(frozenset(eclasses).__contains__))
+        restrictions.append((base.eclass_scope, restrict))
+    if pkgs:
+        restrict = packages.OrRestriction(*map(atom_cls, sorted(pkgs)))
+        restrictions.append((base.package_scope, restrict))
+
+    # remaining category targets
+    for target in sorted(x for x in targets if os.sep not in x):
+        restrictions.append(_path_restrict(pjoin(repo.location, target), options))
+    return restrictions
+
+
+def _watch_scan(options, restrictions):
+    """Run a scan against the given restrictions, returning its results."""
+    enabled_checks, caches = init_checks(options.pop('addons'), options)
+    if caches:
+        CachedAddon.update_caches(options, caches)
+
+    collector = _ResultsCollector(
+        verbosity=options.verbosity, keywords=options.filtered_keywords)
+    with ExitStack() as stack:
+        for c in options.pop('contexts'):
+            stack.enter_context(c)
+        for scan_scope, restrict in restrictions:
+            pipes = [
+                d for scope, d in enabled_checks.items()
+                if _selected_check(options, scan_scope, scope)
+            ]
+            if pipes:
+                collector(pipeline.Pipeline(options, scan_scope, pipes, restrict))
+    return collector.results
+
+
+@watch.bind_main_func
+def _watch(options, out, err):
+    scan_options = argparser.parse_args(['scan'] + options.scan_args)
+    repo = scan_options.target_repo
+
+    # results per rescan target used to determine changes between scans
+    known_results = defaultdict(set)
+
+    with scan_options.reporter(
+            out, verbosity=scan_options.verbosity,
+            keywords=scan_options.filtered_keywords) as reporter:
+        for result in sorted(_watch_scan(scan_options, scan_options.restrictions)):
+            known_results[_result_target(result)].add(result)
+            reporter.report(result)
+        out.stream.flush()
+
+        with inotify.Watcher(repo.location) as watcher:
+            if options.verbosity >= 0:
+                err.write(f'{watch.prog}: watching {repo.location!r} for changes')
+                err.flush()
+
+            for paths in watcher:
+                # reload all repo state in order to pick up the changes
+                scan_options = argparser.parse_args(['scan'] + options.scan_args)
+                targets = {_watch_target(scan_options.target_repo, x) for x in paths}
+                targets.discard(None)
+                if not targets:
+                    continue
+
+                restrictions = _watch_restrictions(scan_options, targets)
+                current_results = defaultdict(set)
+                for result in _watch_scan(scan_options, restrictions):
+                    current_results[_result_target(result)].add(result)
+                if '' in targets:
+                    targets = set(known_results) | set(current_results)
+
+                appeared, resolved = [], []
+                for target in targets:
+                    old = known_results.pop(target, set())
+                    new = current_results.pop(target, set())
+                    appeared.extend(new - old)
+                    resolved.extend(old - new)
+                    if new:
+                        known_results[target] = new
+                # results for targets outside the rescanned set can only be added
+                for target, new in current_results.items():
+                    appeared.extend(new - known_results[target])
+                    known_results[target].update(new)
+
+                for desc, color, results in (
+                        ('new', 'red', appeared), ('resolved', 'green', resolved)):
+                    if results:
+                        s = pluralism(results)
+                        err.write(err.fg(color), f'{len(results)} {desc} result{s}:', err.reset)
+                        err.flush()
+                        for result in sorted(results):
+                            reporter.report(result)
+                        out.stream.flush()
+
+    return 0
+
+
+daemon = subparsers.add_parser(
+    'daemon', description='run resident scan daemon',
+    docs="""
+        Run a daemon keeping the pkgcore config, configured ebuild repos, and
+        all checks loaded, serving scan requests from ``pkgcheck scan
+        --client`` over a UNIX socket.
+
+        The addons used by default scans of each repo, e.g. profile and git
+        data, are also initialized up front along with their caches. Scans
+        using the same options, apart from their targets, selected checks,
+        and output settings, reuse them while all other scans initialize
+        their own.
+
+        Each request is run in a separate process forked from the daemon,
+        outputting results directly to the client's terminal. Preloaded state
+        is reloaded when changes to the config, repo layouts, or profiles are
+        detected.
+    """)
+daemon.add_argument(
+    '--socket', default=server.DEFAULT_SOCKET,
+    help='socket path to listen on')
+
+# options requiring a freshly loaded pkgcore config
+_config_mods = ('new_config', 'add_config', 'empty_config', 'override_config')
+
+
+# options that don't affect addon initialization, allowing scans to reuse
+# preloaded addons when all other options match
+_scan_target_options = frozenset([
+    'addons', 'commits', 'contexts', 'cwd', 'disabled_keywords', 'enabled_checks',
+    'enabled_keywords', 'filtered_keywords', 'forced_checks', 'format_str',
+    'git_snapshot', 'reporter', 'restrictions', 'selected_checks',
+    'selected_keywords', 'targets', 'verbosity',
+])
+
+# preloaded scan options and addons set up by the scan daemon
+_preloaded_scans = []
+
+
+def _addon_options(options):
+    """Return the option values affecting addon initialization."""
+    values = {k: v for k, v in vars(options).items() if k not in _scan_target_options}
+    # profile objects and the search repo are recreated for every scan
+    if 'arch_profiles' in values:
+        values['arch_profiles'] = {
+            arch: [profile for _profile_obj, profile in profiles]
+            for arch, profiles in options.arch_profiles.items()}
+    if 'search_repo' in values:
+        values['search_repo'] = tuple(options.search_repo.trees)
+    return values
+
+
+def _preloaded_scan(options):
+    """Return the scan options and addons to use for a scan.
+
+    Preloaded options match if they share all the scan's values since extra
+    values are only set by addons that aren't enabled for the scan. Matching
+    options are updated with the scan's targets and related settings,
+    retaining any values injected by the preloaded addons.
+    """
+    if _preloaded_scans:
+        values = _addon_options(options)
+        for preloaded_values, preloaded_options, addons_map in _preloaded_scans:
+            if all(k in preloaded_values and preloaded_values[k] == v for k, v in values.items()):
+                for k in _scan_target_options:
+                    if k in options:
+                        setattr(preloaded_options, k, getattr(options, k))
+                    else:
+                        preloaded_options.pop(k, None)
+                addons_map = dict(addons_map)
+                git_addon = addons_map.get(git.GitAddon)
+                if git_addon is not None:
+                    git_addon.reset_snapshots()
+                return preloaded_options, addons_map
+    return options, None
+
+
+def _daemon_config(scan_daemon, load_config, namespace, attr):
+    """Use a daemon's preloaded config unless config alterations were requested."""
+    if any(getattr(namespace, x, None) for x in _config_mods):
+        load_config(namespace, attr)
+    else:
+        for x in _config_mods + ('profile_override',):
+            namespace.pop(x, None)
+        setattr(namespace, attr, scan_daemon.config)
+
+
+@daemon.bind_main_func
+def _daemon(options, out, err):
+    load_config = argparser.get_default('config')
+
+    def _load_config():
+        namespace = arghparse.Namespace(
+            profile_override=argparser.get_default('profile_override'))
+        load_config(namespace, 'config')
+        return namespace.config
+
+    def _run(args):
+        return Tool(argparser)(['scan'] + args)
+
+    def _preload(repos):
+        """Initialize the addons and caches used by default scans of all repos."""
+        _preloaded_scans.clear()
+        for repo in repos:
+            try:
+                scan_options = argparser.parse_args(['scan', '--repo', repo.location])
+                scan_options.pop('main_func')
+                values = _addon_options(scan_options)
+                # checks aren't preloaded since they hold per-scan state
+                addons_map = {}
+                caches = []
+                for cls in scan_options.pop('addons'):
+                    if not issubclass(cls, Check):
+                        addon = init_addon(cls, scan_options, addons_map)
+                        if isinstance(addon, CachedAddon):
+                            caches.append(addon)
+                CachedAddon.update_caches(scan_options, caches)
+            except (Exception, SystemExit) as e:
+                err.write(f'{daemon.prog}: failed preloading addons for {repo}: {e}')
+                err.flush()
+                continue
+            _preloaded_scans.append((values, scan_options, addons_map))
+
+    scan_daemon = server.ScanDaemon(options.socket, _load_config, _run, _preload)
+    argparser.set_defaults(config=arghparse.DelayedValue(
+        partial(_daemon_config, scan_daemon, load_config)))
+
+    if options.verbosity >= 0:
+        err.write(f'{daemon.prog}: listening on {options.socket!r}')
+        err.flush()
+    try:
+        scan_daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
 def dump_docstring(out, obj, prefix=None):
     if prefix is not None:
         out.first_prefix.append(prefix)
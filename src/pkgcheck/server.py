@@ -0,0 +1,234 @@
+"""Resident scanning daemon support.
+
+The daemon preloads pkgcore's config, the configured ebuild repos, all check
+modules, and the addons used by default scans of the repos, then listens on a
+UNIX socket. Each client request is handled
+in a forked child inheriting the warm state, running a regular scan with the
+client's working directory, environment, and terminal file descriptors so
+results are output directly by the standard reporters.
+"""
+
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+from pkgcore import const as pkgcore_const
+from snakeoil.cli.exceptions import UserException
+from snakeoil.osutils import pjoin
+
+from . import const, objects
+
+DEFAULT_SOCKET = pjoin(const.USER_CACHE_DIR, 'daemon.sock')
+
+# request header: length of the JSON encoded request
+_header = struct.Struct('!I')
+
+# system config files affecting the loaded pkgcore config
+_config_paths = (
+    pkgcore_const.USER_CONF_FILE,
+    pkgcore_const.SYSTEM_CONF_FILE,
+    '/etc/portage/make.conf',
+    '/etc/portage/make.profile',
+    '/etc/portage/repos.conf',
+)
+
+
+def _mtime(path):
+    """Return the modification time for a given path, None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _repo_fingerprint(repo):
+    """Cheap fingerprint of the repo state cached by a preloaded repo object.
+
+    Category and package directory modification times change when packages
+    or versions are added or removed, profile files are used by preloaded
+    addons, and the remaining paths cover repo metadata and git checkouts.
+    """
+    paths = [
+        repo.location,
+        pjoin(repo.location, 'metadata'),
+        pjoin(repo.location, 'metadata', 'layout.conf'),
+        pjoin(repo.location, '.git', 'HEAD'),
+    ]
+    paths.extend(pjoin(repo.location, x) for x in repo.categories)
+    # package versions are cached by preloaded repos, e.g. during cache updates
+    for category, pkgs in repo.packages.items():
+        paths.extend(pjoin(repo.location, category, x) for x in pkgs)
+    for root, dirs, files in os.walk(pjoin(repo.location, 'profiles')):
+        dirs.sort()
+        paths.append(root)
+        paths.extend(pjoin(root, x) for x in sorted(files))
+    return tuple(_mtime(x) for x in paths)
+
+
+def _send_request(sock, request):
+    """Send a JSON encoded request along with the standard file descriptors."""
+    data = json.dumps(request).encode()
+    fds = array.array('i', (0, 1, 2))
+    sock.sendmsg(
+        [_header.pack(len(data)), data],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+
+
+def _recv_request(sock):
+    """Receive a JSON encoded request and its attached file descriptors."""
+    fds = array.array('i')
+    msg, ancdata, _flags, _addr = sock.recvmsg(
+        _header.size, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, type, data in ancdata:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    if len(msg) != _header.size:
+        raise ConnectionError('truncated request header')
+
+    length, = _header.unpack(msg)
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError('truncated request')
+        data.extend(chunk)
+    return json.loads(data), list(fds)
+
+
+def client(args, path=DEFAULT_SOCKET):
+    """Run a scan using a given daemon, returning its exit status."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError as e:
+            raise UserException(f'failed connecting to scan daemon at {path!r}: {e.strerror}')
+
+        try:
+            cwd = os.getcwd()
+        except FileNotFoundError:
+            cwd = '/'
+        _send_request(sock, {'args': list(args), 'cwd': cwd, 'env': dict(os.environ)})
+
+        # the handling process leads its own process group
+        replies = sock.makefile('r')
+        pid = int(replies.readline())
+        try:
+            status = replies.readline()
+        except KeyboardInterrupt:
+            os.killpg(pid, signal.SIGINT)
+            raise
+        if not status:
+            raise UserException('scan daemon closed the connection unexpectedly')
+        return int(status)
+
+
+class ScanDaemon:
+    """Daemon running scans for clients in forked, preloaded processes.
+
+    :param path: UNIX socket path to listen on
+    :param load_config: callable returning a pkgcore config object
+    :param run: callable running a scan for a given argument list in
+        the current process, returning its exit status
+    :param preload: optional callable initializing additional state for the
+        preloaded repos, e.g. addons and their caches
+    """
+
+    def __init__(self, path, load_config, run, preload=None):
+        self.path = path
+        self._load_config = load_config
+        self._run = run
+        self._preload = preload
+        self.config = None
+        self._repos = ()
+        self._fingerprint = None
+
+    def _fingerprint_state(self, repos):
+        """Determine the current fingerprint for the preloaded state."""
+        configs = tuple(_mtime(x) for x in _config_paths)
+        return configs + tuple(_repo_fingerprint(repo) for repo in repos)
+
+    def warm(self):
+        """(Re)load all state that gets shared with forked request handlers."""
+        # import all check and reporter modules
+        tuple(objects.CHECKS.values())
+        tuple(objects.REPORTERS.values())
+
+        self.config = self._load_config()
+        domain = self.config.get_default('domain')
+        repos = list(domain.ebuild_repos_raw)
+        # populate category and package listings
+        for repo in repos:
+            tuple(repo.packages.values())
+        self._repos = repos
+        if self._preload is not None:
+            self._preload(repos)
+        self._fingerprint = self._fingerprint_state(repos)
+
+    def refresh(self):
+        """Reload preloaded state if the underlying repos or config have changed."""
+        if self.config is None or self._fingerprint_state(self._repos) != self._fingerprint:
+            self.warm()
+
+    def _reap(self):
+        """Collect exited request handlers."""
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0]:
+                pass
+        except ChildProcessError:
+            pass
+
+    def _handle(self, conn):
+        """Handle a client request, run in a forked child."""
+        os.setpgid(0, 0)
+        request, fds = _recv_request(conn)
+        for i, fd in enumerate(fds):
+            os.dup2(fd, i)
+            os.close(fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        conn.sendall(f'{os.getpid()}\n'.encode())
+
+        status = self._run(request['args'])
+        if not isinstance(status, int):
+            status = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(f'{status}\n'.encode())
+
+    def serve(self):
+        """Listen for client requests until interrupted."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+        self.warm()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(self.path)
+            sock.listen()
+            try:
+                while True:
+                    conn, _addr = sock.accept()
+                    self._reap()
+                    with conn:
+                        self.refresh()
+                        pid = os.fork()
+                        if pid == 0:
+                            status = 0
+                            try:
+                                sock.close()
+                                self._handle(conn)
+                            except BaseException:
+                                traceback.print_exc()
+                                status = 1
+                            finally:
+                                os._exit(status)
+            finally:
+                os.unlink(self.path)
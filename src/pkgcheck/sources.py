@@ -1,22 +1,112 @@
 """Custom package sources used for feeding checks."""
 
+import mmap
 import os
+import re
 from collections import deque
+from collections.abc import Sequence
+from contextlib import closing, contextmanager
+from functools import partial
 from operator import attrgetter
 
+from pkgcore.ebuild.cpv import VersionedCPV
 from pkgcore.ebuild.repository import UnconfiguredTree
+from pkgcore.package.errors import MetadataException, PackageError
 from pkgcore.restrictions import packages
 from snakeoil.osutils import listdir_files, pjoin
 
 from . import addons, base
 from .packages import FilteredPkg, RawCPV, WrappedPkg
 
+_newline_regex = re.compile(rb'\r\n?|\n')
+
+# package attributes available without loading ebuild metadata
+_cpv_pkg_attrs = frozenset([
+    'category', 'package', 'fullver', 'version', 'revision', 'key', 'cpvstr',
+    'versioned_atom', 'unversioned_atom',
+])
+
+# package attributes validated by the repo's default package filtering
+_validated_pkg_attrs = frozenset(['data', 'slot', 'required_use'])
+
+# package attributes loaded from ebuild metadata cache entries or ebuild files
+_cached_pkg_attrs = _cpv_pkg_attrs | frozenset([
+    'bdepend', 'depend', 'pdepend', 'rdepend', 'defined_phases', 'description',
+    'eapi', 'fetchables', 'homepage', 'inherit', 'inherited', 'iuse',
+    'iuse_effective', 'iuse_stripped', 'keywords', 'license', 'live',
+    'properties', 'required_use', 'restrict', 'slot', 'subslot', 'fullslot',
+    'path', 'ebuild',
+])
+
+
+class _FusedPkgs:
+    """Packages resolved once per scanning task, shared by all sources.
+
+    Repos only cache package objects weakly so holding references to all
+    packages matching a task's restriction lets every source running during
+    the task reuse the same objects along with their loaded metadata. Derived
+    package views, e.g. injected file contents, are cached per package while
+    the task runs as well.
+    """
+
+    def __init__(self):
+        self._pkgs = None
+        self._views = {}
+
+    @staticmethod
+    def _ignore_error(exc):
+        """Leave reporting metadata errors to the sources run during the task."""
+
+    @contextmanager
+    def __call__(self, repo, restrict, resolve=True):
+        # Tasks only using unsourced packages skip resolving them up front.
+        # Without an error callback, the repo revalidates packages that
+        # previously failed, raising misleading errors for their partially
+        # consumed metadata and replacing the originally cached exceptions.
+        if resolve:
+            self._pkgs = tuple(repo.itermatch(restrict, error_callback=self._ignore_error))
+        else:
+            self._pkgs = ()
+        try:
+            yield self._pkgs
+        finally:
+            self._pkgs = None
+            # release resources held by views, e.g. memory-mapped files
+            for _pkg, view in self._views.values():
+                close = getattr(view, 'close', None)
+                if close is not None:
+                    close()
+            self._views.clear()
+
+    @property
+    def active(self):
+        """Flag denoting a task is running, with package views cached until it finishes."""
+        return self._pkgs is not None
+
+    def view(self, cls, pkg):
+        """Return the view of a given package, creating it as required."""
+        if self._pkgs is None:
+            return cls(pkg)
+        key = (cls, id(pkg))
+        entry = self._views.get(key)
+        # package objects are referenced to avoid reusing views for recycled IDs
+        if entry is None or entry[0] is not pkg:
+            entry = self._views[key] = (pkg, cls(pkg))
+        return entry[1]
+
+
+fused_pkgs = _FusedPkgs()
+
 
 class Source:
     """Base template for a source."""
 
     feed_type = base.repo_scope
     required_addons = ()
+    # package attributes used by the source itself, None if unknown
+    pkg_attrs = frozenset()
+    # flag denoting fully loaded and validated packages are yielded
+    sourced = False
 
     def __init__(self, options, source):
         self._options = options
@@ -43,6 +133,7 @@ class RepoSource(Source):
         self._options = options
         self._repo = options.target_repo
         self._source = source
+        self._pkg_kwargs = None
 
     @property
     def source(self):
@@ -51,9 +142,38 @@ class RepoSource(Source):
             return self._source
         return self._repo
 
+    @property
+    def sourced(self):
+        """Flag denoting fully loaded and validated packages are yielded."""
+        if self._source is not None:
+            return self._source.sourced
+        return self._pkg_kwargs is None
+
+    def select_pkgs(self, pkg_attrs):
+        """Select the cheapest package objects providing the given attributes.
+
+        By default, packages are fully loaded and validated by the repo.
+        Instead, CPV objects of validated packages are used if no ebuild
+        metadata is required and packages lazily loading metadata from the
+        repo's cache are used if only cached metadata is required.
+        """
+        if pkg_attrs is None:
+            return
+        if self._options.filter == 'latest':
+            pkg_attrs = pkg_attrs | LatestPkgsFilter.pkg_attrs
+        if pkg_attrs <= _cpv_pkg_attrs:
+            self._pkg_kwargs = {'pkg_filter': partial(_cpv_pkgs, self._repo)}
+        elif pkg_attrs <= _cached_pkg_attrs:
+            self._pkg_kwargs = {'pkg_filter': partial(
+                _cached_pkgs, self._repo, pkg_attrs - _cpv_pkg_attrs)}
+
     def itermatch(self, restrict, **kwargs):
         """Yield packages matching the given restriction from the selected source."""
         kwargs.setdefault('sorter', sorted)
+        # raw packages are never filtered, matching the repo's behavior
+        if self._source is None and self._pkg_kwargs is not None and 'raw_pkg_cls' not in kwargs:
+            kwargs['pkg_filter'] = partial(
+                self._pkg_kwargs['pkg_filter'], kwargs.pop('error_callback', None))
         unfiltered_iter = self.source.itermatch(restrict, **kwargs)
         if self._options.filter == 'latest':
             yield from LatestPkgsFilter(unfiltered_iter)
@@ -61,9 +181,54 @@ class RepoSource(Source):
             yield from unfiltered_iter
 
 
+def _cached_pkgs(repo, pkg_attrs, error_callback, pkgs):
+    """Filter packages with unsupported EAPIs or bad metadata for the given attributes.
+
+    Unlike the repo's default filtering, only metadata attributes in use are
+    loaded and validated. Similarly to the repo, packages with bad metadata
+    are masked so they're skipped without being revalidated, since their
+    partially consumed metadata would raise misleading errors.
+    """
+    bad_masked = repo._bad_masked
+    while True:
+        try:
+            pkg = next(pkgs)
+        except PackageError:
+            # ignore pkgs with invalid CPVs
+            continue
+        except StopIteration:
+            return
+
+        if bad_masked.has_match(pkg.versioned_atom):
+            if error_callback is not None:
+                error_callback(bad_masked[pkg.versioned_atom])
+            continue
+
+        try:
+            if not pkg.is_supported:
+                raise MetadataException(pkg, 'eapi', f"EAPI '{pkg.eapi}' is not supported")
+            for attr in pkg_attrs:
+                getattr(pkg, attr)
+        except MetadataException as e:
+            bad_masked[e.pkg.versioned_atom] = e
+            if error_callback is not None:
+                error_callback(e)
+            continue
+        yield pkg
+
+
+def _cpv_pkgs(repo, error_callback, pkgs):
+    """Filter packages the same as the repo, yielding CPV objects for valid packages."""
+    for pkg in _cached_pkgs(repo, _validated_pkg_attrs, error_callback, pkgs):
+        # retain unnormalized versions, e.g. '0-r0', unlike pkg.cpvstr
+        yield VersionedCPV(pkg.category, pkg.package, pkg.fullver)
+
+
 class LatestPkgsFilter:
     """Filter source packages, yielding those from the latest non-VCS and VCS slots."""
 
+    pkg_attrs = frozenset(['key', 'live', 'slot'])
+
     def __init__(self, source_iter, partial_filtered=False):
         self._partial_filtered = partial_filtered
         self._source_iter = source_iter
@@ -143,6 +308,7 @@ class EclassRepoSource(RepoSource):
     """Repository eclass source."""
 
     feed_type = base.eclass_scope
+    sourced = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -157,6 +323,8 @@ class EclassRepoSource(RepoSource):
 class FilteredRepoSource(RepoSource):
     """Ebuild repository source supporting custom package filtering."""
 
+    pkg_attrs = LatestPkgsFilter.pkg_attrs
+
     def __init__(self, pkg_filter, partial_filtered, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._pkg_filter = pkg_filter
@@ -197,18 +365,29 @@ class RawRepoSource(RepoSource):
 
     def __init__(self, *args):
         super().__init__(*args)
+        self._raw_repo = None
+
+    @property
+    def sourced(self):
+        return self._options.filter == 'latest' and self._pkg_kwargs is None
 
     def itermatch(self, restrict, **kwargs):
         if self._options.filter == 'latest':
             yield from LatestPkgsFilter(super().itermatch(restrict, **kwargs))
         else:
-            self._repo = _RawRepo(self._repo)
+            # reuse raw repo across calls, avoiding reloading its config per task
+            if self._raw_repo is None:
+                self._raw_repo = _RawRepo(self._repo)
+            self._repo = self._raw_repo
             yield from super().itermatch(restrict, raw_pkg_cls=RawCPV, **kwargs)
 
 
 class RestrictionRepoSource(RepoSource):
     """Ebuild repository source supporting custom restrictions."""
 
+    # restrictions may match against any package attribute
+    pkg_attrs = None
+
     def __init__(self, restriction, *args):
         super().__init__(*args)
         self.restriction = restriction
@@ -221,6 +400,9 @@ class RestrictionRepoSource(RepoSource):
 class UnmaskedRepoSource(RepoSource):
     """Repository source that uses profiles/package.mask to filter packages."""
 
+    pkg_attrs = None
+    sourced = True
+
     def __init__(self, *args):
         super().__init__(*args)
         self._filtered_repo = self._options.domain.filter_repo(
@@ -231,22 +413,160 @@ class UnmaskedRepoSource(RepoSource):
         yield from self._filtered_repo.itermatch(restrict, **kwargs)
 
 
+class _SourceLines(Sequence):
+    """Lines of raw ebuild file contents, decoded on access.
+
+    Lines include their trailing newlines with universal newline handling
+    applied, matching the lines of text file objects.
+    """
+
+    __slots__ = ('_data', '_offsets', '_encoding')
+
+    def __init__(self, data, offsets, encoding):
+        self._data = data
+        self._offsets = offsets + (len(data),)
+        self._encoding = encoding
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _line(self, i):
+        line = str(self._data[self._offsets[i]:self._offsets[i + 1]], self._encoding)
+        if line.endswith('\r'):
+            line = line[:-1] + '\n'
+        elif line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+        return line
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._line(i) for i in range(len(self))[index])
+        return self._line(range(len(self))[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._line(i)
+
+
 class _SourcePkg(WrappedPkg):
-    """Package object with file contents injected as an attribute."""
+    """Package object with file contents injected as attributes.
+
+    The ebuild file is loaded once on first access and all other views of
+    its contents are lazily derived from it:
+
+    - data: raw file contents as a bytes-like object
+    - text: decoded file contents with universal newlines applied
+    - line_offsets: starting offsets of each line in the raw contents
+    - lines: sequence of lines including their trailing newlines, each
+      decoded on access
+
+    Large files are memory-mapped, with the mapping released when the package
+    is closed, invalidating any views of its contents. Contents accessed after
+    closing are read into memory instead, since packages may be held by
+    consumers past the lifetime of the source that yielded them, e.g. sources
+    grouping packages.
+    """
 
-    __slots__ = ('lines',)
+    __slots__ = ('_data', '_text', '_line_offsets', '_lines', '_closed')
+
+    # Files smaller than this are read into memory, mapping them isn't worth
+    # the overhead. This also limits SIGBUS crashes from mapped files being
+    # truncated mid-scan, e.g. while editing ebuilds in watch mode, to files
+    # that are rarely modified.
+    mmap_size = 64 * 1024
 
     def __init__(self, pkg):
         super().__init__(pkg)
-        self.lines = tuple(pkg.ebuild.text_fileobj())
+        self._data = None
+        self._text = None
+        self._line_offsets = None
+        self._lines = None
+        self._closed = False
+
+    @property
+    def _encoding(self):
+        return getattr(self._pkg.ebuild, 'encoding', None) or 'utf-8'
+
+    @property
+    def data(self):
+        """Raw ebuild file contents."""
+        if self._data is None:
+            ebuild = self._pkg.ebuild
+            path = getattr(ebuild, 'path', None)
+            if path is None:
+                with ebuild.bytes_fileobj() as f:
+                    self._data = f.read()
+            else:
+                with open(path, 'rb') as f:
+                    data = None
+                    if not self._closed and os.fstat(f.fileno()).st_size >= self.mmap_size:
+                        try:
+                            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        except ValueError:
+                            # file was emptied since it can't be mapped
+                            pass
+                    self._data = data if data is not None else f.read()
+        return self._data
+
+    @property
+    def text(self):
+        """Decoded ebuild file contents."""
+        if self._text is None:
+            text = str(self.data, self._encoding)
+            # mirror universal newline handling used by text file objects
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            self._text = text
+        return self._text
+
+    @property
+    def line_offsets(self):
+        """Starting offsets of all lines in the raw ebuild file contents."""
+        if self._line_offsets is None:
+            data = self.data
+            offsets = [0]
+            offsets.extend(m.end() for m in _newline_regex.finditer(data))
+            # drop offset for the nonexistent line following a final newline
+            if offsets[-1] == len(data):
+                offsets.pop()
+            self._line_offsets = tuple(offsets)
+        return self._line_offsets
+
+    @property
+    def lines(self):
+        """Ebuild file lines including trailing newlines."""
+        if self._lines is None:
+            self._lines = _SourceLines(self.data, self.line_offsets, self._encoding)
+        return self._lines
+
+    def close(self):
+        """Release the memory-mapped ebuild file, later accesses read it into memory."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._closed = True
+        self._data = None
+        self._text = None
+        self._line_offsets = None
+        self._lines = None
 
 
 class EbuildFileRepoSource(RepoSource):
-    """Ebuild repository source yielding package objects and their file contents."""
+    """Ebuild repository source yielding package objects and their file contents.
+
+    Packages are closed when the running task finishes or, outside of tasks,
+    once the next package is requested. Consumers holding onto closed packages
+    can still access their file contents, at the cost of rereading them.
+    """
+
+    pkg_attrs = frozenset(['ebuild'])
 
     def itermatch(self, restrict, **kwargs):
         for pkg in super().itermatch(restrict, **kwargs):
-            yield _SourcePkg(pkg)
+            if fused_pkgs.active:
+                yield fused_pkgs.view(_SourcePkg, pkg)
+            else:
+                with closing(_SourcePkg(pkg)) as source_pkg:
+                    yield source_pkg
 
 
 class _CombinedSource(RepoSource):
@@ -322,21 +642,33 @@ class VersionedSource(_FilteredSource):
     keyfunc = attrgetter('versioned_atom')
 
 
-def init_source(source, options, addons_map=None):
-    """Initialize a given source."""
+def init_source(source, options, addons_map=None, pkg_attrs=None):
+    """Initialize a given source.
+
+    Sources pulling packages directly from the target repo yield the cheapest
+    package objects providing the given package attributes, defaulting to
+    fully loaded packages if unknown.
+    """
     if isinstance(source, tuple):
         if len(source) == 3:
             source, args, kwargs = source
             kwargs = dict(kwargs)
-            # initialize wrapped source
-            if 'source' in kwargs:
-                kwargs['source'] = init_source(kwargs['source'], options, addons_map)
         else:
             source, args = source
             kwargs = {}
     else:
         args = ()
         kwargs = {}
+    if pkg_attrs is not None and source.pkg_attrs is not None:
+        pkg_attrs = pkg_attrs | source.pkg_attrs
+    else:
+        pkg_attrs = None
+    # initialize wrapped source
+    if 'source' in kwargs:
+        kwargs['source'] = init_source(kwargs['source'], options, addons_map, pkg_attrs)
     for addon in source.required_addons:
         kwargs[base.param_name(addon)] = addons.init_addon(addon, options, addons_map)
-    return source(*args, options, **kwargs)
+    source = source(*args, options, **kwargs)
+    if isinstance(source, RepoSource):
+        source.select_pkgs(pkg_attrs)
+    return source
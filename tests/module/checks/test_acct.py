@@ -1,3 +1,5 @@
+import pickle
+
 from pkgcheck.checks import acct
 
 from pkgcore.test.misc import FakeRepo
@@ -55,6 +57,20 @@ ACCT_{self.kind.upper()}_ID="{identifier}"
         assert r.pkgs == (f'acct-{self.kind}/bar-1', f'acct-{self.kind}/foo-1')
         assert f'conflicting {self.kind} id 100 usage: ' in str(r)
 
+    def test_reduced_conflicting_ids(self):
+        pkgs = (self.mk_pkg('foo', 100),
+                self.mk_pkg('bar', 100))
+        check = self.mk_check(pkgs)
+        partial_check = self.mk_check(pkgs)
+        assert not list(check.feed(pkgs[0]))
+        assert not list(partial_check.feed(pkgs[1]))
+        # partial states are merged across separate processes
+        state = pickle.loads(pickle.dumps(partial_check.state()))
+        check.reduce(state)
+        r = self.assertReport(check, ())
+        assert isinstance(r, acct.ConflictingAccountIdentifiers)
+        assert r.pkgs == (f'acct-{self.kind}/bar-1', f'acct-{self.kind}/foo-1')
+
     def test_self_nonconflicting_ids(self):
         pkgs = (self.mk_pkg('foo', 100),
                 self.mk_pkg('foo', 100, version=2))
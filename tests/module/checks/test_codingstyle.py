@@ -3,6 +3,7 @@ from itertools import chain
 from pkgcore.ebuild.eapi import EAPI
 from pkgcore.test.misc import FakeRepo
 
+from pkgcheck import addons
 from pkgcheck.checks import codingstyle
 
 from .. import misc
@@ -11,7 +12,8 @@ from .. import misc
 class TestBadCommandsCheck(misc.ReportTestCase):
 
     check_kls = codingstyle.BadCommandsCheck
-    check = codingstyle.BadCommandsCheck(None)
+    check = codingstyle.BadCommandsCheck(
+        None, line_scanner_addon=addons.LineScannerAddon(None))
 
     def mk_pkg(self, eapi='0', lines=()):
         return misc.FakePkg("dev-util/diff-0.5", data={'EAPI': eapi}, lines=lines)
@@ -63,6 +65,9 @@ class TestInsintoCheck(misc.ReportTestCase):
 
     check_kls = codingstyle.InsintoCheck
 
+    def mk_check(self):
+        return self.check_kls(None, line_scanner_addon=addons.LineScannerAddon(None))
+
     def test_insinto(self):
         fake_src = [
             "# This is our first fake ebuild\n",
@@ -85,14 +90,14 @@ class TestInsintoCheck(misc.ReportTestCase):
             "/usr/share/applications", "/usr/share/applications",
             "//usr/share//applications",
         )
-        check = self.check_kls(None)
+        check = self.mk_check()
 
         reports = self.assertReports(check, fake_pkg)
         for r, path in zip(reports, bad):
             assert path in str(r)
 
     def test_docinto(self):
-        check = self.check_kls(None)
+        check = self.mk_check()
         for path in ('${PF}', '${P}', '${PF}/examples'):
             for eapi_str, eapi in EAPI.known_eapis.items():
                 fake_src = [f'\tinsinto /usr/share/doc/{path}\n']
@@ -109,6 +114,9 @@ class TestAbsoluteSymlink(misc.ReportTestCase):
 
     check_kls = codingstyle.AbsoluteSymlinkCheck
 
+    def mk_check(self):
+        return self.check_kls(None, line_scanner_addon=addons.LineScannerAddon(None))
+
     def test_it(self):
         absolute = [
             ("/bin/blah", "/bin/baz"),
@@ -145,7 +153,7 @@ class TestAbsoluteSymlink(misc.ReportTestCase):
         fake_src.append("# That's it for now\n")
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
 
-        check = self.check_kls(None)
+        check = self.mk_check()
         reports = self.assertReports(check, fake_pkg)
 
         assert len(reports) == len(absolute) + len(absolute_prefixed)
@@ -156,7 +164,7 @@ class TestAbsoluteSymlink(misc.ReportTestCase):
 class TestPathVariablesCheck(misc.ReportTestCase):
 
     check_kls = codingstyle.PathVariablesCheck
-    check = check_kls(None)
+    check = check_kls(None, line_scanner_addon=addons.LineScannerAddon(None))
 
     def _found(self, cls, suffix=''):
         # check single and multiple matches across all specified variables
@@ -269,13 +277,16 @@ class TestObsoleteUri(misc.ReportTestCase):
 
     check_kls = codingstyle.ObsoleteUriCheck
 
+    def mk_check(self):
+        return self.check_kls(None, line_scanner_addon=addons.LineScannerAddon(None))
+
     def test_github_archive_uri(self):
         uri = 'https://github.com/foo/bar/archive/${PV}.tar.gz'
         fake_src = [
             f'SRC_URI="{uri} -> ${{P}}.tar.gz"\n'
         ]
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        self.assertNoReport(self.check_kls(None), fake_pkg)
+        self.assertNoReport(self.mk_check(), fake_pkg)
 
     def test_commented_github_tarball_uri(self):
         uri = 'https://github.com/foo/bar/tarball/${PV}'
@@ -285,7 +296,7 @@ class TestObsoleteUri(misc.ReportTestCase):
             f'# {uri}\n'
         ]
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        self.assertNoReport(self.check_kls(None), fake_pkg)
+        self.assertNoReport(self.mk_check(), fake_pkg)
 
     def test_github_tarball_uri(self):
         uri = 'https://github.com/foo/bar/tarball/${PV}'
@@ -294,7 +305,7 @@ class TestObsoleteUri(misc.ReportTestCase):
         ]
 
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        r = self.assertReport(self.check_kls(None), fake_pkg)
+        r = self.assertReport(self.mk_check(), fake_pkg)
         assert r.line == 1
         assert r.uri == uri
         assert (r.replacement ==
@@ -308,7 +319,7 @@ class TestObsoleteUri(misc.ReportTestCase):
         ]
 
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        r = self.assertReport(self.check_kls(None), fake_pkg)
+        r = self.assertReport(self.mk_check(), fake_pkg)
         assert r.line == 1
         assert r.uri == uri
         assert (r.replacement ==
@@ -321,7 +332,7 @@ class TestObsoleteUri(misc.ReportTestCase):
             f'SRC_URI="{uri}"\n'
         ]
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        self.assertNoReport(self.check_kls(None), fake_pkg)
+        self.assertNoReport(self.mk_check(), fake_pkg)
 
     def test_gitlab_tar_gz_uri(self):
         uri = 'https://gitlab.com/foo/bar/repository/archive.tar.gz?ref=${PV}'
@@ -330,7 +341,7 @@ class TestObsoleteUri(misc.ReportTestCase):
         ]
 
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        r = self.assertReport(self.check_kls(None), fake_pkg)
+        r = self.assertReport(self.mk_check(), fake_pkg)
         assert r.line == 1
         assert r.uri == uri
         assert (r.replacement ==
@@ -344,7 +355,7 @@ class TestObsoleteUri(misc.ReportTestCase):
         ]
 
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        r = self.assertReport(self.check_kls(None), fake_pkg)
+        r = self.assertReport(self.mk_check(), fake_pkg)
         assert r.line == 1
         assert r.uri == uri
         assert (r.replacement ==
@@ -358,7 +369,7 @@ class TestObsoleteUri(misc.ReportTestCase):
         ]
 
         fake_pkg = misc.FakePkg("dev-util/diffball-0.5", lines=fake_src)
-        r = self.assertReport(self.check_kls(None), fake_pkg)
+        r = self.assertReport(self.mk_check(), fake_pkg)
         assert r.line == 1
         assert r.uri == uri
         assert (r.replacement ==
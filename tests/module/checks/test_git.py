@@ -1,9 +1,16 @@
-from unittest.mock import patch
-
+import os
+import subprocess
+from unittest.mock import call, patch
+
+import pytest
+from pkgcore.ebuild.atom import atom
+from pkgcore.exceptions import PkgcoreException
+from pkgcore.restrictions import packages
 from pkgcore.test.misc import FakeRepo
 
+from pkgcheck import base
 from pkgcheck.checks import git as git_mod
-from pkgcheck.git import GitCommit
+from pkgcheck.git import GitCommit, _GitCommitPkg
 
 from .. import misc
 
@@ -88,32 +95,51 @@ class TestGitCheck(misc.ReportTestCase):
 
         for tag in ('Fixes', 'Reverts'):
             # no results on `git cat-file` failure
-            with patch('subprocess.Popen') as git_cat:
-                # force using a new `git cat-file` process for each iteration
-                self.check._git_cat_file = None
-                git_cat.return_value.poll.return_value = -1
+            with patch('subprocess.run') as git_cat:
+                git_cat.return_value.returncode = -1
                 commit = self.SO_commit(tags=[f'{tag}: {ref}'])
                 self.assertNoReport(self.check, commit)
 
             # missing and ambiguous object refs
             for status in ('missing', 'ambiguous'):
-                self.check._git_cat_file = None
-                with patch('subprocess.Popen') as git_cat:
-                    git_cat.return_value.poll.return_value = None
-                    git_cat.return_value.stdout.readline.return_value = f'{ref} {status}'
+                with patch('subprocess.run') as git_cat:
+                    git_cat.return_value.returncode = 0
+                    git_cat.return_value.stdout = f'{ref} {status}\n'
                     commit = self.SO_commit(tags=[f'{tag}: {ref}'])
                     r = self.assertReport(self.check, commit)
                     assert isinstance(r, git_mod.InvalidCommitTag)
                     assert f'{status} commit' in r.error
 
+            # no results when replies don't match the requested refs
+            with patch('subprocess.run') as git_cat, \
+                    patch('pkgcheck.checks.git.logger') as logger:
+                git_cat.return_value.returncode = 0
+                git_cat.return_value.stdout = ''
+                commit = self.SO_commit(tags=[f'{tag}: {ref}'])
+                self.assertNoReport(self.check, commit)
+                assert logger.warning.call_args[0][1:] == (0, 1)
+
             # valid tag reference
-            with patch('subprocess.Popen') as git_cat:
-                self.check._git_cat_file = None
-                git_cat.return_value.poll.return_value = None
-                git_cat.return_value.stdout.readline.return_value = f'{ref} commit 1234'
+            with patch('subprocess.run') as git_cat:
+                git_cat.return_value.returncode = 0
+                git_cat.return_value.stdout = f'{ref} commit 1234\n'
                 commit = self.SO_commit(tags=[f'{tag}: {ref}'])
                 self.assertNoReport(self.check, commit)
 
+    def test_bulk_commit_tags(self):
+        refs = ('d8337304f09', '8f9f0ed2c4b')
+        commits = [self.SO_commit(tags=[f'Fixes: {ref}']) for ref in refs]
+        commits.append(self.SO_commit(tags=[f'Reverts: {refs[0]}']))
+        with patch('subprocess.run') as git_cat:
+            git_cat.return_value.returncode = 0
+            git_cat.return_value.stdout = f'{refs[0]} missing\n{refs[1]} commit 1234\n'
+            reports = self.assertReports(self.check, tuple(commits))
+            # all referenced commits are resolved in a single call
+            git_cat.assert_called_once()
+            assert git_cat.call_args[1]['input'] == ''.join(f'{x}\n' for x in refs)
+        assert sorted((r.tag, r.value) for r in reports) == [
+            ('Fixes', refs[0]), ('Reverts', refs[0])]
+
     def test_summary_length(self):
         self.assertNoReport(self.check, self.SO_commit('single summary headline'))
         self.assertNoReport(self.check, self.SO_commit('a' * 69))
@@ -215,3 +241,88 @@ footer: yep
 some random line
 Signed-off-by: author@domain.com
 """.splitlines())).error
+
+
+class FakeRepoPkg:
+
+    def __init__(self, key, commit):
+        self.key = key
+        self.commit = commit
+
+
+class TestRemovalRepo:
+
+    def git(self, *args):
+        return subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test.com'] + list(args),
+            cwd=self.dir, check=True, stdout=subprocess.PIPE, encoding='utf8').stdout.strip()
+
+    @pytest.fixture(autouse=True)
+    def _git_repo(self, tmp_path):
+        self.dir = str(tmp_path / 'repo')
+        for pkg in ('foo', 'bar'):
+            (tmp_path / 'repo' / 'cat' / pkg).mkdir(parents=True)
+            (tmp_path / 'repo' / 'cat' / pkg / f'{pkg}-0.ebuild').write_text('EAPI=7\n')
+        (tmp_path / 'repo' / 'eclass').mkdir()
+        (tmp_path / 'repo' / 'eclass' / 'foo.eclass').write_text('# foo\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        self.git('rm', '-q', '-r', 'cat')
+        self.git('commit', '-q', '-m', 'last rites')
+        self.commit = self.git('rev-parse', 'HEAD')
+        self.parent_repo = FakeRepo(location=self.dir)
+
+    def test_batched(self):
+        pkgs = [FakeRepoPkg(f'cat/{x}', self.commit) for x in ('foo', 'bar')]
+        with patch('pkgcheck.checks.git.subprocess.Popen', wraps=subprocess.Popen) as popen:
+            repo = git_mod._RemovalRepo(self.parent_repo, pkgs)
+            assert popen.call_count == 1
+            # all historical packages are extracted in a single batch
+            for pkg in pkgs:
+                assert repo([pkg]) is repo
+            assert popen.call_count == 1
+        for path in ('cat/foo/foo-0.ebuild', 'cat/bar/bar-0.ebuild', 'eclass/foo.eclass'):
+            assert os.path.exists(os.path.join(repo.location, path))
+
+    def test_failures(self):
+        pkgs = [FakeRepoPkg(f'cat/{x}', self.commit) for x in ('foo', 'nonexistent')]
+        repo = git_mod._RemovalRepo(self.parent_repo, pkgs)
+        # failures only affect their related packages
+        assert repo(pkgs[:1]) is repo
+        assert os.path.exists(os.path.join(repo.location, 'cat/foo/foo-0.ebuild'))
+        with pytest.raises(PkgcoreException):
+            repo(pkgs[1:])
+
+
+class FakeGitAddon:
+
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def commits_repo(self, repo_cls):
+        return FakeRepo(pkgs=self.pkgs)
+
+
+class TestGitPkgCommitsCheck:
+
+    def mk_pkg(self, cpv, status):
+        return _GitCommitPkg(cpv, date='2020-01-01', status=status, commit=FakeCommit())
+
+    def test_historical_pkgs(self):
+        pkgs = [
+            self.mk_pkg('cat/foo-0', 'D'),
+            self.mk_pkg('cat/bar-1', 'M'),
+            self.mk_pkg('cat/baz-0', 'D'),
+        ]
+        repo = FakeRepo(repo_id='test', known_arches={'amd64'})
+        restrict = packages.OrRestriction(atom('cat/foo'), atom('cat/bar'))
+        options = misc.Options(
+            target_repo=repo, restrictions=[(base.package_scope, restrict)])
+        with patch('pkgcheck.checks.git._RemovalRepo') as removal_repo:
+            check = git_mod.GitPkgCommitsCheck(options, git_addon=FakeGitAddon(pkgs))
+            # historical repos are created on first use for all targeted packages
+            removal_repo.assert_not_called()
+            assert check.removal_repo is removal_repo.return_value
+            assert check.modified_repo is removal_repo.return_value
+            assert removal_repo.call_args_list == [call(repo, [pkgs[0]]), call(repo, [pkgs[1]])]
@@ -1,5 +1,8 @@
+from pkgcheck import addons
 from pkgcheck.checks import imlate
 
+from pkgcore.test.misc import FakeRepo
+
 from .. import misc
 
 
@@ -9,9 +12,11 @@ def mk_check(selected_arches=("x86", "ppc", "amd64"), arches=None,
         arches = selected_arches
     if stable_arches is None:
         stable_arches = selected_arches
-    return imlate.ImlateCheck(
-        misc.Options(selected_arches=selected_arches, arches=arches,
-                     stable_arches=stable_arches, source_arches=source_arches))
+    options = misc.Options(
+        selected_arches=selected_arches, arches=arches,
+        stable_arches=stable_arches, source_arches=source_arches,
+        target_repo=FakeRepo(known_arches=frozenset(arches)))
+    return imlate.ImlateCheck(options, keywords_addon=addons.KeywordsAddon(options))
 
 
 def mk_pkg(ver, keywords="", slot="0"):
@@ -144,7 +144,8 @@ class TestKeywordsCheck(IUSE_Options, misc.ReportTestCase):
         search_repo = FakeRepo(pkgs=pkgs)
         options = self.get_options(search_repo=search_repo, gentoo_repo=False)
         use_addon = addons.UseAddon(options, profile_addon=[misc.FakeProfile()])
-        return metadata.KeywordsCheck(options, use_addon=use_addon)
+        return metadata.KeywordsCheck(
+            options, use_addon=use_addon, keywords_addon=addons.KeywordsAddon(options))
 
     def mk_pkg(self, keywords='', cpv='dev-util/diffball-0.7.1', rdepend=''):
         return misc.FakePkg(cpv, data={'KEYWORDS': keywords, 'RDEPEND': rdepend})
@@ -177,7 +178,8 @@ class TestKeywordsCheck(IUSE_Options, misc.ReportTestCase):
         # check that * and ~* are flagged in gentoo repo
         options = self.get_options(repo_name='gentoo', gentoo_repo=True)
         use_addon = addons.UseAddon(options, profile_addon=[misc.FakeProfile()])
-        check = metadata.KeywordsCheck(options, use_addon=use_addon)
+        check = metadata.KeywordsCheck(
+            options, use_addon=use_addon, keywords_addon=addons.KeywordsAddon(options))
         r = self.assertReport(check, self.mk_pkg("*"))
         assert isinstance(r, metadata.UnknownKeywords)
         assert r.keywords == ('*',)
@@ -234,7 +236,8 @@ class TestKeywordsCheck(IUSE_Options, misc.ReportTestCase):
         # create a check instance with verbose mode enabled
         options = self.get_options(gentoo_repo=False, verbosity=1)
         use_addon = addons.UseAddon(options, profile_addon=[misc.FakeProfile()])
-        check = metadata.KeywordsCheck(options, use_addon=use_addon)
+        check = metadata.KeywordsCheck(
+            options, use_addon=use_addon, keywords_addon=addons.KeywordsAddon(options))
 
         # masks should come before regular keywords
         r = self.assertReport(check, self.mk_pkg('~amd64 -*'))
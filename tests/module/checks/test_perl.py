@@ -1,4 +1,5 @@
 import errno
+import os
 import socket
 from unittest.mock import patch
 
@@ -15,7 +16,7 @@ def perl_deps_missing():
     """Check if perl deps are missing."""
     global REASON
     try:
-        perl.PerlCheck(misc.Options(verbosity=1))
+        perl.PerlCheck(misc.Options(verbosity=1, jobs=1))
     except SkipOptionalCheck as e:
         REASON = str(e)
         return True
@@ -27,8 +28,13 @@ class TestPerlCheck(misc.ReportTestCase):
 
     check_kls = perl.PerlCheck
 
-    def mk_check(self, verbosity=0):
-        return self.check_kls(misc.Options(verbosity=verbosity))
+    @pytest.fixture(autouse=True)
+    def _cache_dir(self, tmp_path):
+        with patch('pkgcheck.const.USER_CACHE_DIR', str(tmp_path)):
+            yield
+
+    def mk_check(self, verbosity=0, jobs=1):
+        return self.check_kls(misc.Options(verbosity=verbosity, jobs=jobs))
 
     def mk_pkg(self, PVR, dist_version='', eclasses=('perl-module',), **kwargs):
         lines = ['inherit perl-module\n']
@@ -57,6 +63,53 @@ class TestPerlCheck(misc.ReportTestCase):
             assert r.normalized == '1.700.0'
             assert 'DIST_VERSION=1.7 normalizes to 1.700.0' == str(r)
 
+    def test_multiple_clients(self):
+        """Scanning processes start their own perl clients."""
+        check = self.mk_check(jobs=2)
+        pid = os.getpid()
+        assert list(check.perl.clients) == [pid]
+        with patch('os.getpid', return_value=pid + 1):
+            assert check.perl.normalize('1.07') == '1.70.0'
+        assert sorted(check.perl.clients) == [pid, pid + 1]
+        assert check.perl.clients[pid] is not check.perl.clients[pid + 1]
+        assert check.perl.clients[pid].normalize('1.7') == '1.700.0'
+
+    def test_client_exit(self):
+        """Versions normalized by exited perl clients are skipped without being cached."""
+        check = self.mk_check()
+        client = check.perl.clients[os.getpid()]
+        client.process.kill()
+        client.process.wait()
+        self.assertNoReport(check, self.mk_pkg('1.7.0', '1.07'))
+        assert check.perl._cache == {}
+        assert check.perl.clients[os.getpid()] is None
+
+        check = self.mk_check()
+        assert check.perl._cache == {}
+
+    def test_cache(self):
+        """Normalized versions are cached between runs."""
+        check = self.mk_check()
+        self.assertNoReport(check, self.mk_pkg('1.7.0', '1.007'))
+        assert check.perl._cache == {'1.007': '1.7.0'}
+
+        check = self.mk_check()
+        assert check.perl._cache == {'1.007': '1.7.0'}
+        with patch.object(check.perl.clients[os.getpid()], 'normalize') as normalize:
+            self.assertNoReport(check, self.mk_pkg('1.7.0', '1.007'))
+            normalize.assert_not_called()
+
+    def test_cache_reset(self, tmp_path):
+        """Outdated caches are replaced."""
+        cache_file = tmp_path / 'perl-versions'
+        cache_file.write_text('# Gentoo::PerlMod::Version 0\n1.007 1.0.0\n')
+        check = self.mk_check()
+        assert check.perl._cache == {}
+        assert cache_file.read_text().startswith('# Gentoo::PerlMod::Version ')
+        assert [x.name for x in tmp_path.iterdir()] == ['perl-versions']
+        self.assertNoReport(check, self.mk_pkg('1.7.0', '1.007'))
+        assert cache_file.read_text().endswith('\n1.007 1.7.0\n')
+
     def test_no_dist_version(self):
         """Ebuilds without DIST_VERSION defined are skipped."""
         self.assertNoReport(self.mk_check(), self.mk_pkg('1.7.0'))
@@ -1,14 +1,17 @@
 import os
+import subprocess
 import tempfile
+from unittest import mock
 
 import pytest
 
+from pkgcore.restrictions import packages
 from pkgcore.test.misc import FakeRepo
 from snakeoil import fileutils
 from snakeoil.fileutils import touch
 from snakeoil.osutils import pjoin, ensure_dirs
 
-from pkgcheck import git
+from pkgcheck import addons, base, git
 from pkgcheck.checks import pkgdir
 
 from .. import misc
@@ -23,11 +26,15 @@ class PkgDirCheckBase(misc.ReportTestCase):
     def _create_repo(self, tmpdir):
         self.repo = FakeRepo(repo_id='repo', location=str(tmpdir))
 
-    def mk_check(self, gentoo=False):
-        options = misc.Options(target_repo=self.repo, cache={'git': False}, gentoo_repo=gentoo)
+    def mk_check(self, gentoo=False, scope=base.repo_scope):
+        options = misc.Options(
+            target_repo=self.repo, cache={'git': False, 'digest': False}, gentoo_repo=gentoo,
+            restrictions=[(scope, packages.AlwaysTrue)])
         kwargs = {}
         if git.GitAddon in self.check_kls.required_addons:
             kwargs['git_addon'] = git.GitAddon(options)
+        if addons.DigestAddon in self.check_kls.required_addons:
+            kwargs['digest_addon'] = addons.DigestAddon(options)
         return self.check_kls(options, **kwargs)
 
     def mk_pkg(self, files={}, category=None, package=None, version='0.7.1', revision=''):
@@ -57,6 +64,20 @@ class TestPkgDirCheck(PkgDirCheckBase):
     def test_empty_dir(self):
         self.assertNoReport(self.mk_check(), [self.mk_pkg()])
 
+    def test_git_files(self):
+        with mock.patch.object(git.GitAddon, 'files', new_callable=mock.PropertyMock) as files:
+            files.return_value = None
+            # repo files are listed during check creation for repo-wide scans
+            self.mk_check()
+            assert files.call_count == 1
+
+            # while targeted packages are listed on first use
+            files.reset_mock()
+            check = self.mk_check(scope=base.package_scope)
+            files.assert_not_called()
+            self.assertNoReport(check, [self.mk_pkg()])
+            assert files.called
+
 
 class TestDuplicateFiles(PkgDirCheckBase):
     """Check DuplicateFiles results."""
@@ -394,3 +415,83 @@ class TestUnknownPkgDirEntry(PkgDirCheckBase):
         with open(pjoin(self.repo.location, '.gitignore'), 'w') as f:
             f.write('*.swp')
         self.assertNoReport(self.mk_check(gentoo=True), [pkg])
+
+
+class TestGitRepo(PkgDirCheckBase):
+    """Check results using git index based file listings."""
+
+    def git(self, *args):
+        subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test.com'] + list(args),
+            cwd=self.repo.location, check=True, stdout=subprocess.DEVNULL)
+
+    @pytest.fixture(autouse=True)
+    def _git_repo(self, _create_repo):
+        self.git('init', '-q')
+
+    def test_tracked_and_untracked_files(self):
+        pkg = self.mk_pkg(files={'foo.init': 'blah'}, category='dev-util', package='foo')
+        pkg_dir = os.path.dirname(pkg.path)
+        touch(pjoin(pkg_dir, 'foo-0.ebuild'))
+        os.chmod(pjoin(pkg_dir, 'foo-0.ebuild'), 0o755)
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        touch(pjoin(pkg_dir, 'foo-1.ebuild.swp'))
+        touch(pjoin(self.filesdir, 'empty'))
+        r = self.assertReports(self.mk_check(gentoo=True), [pkg])
+        assert {x.__class__ for x in r} == {
+            pkgdir.ExecutableFile, pkgdir.EmptyFile, pkgdir.UnknownPkgDirEntry}
+
+        # modes are pulled from the index for unmodified files
+        with open(pjoin(self.repo.location, '.gitignore'), 'w') as f:
+            f.write('*.swp\nempty\n')
+        r = self.assertReport(self.mk_check(gentoo=True), [pkg])
+        assert isinstance(r, pkgdir.ExecutableFile)
+        assert r.filename == 'foo-0.ebuild'
+
+    def test_duplicates_from_index(self):
+        pkg = self.mk_pkg(files={'foo.init': 'blah', 'bar.init': 'blah', 'baz.init': 'bleh'})
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        # unmodified files use blob IDs from the index
+        with mock.patch('pkgcheck.addons.DigestAddon.blob_id') as blob_id:
+            r = self.assertReport(self.mk_check(), [pkg])
+            blob_id.assert_not_called()
+        assert isinstance(r, pkgdir.DuplicateFiles)
+        assert r.files == ('files/bar.init', 'files/foo.init')
+
+        # while modified files are read
+        fileutils.write_file(pjoin(self.filesdir, 'baz.init'), 'w', 'blah')
+        r = self.assertReport(self.mk_check(), [pkg])
+        assert r.files == ('files/bar.init', 'files/baz.init', 'files/foo.init')
+
+    def test_deleted_files(self):
+        pkg = self.mk_pkg(files={'foo.init': 'blah', 'bar.init': 'blah'})
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        assert isinstance(self.assertReport(self.mk_check(), [pkg]), pkgdir.DuplicateFiles)
+        os.unlink(pjoin(self.filesdir, 'bar.init'))
+        self.assertNoReport(self.mk_check(), [pkg])
+
+        # files removed after being listed are skipped
+        fileutils.write_file(pjoin(self.filesdir, 'bar.init'), 'w', '')
+        check = self.mk_check()
+        os.unlink(pjoin(self.filesdir, 'bar.init'))
+        self.assertNoReport(check, [pkg])
+
+    def test_targeted_files(self):
+        pkg = self.mk_pkg(files={'foo.init': 'foo'}, category='cat', package='foo')
+        other_pkg = self.mk_pkg(files={'bar.init': 'bar'}, category='cat', package='bar')
+        self.repo.pkgs = [pkg]
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        for p in (pkg, other_pkg):
+            touch(pjoin(os.path.dirname(p.path), 'foo'))
+            os.chmod(pjoin(os.path.dirname(p.path), 'foo'), 0o755)
+
+        # only targeted packages are listed
+        check = self.mk_check(scope=base.package_scope)
+        r = self.assertReport(check, [pkg])
+        assert isinstance(r, pkgdir.ExecutableFile)
+        files = check.git_addon.files
+        assert files.listdir('cat') == ['foo']
@@ -1,12 +1,14 @@
 import os
+import subprocess
 from unittest import mock
 
 from pkgcore.ebuild import atom
+from pkgcore.restrictions import packages
 from pkgcore.test.misc import FakeRepo
 from snakeoil.fileutils import touch
 from snakeoil.osutils import pjoin, ensure_dirs
 
-from pkgcheck import git
+from pkgcheck import addons, base, git
 from pkgcheck.checks import repo
 
 from .. import misc
@@ -16,11 +18,15 @@ class TestRepoDirCheck(misc.Tmpdir, misc.ReportTestCase):
 
     check_kls = repo.RepoDirCheck
 
-    def mk_check(self):
+    def mk_check(self, cache=False):
         self.repo = FakeRepo(repo_id='repo', location=self.dir)
-        options = misc.Options(target_repo=self.repo, cache={'git': False})
+        options = misc.Options(
+            target_repo=self.repo, cache={'git': False, 'binary': cache},
+            restrictions=[(base.repo_scope, packages.AlwaysTrue)])
         git_addon = git.GitAddon(options)
-        return repo.RepoDirCheck(options, git_addon=git_addon)
+        binary_file_addon = addons.BinaryFileAddon(options)
+        return repo.RepoDirCheck(
+            options, git_addon=git_addon, binary_file_addon=binary_file_addon)
 
     def mk_pkg(self, cpvstr):
         pkg = atom.atom(cpvstr)
@@ -109,6 +115,64 @@ class TestRepoDirCheck(misc.Tmpdir, misc.ReportTestCase):
             self.assertNoReport(self.mk_check(), [])
             os.unlink(path)
 
+    def test_gitignored_dirs_skipped(self):
+        os.makedirs(pjoin(self.dir, 'distfiles', 'sub'))
+        with open(pjoin(self.dir, 'distfiles', 'sub', 'foo-0.tar.gz'), 'wb') as f:
+            f.write(b'\xd3\xad\xbe\xef')
+        with open(pjoin(self.dir, '.gitignore'), 'w') as f:
+            f.write('/distfiles/\n')
+        check = self.mk_check()
+        with mock.patch('pkgcheck.addons.is_binary') as is_binary:
+            is_binary.return_value = False
+            self.assertNoReport(check, [])
+        # ignored subtrees are never read
+        assert pjoin(self.dir, '.gitignore') in {x[0][0] for x in is_binary.call_args_list}
+        assert not any('distfiles' in x[0][0] for x in is_binary.call_args_list)
+
+    def test_gitignore_negation(self):
+        os.makedirs(pjoin(self.dir, 'distfiles'))
+        for name in ('foo-0.tar.gz', 'keep.tar.gz'):
+            with open(pjoin(self.dir, 'distfiles', name), 'wb') as f:
+                f.write(b'\xd3\xad\xbe\xef')
+        with open(pjoin(self.dir, '.gitignore'), 'w') as f:
+            f.write('/distfiles/*\n!/distfiles/keep.tar.gz\n')
+        r = self.assertReport(self.mk_check(), [])
+        assert r.path == 'distfiles/keep.tar.gz'
+
+    def test_binary_cache(self, tmp_path_factory):
+        bin_path = pjoin(self.dir, 'foo')
+        with open(bin_path, 'wb') as f:
+            f.write(b'\xd3\xad\xbe\xef')
+        with mock.patch('pkgcheck.const.USER_CACHE_DIR', str(tmp_path_factory.mktemp('cache'))):
+            r = self.assertReport(self.mk_check(cache=True), [])
+            assert r.path == 'foo'
+
+            # unchanged files use cached results
+            with mock.patch('pkgcheck.addons.is_binary') as is_binary:
+                r = self.assertReport(self.mk_check(cache=True), [])
+                assert r.path == 'foo'
+                is_binary.assert_not_called()
+
+            # modified files are checked again
+            with open(bin_path, 'w') as f:
+                f.write('foo')
+            self.assertNoReport(self.mk_check(cache=True), [])
+
+    def test_git_repo(self):
+        for name in ('foo', 'bar', 'baz.o'):
+            with open(pjoin(self.dir, name), 'wb') as f:
+                f.write(b'\xd3\xad\xbe\xef')
+        with open(pjoin(self.dir, '.gitignore'), 'w') as f:
+            f.write('*.o\n')
+        subprocess.run(['git', 'init', '-q'], cwd=self.dir, check=True)
+        subprocess.run(['git', 'add', 'foo', '.gitignore'], cwd=self.dir, check=True)
+        check = self.mk_check()
+        # files are listed by git instead of walking the repo
+        with mock.patch('os.scandir') as scandir:
+            r = self.assertReports(check, [])
+            scandir.assert_not_called()
+        assert [x.path for x in r] == ['bar', 'foo']
+
     def test_non_utf8_encodings(self):
         # non-english languages courtesy of google translate mangling
         langs = (
@@ -1,4 +1,5 @@
 import os
+import pickle
 
 from pkgcore.ebuild.repository import UnconfiguredTree
 from pkgcore.test.misc import FakePkg
@@ -110,3 +111,83 @@ class TestPackageUpdatesCheck(misc.Tmpdir, misc.ReportTestCase):
         assert r.pkg == 'dev-util/foo'
         assert r.moves == ('dev-util/foo', 'dev-util/bar', 'dev-util/blah')
         assert "'dev-util/foo': multi-move update" in str(r)
+
+
+class FakeManifestAddon:
+
+    def __init__(self, distfiles):
+        self._distfiles = distfiles
+
+    def distfiles(self, pkg):
+        return self._distfiles[pkg.key]
+
+
+class TestManifestCollisionCheck(misc.ReportTestCase):
+
+    check_kls = repo_metadata.ManifestCollisionCheck
+
+    def mk_check(self, **distfiles):
+        addon = FakeManifestAddon({k.replace('_', '/'): v for k, v in distfiles.items()})
+        return self.check_kls(misc.Options(), manifest_addon=addon)
+
+    def test_reduced_conflicting_chksums(self):
+        distfiles = {
+            'cat_a': {'foo.tar.gz': {'size': 100, 'blake2b': 'a'}},
+            'cat_b': {'foo.tar.gz': {'size': 100, 'blake2b': 'b'}},
+        }
+        check = self.mk_check(**distfiles)
+        partial_check = self.mk_check(**distfiles)
+        assert not list(check.feed([misc.FakePkg('cat/b-1')]))
+        assert not list(partial_check.feed([misc.FakePkg('cat/a-1')]))
+        # partial states are merged across separate processes out of order
+        state = pickle.loads(pickle.dumps(partial_check.state()))
+        check.reduce(state)
+        r = self.assertReport(check, ())
+        assert isinstance(r, repo_metadata.ConflictingChksums)
+        assert (r.category, r.package) == ('cat', 'b')
+        assert r.chksums == ('blake2b',)
+        assert r.pkgs == ('cat/a',)
+        # data is cleared after results are generated
+        assert len(check.distfiles) == len(check.chksums_map) == 0
+
+    def test_partitioned_collisions(self):
+        distfiles = {
+            'cat_a': {'foo.tar.gz': {'size': 100, 'blake2b': 'a'},
+                      'bar.tar.gz': {'size': 200, 'blake2b': 'c'}},
+            'cat_b': {'foo.tar.gz': {'size': 100, 'blake2b': 'a'}},
+            'cat_c': {'foo.tar.gz': {'size': 100, 'blake2b': 'b'}},
+            'cat_d': {'foo.tar.gz': {'size': 100, 'blake2b': 'b'},
+                      'baz.tar.gz': {'size': 200, 'blake2b': 'c'}},
+        }
+        pkgs = {k: misc.FakePkg(f'{k.replace("_", "/")}-1') for k in distfiles}
+
+        # sequential scans feed all packages in repo order
+        check = self.mk_check(**distfiles)
+        for pkg in pkgs.values():
+            assert not list(check.feed([pkg]))
+        expected = [(r.__class__, r.category, r.package, str(r)) for r in self.assertReports(check, ())]
+
+        # collisions spread across partitions that are merged out of order
+        check = self.mk_check(**distfiles)
+        partitions = (('cat_d',), ('cat_b', 'cat_c'), ('cat_a',))
+        assert not list(check.feed([pkgs['cat_d']]))
+        for partition in partitions[1:]:
+            partial_check = self.mk_check(**distfiles)
+            for key in partition:
+                assert not list(partial_check.feed([pkgs[key]]))
+            check.reduce(pickle.loads(pickle.dumps(partial_check.state())))
+        reports = self.assertReports(check, ())
+        assert [(r.__class__, r.category, r.package, str(r)) for r in reports] == expected
+
+        assert len(reports) == 3
+        conflict_c, conflict_d, matching = reports
+        assert isinstance(conflict_c, repo_metadata.ConflictingChksums)
+        assert (conflict_c.category, conflict_c.package) == ('cat', 'c')
+        assert conflict_c.pkgs == ('cat/a', 'cat/b')
+        assert isinstance(conflict_d, repo_metadata.ConflictingChksums)
+        assert (conflict_d.category, conflict_d.package) == ('cat', 'd')
+        assert conflict_d.pkgs == ('cat/a', 'cat/b')
+        assert isinstance(matching, repo_metadata.MatchingChksums)
+        assert (matching.category, matching.package) == ('cat', 'd')
+        assert (matching.filename, matching.orig_file, matching.orig_pkg) == \
+            ('baz.tar.gz', 'bar.tar.gz', 'cat/a')
@@ -1,3 +1,4 @@
+from pkgcheck import addons
 from pkgcheck.checks import whitespace
 
 from .. import misc
@@ -7,7 +8,8 @@ class WhitespaceCheckTest(misc.ReportTestCase):
     """Various whitespace related test support."""
 
     check_kls = whitespace.WhitespaceCheck
-    check = whitespace.WhitespaceCheck(None)
+    check = whitespace.WhitespaceCheck(
+        None, line_scanner_addon=addons.LineScannerAddon(None))
 
 
 class TestWhitespaceFound(WhitespaceCheckTest):
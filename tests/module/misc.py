@@ -50,6 +50,10 @@ class FakePkg(package):
     def ebuild(self):
         return text_data_source(self._ebuild)
 
+    @property
+    def text(self):
+        return ''.join(self.lines)
+
 
 class FakeTimedPkg(package):
 
@@ -1,10 +1,19 @@
+import hashlib
 import os
+from itertools import chain
+from unittest.mock import patch
 
+from lxml import etree
 from pkgcore.ebuild import repo_objs, repository
+from pkgcore.ebuild.atom import atom
+from pkgcore.ebuild.misc import sort_keywords
+from pkgcore.package.errors import ParseChksumError
 from pkgcore.restrictions import packages
+from pkgcore.test.misc import FakeRepo
 from pkgcore.util import commandline
 import pytest
 from snakeoil.cli import arghparse
+from snakeoil.cli.exceptions import UserException
 from snakeoil.fileutils import write_file
 from snakeoil.osutils import pjoin, ensure_dirs
 
@@ -348,3 +357,691 @@ class TestUseAddon(ArgparseCheck, Tmpdir):
     def test_it(self):
         pass
     test_it.skip = "todo"
+
+
+class TestKeywordsAddon(object):
+
+    addon_kls = addons.KeywordsAddon
+
+    def mk_addon(self, arches=('amd64', 'x86', 'amd64-linux')):
+        return self.addon_kls(Options(target_repo=FakeRepo(known_arches=frozenset(arches))))
+
+    def test_valid(self):
+        addon = self.mk_addon()
+        assert addon.valid == {
+            '-*', 'amd64', 'x86', 'amd64-linux', '~amd64', '~x86', '~amd64-linux',
+            '-amd64', '-x86', '-amd64-linux'}
+
+    def test_sort(self):
+        addon = self.mk_addon()
+        keywords = ('~amd64-linux', 'x86', '-*', '~amd64')
+        assert addon.sort(keywords) == ('-*', '~amd64', 'x86', '~amd64-linux')
+        assert addon.sort(keywords) is addon.sort(keywords)
+        assert addon.sort({'x86', 'amd64'}) == ('amd64', 'x86')
+        for keywords in (('x86', '~amd64', '-*'), ('~ppc-macos', 'amd64', '~x86-solaris')):
+            assert addon.sort(keywords) == tuple(sort_keywords(keywords))
+
+    def test_split(self):
+        addon = self.mk_addon()
+        assert addon.split(('-*', 'amd64', '~x86', '-ppc')) == (
+            {'amd64'}, {'x86'}, {'*', 'ppc'})
+        assert addon.split(()) == (set(), set(), set())
+
+
+class TestLineScannerAddon(object):
+
+    addon_kls = addons.LineScannerAddon
+
+    def mk_pkg(self, lines, eapi='7'):
+        return FakePkg('dev-util/diffball-0.5', data={'EAPI': eapi}, lines=lines)
+
+    def test_unknown_method(self):
+        addon = self.addon_kls(None)
+        with pytest.raises(ValueError):
+            addon.register('foo', method='fullmatch')
+
+    def test_matches(self):
+        addon = self.addon_kls(None)
+        foo = addon.register(r'\s*foo', trigger='foo')
+        bar = addon.register(r'bar', method='search', strip=True, comments=False)
+        pkg = self.mk_pkg([
+            'foo bar\n',
+            '# bar\n',
+            '\tbar\n',
+            'baz\n',
+        ])
+        assert [(k, lineno, line) for k, lineno, line, _m in addon.matches(pkg, foo, bar)] == [
+            (foo, 1, 'foo bar\n'),
+            (bar, 1, 'foo bar'),
+            (bar, 3, 'bar'),
+        ]
+        # matches are ordered by the given keys on the same line
+        assert [(k, lineno) for k, lineno, _line, _m in addon.matches(pkg, bar, foo)] == [
+            (bar, 1), (foo, 1), (bar, 3)]
+
+    def test_finditer(self):
+        addon = self.addon_kls(None)
+        key = addon.register(r'\d', trigger=r'\d', method='finditer')
+        pkg = self.mk_pkg(['a1b2\n', 'c\n', '3\n'])
+        assert [(lineno, m.group()) for _k, lineno, _line, m in addon.matches(pkg, key)] == [
+            (1, '1'), (1, '2'), (3, '3')]
+
+    def test_eapis(self):
+        addon = self.addon_kls(None)
+        key = addon.register('foo', eapis=('5',))
+        assert not list(addon.matches(self.mk_pkg(['foo\n'], eapi='7'), key))
+        assert len(list(addon.matches(self.mk_pkg(['foo\n'], eapi='5'), key))) == 1
+
+
+class TestBashSyntaxAddon(object):
+
+    addon_kls = addons.BashSyntaxAddon
+
+    def test_errors(self, tmp_path):
+        addon = self.addon_kls(None)
+        good = tmp_path / 'good.sh'
+        good.write_text('foo() {\n\techo foo\n}\n')
+        bad = tmp_path / 'bad.sh'
+        bad.write_text('foo() {\n\techo foo\n')
+        assert addon.errors(str(good)) == []
+        errors = addon.errors(str(bad))
+        assert len(errors) == 1
+        lineno, error = errors[0]
+        assert lineno == '3'
+        assert 'syntax error' in error
+        # worker is reused across files
+        worker = addon.worker
+        assert addon.errors(str(good)) == []
+        assert addon.worker is worker
+
+    def test_dead_worker(self, tmp_path):
+        addon = self.addon_kls(None)
+        bad = tmp_path / 'bad.sh'
+        bad.write_text('foo() {\n\techo foo\n')
+        expected = addon.errors(str(bad))
+        assert len(expected) == 1
+        # dead workers fall back to spawning bash, restarting for the next file
+        worker = addon.worker
+        worker.kill()
+        worker.wait()
+        assert addon.errors(str(bad)) == expected
+        assert addon.errors(str(bad)) == expected
+        assert addon.worker is not worker
+
+
+class TestMetadataXmlAddon(Tmpdir):
+
+    addon_kls = addons.MetadataXmlAddon
+
+    valid_xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE pkgmetadata SYSTEM "http://www.gentoo.org/dtd/metadata.dtd">\n'
+        '<pkgmetadata>\n'
+        '\t<maintainer type="person">\n'
+        '\t\t<email>person@email.com</email>\n'
+        '\t</maintainer>\n'
+        '</pkgmetadata>\n'
+    )
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for pkg in ('cat/pkg', 'cat/other'):
+            os.makedirs(pjoin(self.repo_dir, pkg))
+            write_file(pjoin(self.repo_dir, pkg, 'metadata.xml'), 'w', self.valid_xml)
+
+    def mk_addon(self, restrictions=None, cache=True):
+        repo = FakeRepo(repo_id='test', location=self.repo_dir)
+        repo.packages = {'cat': ('pkg', 'other')}
+        repo.itermatch = lambda restrict, **kwargs: iter([FakePkg('cat/pkg-1')])
+        if restrictions is None:
+            restrictions = [(base.repo_scope, packages.AlwaysTrue)]
+        options = Options(
+            target_repo=repo, restrictions=restrictions, cache={'metadata_xml': cache})
+        return self.addon_kls(options)
+
+    def mk_xml(self, data):
+        path = pjoin(self.dir, 'metadata.xml')
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+    def test_parse(self):
+        addon = self.mk_addon(cache=False)
+        path = self.mk_xml(self.valid_xml)
+        doc = addon.parse(path)
+        assert doc.getroot().tag == 'pkgmetadata'
+        # parsed documents are reused
+        assert addon.parse(path) is doc
+
+        # parsing errors are raised
+        path = pjoin(self.dir, 'bad.xml')
+        with open(path, 'w') as f:
+            f.write('<pkgmetadata>')
+        with pytest.raises(etree.XMLSyntaxError):
+            addon.parse(path)
+        with pytest.raises(FileNotFoundError):
+            addon.parse(pjoin(self.dir, 'nonexistent.xml'))
+
+    def test_validate(self):
+        addon = self.mk_addon(cache=False)
+        path = self.mk_xml(self.valid_xml)
+        assert addon.validate(path) == ()
+
+        path = self.mk_xml(self.valid_xml.replace('maintainer', 'foo'))
+        addon._docs.clear()
+        errors = addon.validate(path)
+        assert errors
+        assert 'foo' in errors[0].message
+
+    def test_cache(self):
+        pkg_xml = pjoin(self.repo_dir, 'cat', 'pkg', 'metadata.xml')
+        other_xml = pjoin(self.repo_dir, 'cat', 'other', 'metadata.xml')
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update_cache(None)
+            # files validated while updating the cache skip validation when scanning
+            with patch.object(addon, 'schema') as schema:
+                assert addon.validate(pkg_xml) == ()
+                assert addon.validate(other_xml) == ()
+                schema.validate.assert_not_called()
+
+            # unchanged files are loaded from the cache
+            addon = self.mk_addon()
+            with patch.object(addon, 'schema') as schema:
+                addon.update_cache(None)
+                schema.validate.assert_not_called()
+                assert addon.validate(pkg_xml) == ()
+                schema.validate.assert_not_called()
+
+            # invalid files in targeted packages are dropped
+            write_file(pkg_xml, 'w', self.valid_xml.replace('maintainer', 'foo'))
+            addon = self.mk_addon(restrictions=[(base.package_scope, packages.AlwaysTrue)])
+            addon.update_cache(None)
+            assert addon.validate(pkg_xml)
+            assert addon.load_cache(addon.cache_file(addon.repo)).keys() == {other_xml}
+
+            # disabled cache usage
+            addon = self.mk_addon(cache=False)
+            addon.update_cache(None)
+            with patch.object(addon, 'schema') as schema:
+                schema.validate.return_value = True
+                assert addon.validate(other_xml) == ()
+                schema.validate.assert_called_once()
+
+            # forced updates drop existing entries
+            addon = self.mk_addon()
+            with patch.object(addon, 'schema') as schema:
+                schema.validate.return_value = True
+                addon.update_cache(None, force=True)
+                assert schema.validate.call_count == 2
+
+            # schema changes invalidate existing entries
+            addon = self.mk_addon()
+            addon._schema_digest = 'changed'
+            with patch.object(addon, 'schema') as schema:
+                schema.validate.return_value = True
+                addon.update_cache(None)
+                assert schema.validate.call_count == 2
+
+
+class TestEclassAddon(Tmpdir):
+
+    addon_kls = addons.EclassAddon
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for d in ('metadata', 'profiles', 'eclass', 'cat/pkg', 'cat/other'):
+            os.makedirs(pjoin(self.repo_dir, d))
+        write_file(pjoin(self.repo_dir, 'metadata', 'layout.conf'), 'w', 'masters=\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'repo_name'), 'w', 'test\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'categories'), 'w', 'cat\n')
+        for eclass in ('foo', 'bar'):
+            write_file(pjoin(self.repo_dir, 'eclass', f'{eclass}.eclass'), 'w', f'# {eclass}\n')
+        self.mk_ebuild('cat/pkg/pkg-1.ebuild', ['foo'])
+        self.mk_ebuild('cat/other/other-1.ebuild', ['foo', 'bar'])
+
+    def mk_ebuild(self, path, eclasses):
+        """Create an ebuild with a related md5-cache entry."""
+        data = f'EAPI=7\ninherit {" ".join(eclasses)}\nSLOT=0\n'
+        write_file(pjoin(self.repo_dir, path), 'w', data)
+        eclasses_data = []
+        for eclass in eclasses:
+            with open(pjoin(self.repo_dir, 'eclass', f'{eclass}.eclass'), 'rb') as f:
+                eclasses_data.extend([eclass, hashlib.md5(f.read()).hexdigest()])
+        category, package, ebuild = path.split(os.sep)
+        cache_path = pjoin(self.repo_dir, 'metadata', 'md5-cache', category, ebuild[:-7])
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        write_file(cache_path, 'w', (
+            f'EAPI=7\nSLOT=0\n_eclasses_={chr(9).join(eclasses_data)}\n'
+            f'_md5_={hashlib.md5(data.encode()).hexdigest()}\n'))
+
+    def mk_addon(self, cache=True):
+        repo_config = repo_objs.RepoConfig(location=self.repo_dir)
+        repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        options = Options(target_repo=repo, cache={'eclass': cache})
+        return self.addon_kls(options)
+
+    def test_index(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            assert addon.packages('foo') == {'cat/pkg', 'cat/other'}
+            assert addon.packages('bar') == {'cat/other'}
+            assert addon.packages('nonexistent') == frozenset()
+            assert set(addon.index) == {'foo', 'bar'}
+
+    def test_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            assert addon.packages('bar') == {'cat/other'}
+
+            # unchanged versions are loaded from the cache
+            addon = self.mk_addon()
+            with patch.object(addon, '_md5_cache_eclasses') as md5_cache:
+                assert addon.packages('bar') == {'cat/other'}
+                md5_cache.assert_not_called()
+
+            # changed versions are regenerated
+            self.mk_ebuild('cat/pkg/pkg-1.ebuild', ['bar'])
+            os.utime(pjoin(self.repo_dir, 'cat/pkg/pkg-1.ebuild'), ns=(0, 0))
+            addon = self.mk_addon()
+            assert addon.packages('bar') == {'cat/pkg', 'cat/other'}
+            assert addon.packages('foo') == {'cat/other'}
+
+            # disabled cache usage
+            addon = self.mk_addon(cache=False)
+            with patch.object(addon, '_md5_cache_eclasses', return_value=frozenset()) as md5_cache:
+                assert addon.packages('bar') == frozenset()
+                assert md5_cache.call_count == 2
+
+    def test_outdated_md5_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            # eclass changes invalidate md5-cache entries
+            write_file(pjoin(self.repo_dir, 'eclass', 'bar.eclass'), 'w', '# changed\n')
+            addon = self.mk_addon(cache=False)
+            with patch.object(addon.repo, 'itermatch', return_value=iter(())) as itermatch:
+                assert addon.packages('foo') == {'cat/pkg'}
+                itermatch.assert_called_once()
+
+
+class TestDigestAddon(Tmpdir):
+
+    addon_kls = addons.DigestAddon
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for pkg in ('cat/pkg', 'cat/other'):
+            os.makedirs(pjoin(self.repo_dir, pkg, 'files'))
+            for name, data in (('a.patch', 'foo\n'), ('b.patch', 'bar\n'), ('c.patch', 'foobar\n')):
+                write_file(pjoin(self.repo_dir, pkg, 'files', name), 'w', data)
+
+    def mk_addon(self, restrictions=None, cache=True):
+        repo = FakeRepo(repo_id='repo', location=self.repo_dir)
+        repo.packages = {'cat': ('pkg', 'other')}
+        repo.itermatch = lambda restrict, **kwargs: iter([FakePkg('cat/pkg-1')])
+        if restrictions is None:
+            restrictions = [(base.repo_scope, packages.AlwaysTrue)]
+        options = Options(target_repo=repo, restrictions=restrictions, cache={'digest': cache})
+        return self.addon_kls(options)
+
+    def test_blob_id(self):
+        path = pjoin(self.repo_dir, 'cat', 'pkg', 'files', 'a.patch')
+        # matches `git hash-object` output
+        assert self.addon_kls.blob_id(path) == '257cc5642cb1a054f08cc83f2d943e56fd3ebe99'
+        addon = self.mk_addon(cache=False)
+        assert addon.digest(path) == '257cc5642cb1a054f08cc83f2d943e56fd3ebe99'
+        assert addon.digest(path, blob='a' * 40) == 'a' * 40
+
+    def test_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update_cache(None)
+            # only files sharing the same size within a package are cached
+            assert sorted(os.path.relpath(x, self.repo_dir) for x in addon._digests) == [
+                'cat/other/files/a.patch', 'cat/other/files/b.patch',
+                'cat/pkg/files/a.patch', 'cat/pkg/files/b.patch',
+            ]
+
+            # unchanged files are loaded from the cache
+            addon = self.mk_addon()
+            with patch.object(self.addon_kls, 'blob_id') as blob_id:
+                addon.update_cache(None)
+                blob_id.assert_not_called()
+                addon.digest(pjoin(self.repo_dir, 'cat', 'pkg', 'files', 'a.patch'))
+                blob_id.assert_not_called()
+
+            # changed files in targeted packages are updated
+            path = pjoin(self.repo_dir, 'cat', 'pkg', 'files', 'c.patch')
+            write_file(path, 'w', 'baz\n')
+            addon = self.mk_addon(restrictions=[(base.package_scope, packages.AlwaysTrue)])
+            addon.update_cache(None)
+            assert addon.digest(path) == self.addon_kls.blob_id(path)
+            assert len(addon._digests) == 5
+
+            # disabled cache usage
+            addon = self.mk_addon(cache=False)
+            addon.update_cache(None)
+            assert not addon._digests
+
+    def test_unsourced_targets(self):
+        # ebuild repo lacking a metadata cache
+        for d in ('metadata', 'profiles'):
+            os.makedirs(pjoin(self.repo_dir, d))
+        write_file(pjoin(self.repo_dir, 'metadata', 'layout.conf'), 'w', 'masters=\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'repo_name'), 'w', 'test\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'categories'), 'w', 'cat\n')
+        write_file(pjoin(self.repo_dir, 'cat', 'pkg', 'pkg-1.ebuild'), 'w', 'EAPI=7\nSLOT=0\n')
+        repo_config = repo_objs.RepoConfig(location=self.repo_dir)
+        repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        # source the ebuild from the main thread using a separate repo, leaving
+        # an idle ebuild daemon that has its liveness checked on reuse
+        other_repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        assert list(other_repo.itermatch(atom('cat/pkg')))
+        restrictions = [(base.package_scope, atom('cat/pkg'))]
+        options = Options(
+            target_repo=repo, restrictions=restrictions, cache={'digest': True},
+            force_cache=False)
+        addon = self.addon_kls(options)
+
+        # targeted packages are determined without sourcing ebuilds in cache update threads
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon.update_caches(options, [addon])
+        assert sorted(os.path.relpath(x, self.repo_dir) for x in addon._digests) == [
+            'cat/pkg/files/a.patch', 'cat/pkg/files/b.patch',
+        ]
+
+
+class TestManifestAddon(Tmpdir):
+
+    addon_kls = addons.ManifestAddon
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for d in ('metadata', 'profiles', 'cat/pkg', 'cat/other'):
+            os.makedirs(pjoin(self.repo_dir, d))
+        write_file(pjoin(self.repo_dir, 'metadata', 'layout.conf'), 'w', 'masters=\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'repo_name'), 'w', 'test\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'categories'), 'w', 'cat\n')
+        for pkg in ('pkg', 'other'):
+            write_file(pjoin(self.repo_dir, 'cat', pkg, f'{pkg}-1.ebuild'), 'w', 'EAPI=7\nSLOT=0\n')
+        self.mk_manifest('cat/pkg', 'foo.tar.gz', 'a' * 128)
+        write_file(pjoin(self.repo_dir, 'cat', 'other', 'Manifest'), 'w', 'invalid\n')
+
+    def mk_manifest(self, pkg, filename, chksum):
+        write_file(
+            pjoin(self.repo_dir, pkg, 'Manifest'), 'w',
+            f'DIST {filename} 100 BLAKE2B {chksum} SHA512 {chksum}\n')
+
+    def mk_addon(self, restrictions=None, cache=True):
+        repo_config = repo_objs.RepoConfig(location=self.repo_dir)
+        self.repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        if restrictions is None:
+            restrictions = [(base.repo_scope, packages.AlwaysTrue)]
+        options = Options(target_repo=self.repo, restrictions=restrictions, cache={'manifest': cache})
+        return self.addon_kls(options)
+
+    def test_index(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update_cache(None)
+            pkg, other = (next(self.repo.itermatch(atom(x))) for x in ('cat/pkg', 'cat/other'))
+            distfiles = addon.distfiles(pkg)
+            assert list(distfiles) == ['foo.tar.gz']
+            assert distfiles['foo.tar.gz']['size'] == 100
+
+            # indexed data is used for package Manifest objects
+            with patch('pkgcore.ebuild.digest.parse_manifest') as parse_manifest:
+                manifest = addon.manifest(pkg)
+                assert manifest.distfiles is distfiles
+                assert not manifest.thin
+                parse_manifest.assert_not_called()
+
+            # invalid Manifest files fall back to regular parsing errors
+            with pytest.raises(ParseChksumError):
+                addon.distfiles(other)
+
+    def test_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            self.mk_addon().update_cache(None)
+
+            # unchanged Manifest files are loaded from the cache
+            addon = self.mk_addon()
+            with patch('pkgcheck.addons.parse_manifest') as parse_manifest:
+                addon.update_cache(None)
+                # only the invalid Manifest is reparsed
+                assert parse_manifest.call_count == 1
+
+            # changed Manifest files are reparsed
+            self.mk_manifest('cat/pkg', 'bar.tar.gz', 'b' * 128)
+            os.utime(pjoin(self.repo_dir, 'cat', 'pkg', 'Manifest'), ns=(0, 0))
+            addon = self.mk_addon()
+            addon.update_cache(None)
+            pkg = next(self.repo.itermatch(atom('cat/pkg')))
+            assert list(addon.distfiles(pkg)) == ['bar.tar.gz']
+
+    def test_targets(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            self.mk_addon().update_cache(None)
+            self.mk_manifest('cat/pkg', 'bar.tar.gz', 'b' * 128)
+            os.utime(pjoin(self.repo_dir, 'cat', 'pkg', 'Manifest'), ns=(0, 0))
+
+            # only targeted Manifest files are checked
+            addon = self.mk_addon(restrictions=[(base.package_scope, atom('cat/other'))])
+            with patch('pkgcheck.addons.parse_manifest') as parse_manifest:
+                parse_manifest.side_effect = ParseChksumError('Manifest', 'invalid')
+                addon.update_cache(None)
+                parse_manifest.assert_called_once()
+                assert parse_manifest.call_args[0][0].endswith('cat/other/Manifest')
+
+            # targeted entries are updated in the cache
+            addon = self.mk_addon(restrictions=[(base.package_scope, atom('cat/pkg'))])
+            addon.update_cache(None)
+            pkg = next(self.repo.itermatch(atom('cat/pkg')))
+            assert list(addon.distfiles(pkg)) == ['bar.tar.gz']
+
+            # while cached entries for untargeted packages are kept
+            addon = self.mk_addon(restrictions=[(base.package_scope, atom('cat/other'))])
+            addon.update_cache(None)
+            addon = self.mk_addon()
+            with patch('pkgcheck.addons.parse_manifest') as parse_manifest:
+                addon.update_cache(None)
+                # only the invalid Manifest is reparsed
+                assert parse_manifest.call_count == 1
+
+    def test_reused_index(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update_cache(None)
+
+            # later updates reuse the in-memory index
+            with patch.object(addon, 'load_cache') as load_cache:
+                addon.update_cache(None)
+                load_cache.assert_not_called()
+            self.mk_manifest('cat/pkg', 'bar.tar.gz', 'b' * 128)
+            os.utime(pjoin(self.repo_dir, 'cat', 'pkg', 'Manifest'), ns=(0, 0))
+            addon.update_cache(None)
+            pkg = next(self.repo.itermatch(atom('cat/pkg')))
+            assert list(addon.distfiles(pkg)) == ['bar.tar.gz']
+
+
+class TestPkgCostAddon(Tmpdir):
+
+    addon_kls = addons.PkgCostAddon
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for d in ('metadata', 'profiles', 'cat/small', 'cat/large'):
+            os.makedirs(pjoin(self.repo_dir, d))
+        write_file(pjoin(self.repo_dir, 'metadata', 'layout.conf'), 'w', 'masters=\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'repo_name'), 'w', 'test\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'categories'), 'w', 'cat\n')
+        write_file(pjoin(self.repo_dir, 'cat', 'small', 'small-1.ebuild'), 'w', 'EAPI=7\n')
+        for ver in range(3):
+            write_file(
+                pjoin(self.repo_dir, 'cat', 'large', f'large-{ver}.ebuild'), 'w', 'EAPI=7\n' * 100)
+
+    def mk_addon(self, cache=True):
+        repo_config = repo_objs.RepoConfig(location=self.repo_dir)
+        self.repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        options = Options(target_repo=self.repo, cache={'costs': cache})
+        return self.addon_kls(options)
+
+    def test_estimate(self):
+        addon = self.mk_addon()
+        small, large = addon.costs(['cat/small', 'cat/large'])
+        assert small < large
+        assert addon.costs(['cat/nonexistent']) == [0]
+
+    def test_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update({'cat/small': 2.0})
+            assert os.path.exists(addon.cache_file(self.repo))
+
+            # timings from previous scans override estimates
+            addon = self.mk_addon()
+            small, large = addon.costs(['cat/small', 'cat/large'])
+            assert small == 2.0
+            assert large > small
+
+            # disabled caches aren't used or updated
+            addon = self.mk_addon(cache=False)
+            addon.update({'cat/large': 1.0})
+            small, large = addon.costs(['cat/small', 'cat/large'])
+            assert small < large
+            addon = self.mk_addon()
+            assert addon.costs(['cat/small']) == [2.0]
+
+    def test_invalid_cache(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update({'cat/small': 2.0})
+            cache_file = addon.cache_file(self.repo)
+
+            # outdated caches are ignored
+            with patch.object(self.addon_kls, 'cache', addon.cache._replace(version=0)):
+                assert addon.load_cache(cache_file, fallback={}) == {}
+
+            # as are corrupted caches
+            write_file(cache_file, 'w', 'foo')
+            addon = self.mk_addon()
+            assert addon.costs(['cat/small']) != [2.0]
+
+            # failures writing the cache are reported
+            os.remove(cache_file)
+            os.makedirs(cache_file)
+            with pytest.raises(UserException, match='failed dumping costs cache'):
+                addon.update({'cat/small': 2.0})
+
+
+class TestMetadataCacheAddon(Tmpdir):
+
+    addon_kls = addons.MetadataCacheAddon
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.repo_dir = str(tmp_path / 'repo')
+        for d in ('metadata', 'profiles', 'cat/pkg'):
+            os.makedirs(pjoin(self.repo_dir, d))
+        write_file(pjoin(self.repo_dir, 'metadata', 'layout.conf'), 'w', 'masters=\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'repo_name'), 'w', 'test\n')
+        write_file(pjoin(self.repo_dir, 'profiles', 'categories'), 'w', 'cat\n')
+        for ver in range(3):
+            write_file(
+                pjoin(self.repo_dir, 'cat', 'pkg', f'pkg-{ver}.ebuild'), 'w',
+                f'EAPI=7\nDESCRIPTION="version {ver}"\nSLOT=0\n')
+
+    def mk_addon(self, cache=True):
+        repo_config = repo_objs.RepoConfig(location=self.repo_dir)
+        self.repo = repository.UnconfiguredTree(self.repo_dir, repo_config=repo_config)
+        options = Options(
+            target_repo=self.repo, cache={'metadata': cache}, jobs=2,
+            restrictions=[(base.repo_scope, packages.AlwaysTrue)])
+        return self.addon_kls(options)
+
+    def test_regen(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.update_cache(None)
+            assert os.path.exists(addon.cache_file(self.repo))
+            pkgs = sorted(self.repo)
+            assert [x.description for x in pkgs] == [f'version {x}' for x in range(3)]
+
+            # cached metadata is used by later runs without regenerating it
+            addon = self.mk_addon()
+            with patch.object(addons.MetadataCacheAddon, '_regen') as regen:
+                addon.update_cache(None)
+                regen.assert_not_called()
+            with patch('pkgcore.ebuild.processor.request_ebuild_processor') as request:
+                assert sorted(x.description for x in self.repo) == [
+                    f'version {x}' for x in range(3)]
+                assert not request.called
+
+            # modified ebuilds are regenerated
+            write_file(
+                pjoin(self.repo_dir, 'cat', 'pkg', 'pkg-1.ebuild'), 'w',
+                'EAPI=7\nDESCRIPTION="modified"\nSLOT=0\n')
+            addon = self.mk_addon()
+            with patch.object(addons.MetadataCacheAddon, '_regen', wraps=addon._regen) as regen:
+                addon.update_cache(None)
+                stale = chain.from_iterable(x[0][0] for x in regen.call_args_list)
+                assert [x.cpvstr for x in stale] == ['cat/pkg-1']
+            addon = self.mk_addon()
+            with patch.object(addons.MetadataCacheAddon, '_regen') as regen:
+                addon.update_cache(None)
+                regen.assert_not_called()
+            with patch('pkgcore.ebuild.processor.request_ebuild_processor') as request:
+                assert [x.description for x in sorted(self.repo)] == [
+                    'version 0', 'modified', 'version 2']
+                assert not request.called
+
+    def test_targets(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon()
+            addon.options.restrictions = [(base.version_scope, atom('=cat/pkg-1'))]
+            with patch.object(addons.MetadataCacheAddon, '_regen') as regen:
+                addon.update_cache(None)
+                stale = chain.from_iterable(x[0][0] for x in regen.call_args_list)
+                assert [x.cpvstr for x in stale] == ['cat/pkg-1']
+
+            # targets piped in via stdin are left for the scan
+            restrictions = iter([(base.package_scope, atom('cat/pkg'))])
+            addon = self.mk_addon()
+            addon.options.restrictions = restrictions
+            with patch.object(addons.MetadataCacheAddon, '_regen') as regen:
+                addon.update_cache(None)
+                regen.assert_not_called()
+            assert list(restrictions) == [(base.package_scope, atom('cat/pkg'))]
+
+    def test_disabled(self):
+        with patch('pkgcheck.const.USER_CACHE_DIR', self.dir):
+            addon = self.mk_addon(cache=False)
+            addon.update_cache(None)
+            assert not os.path.exists(addon.cache_file(self.repo))
+
+    def test_stale(self):
+        cache_dir = pjoin(self.dir, 'md5-cache')
+        addon = self.mk_addon()
+        metadata_cache = addons._MetadataCacheDB(addon.cache_file(self.repo))
+        pkg = next(self.repo.itermatch(atom('=cat/pkg-0'), pkg_filter=None))
+        assert addon._stale(pkg, [cache_dir], metadata_cache)
+        os.makedirs(pjoin(cache_dir, 'cat'))
+        write_file(pjoin(cache_dir, 'cat', 'pkg-0'), 'w', '')
+        assert not addon._stale(pkg, [cache_dir], metadata_cache)
+        os.utime(pjoin(cache_dir, 'cat', 'pkg-0'), (0, 0))
+        assert addon._stale(pkg, [cache_dir], metadata_cache)
+
+        # valid pkgcheck cache entries are current
+        self.repo.cache += (metadata_cache,)
+        self.repo.package_class = self.repo.package_factory(
+            self.repo, self.repo.cache, self.repo.eclass_cache,
+            self.repo.mirrors, self.repo.default_mirrors)
+        pkg = next(self.repo.itermatch(atom('=cat/pkg-0'), pkg_filter=None))
+        addon._regen([pkg])
+        assert not addon._stale(pkg, [cache_dir], metadata_cache)
+        write_file(pkg.path, 'w', 'EAPI=7\nDESCRIPTION="modified"\nSLOT=0\n')
+        assert addon._stale(pkg, [cache_dir], metadata_cache)
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import pickle
+import tempfile
+
+import pytest
+
+from pkgcheck.aggregate import Aggregator
+
+
+def _fill(aggregator, queue):
+    """Add data in a forked process, passing back the partial state."""
+    for i in range(3):
+        aggregator.add('foo', i)
+    queue.put(aggregator)
+    # forked copies never remove the parent's run directory
+    aggregator._finalizer()
+
+
+class TestAggregator:
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path, monkeypatch):
+        # create run dirs in a separate dir so they can be tracked
+        monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+        self.dir = tmp_path
+
+    def runs(self):
+        return [x for x in self.dir.glob('*/*') if x.suffix == '.run']
+
+    def test_empty(self):
+        aggregator = Aggregator()
+        assert len(aggregator) == 0
+        assert list(aggregator.items()) == []
+
+    def test_items(self):
+        aggregator = Aggregator()
+        for key, value in (('b', 1), ('a', 2), ('b', 0), ('c', 3), ('a', 1)):
+            aggregator.add(key, value)
+        assert len(aggregator) == 5
+        # keys are sorted while values retain insertion order
+        assert list(aggregator.items()) == [('a', [2, 1]), ('b', [1, 0]), ('c', [3])]
+        assert not self.runs()
+
+    def test_spill(self):
+        aggregator = Aggregator(limit=3)
+        for i in range(10):
+            aggregator.add(i % 4, i)
+        assert len(aggregator) == 10
+        assert len(self.runs()) == 3
+        expected = [(0, [0, 4, 8]), (1, [1, 5, 9]), (2, [2, 6]), (3, [3, 7])]
+        assert list(aggregator.items()) == expected
+        # items can be iterated over multiple times
+        assert list(aggregator.items()) == expected
+        aggregator.clear()
+        assert len(aggregator) == 0
+        assert not self.runs()
+
+    def test_close(self):
+        with Aggregator(limit=2) as aggregator:
+            for i in range(3):
+                aggregator.add('foo', i)
+            assert len(self.runs()) == 1
+        assert not os.listdir(self.dir)
+
+        # run dirs are removed on failure
+        with pytest.raises(ValueError):
+            with Aggregator(limit=2) as aggregator:
+                for i in range(3):
+                    aggregator.add('foo', i)
+                raise ValueError
+        assert not os.listdir(self.dir)
+
+        # closed aggregators can be reused
+        aggregator.add('foo', 0)
+        aggregator.add('bar', 1)
+        assert list(aggregator.items()) == [('bar', [1]), ('foo', [0])]
+
+        # and unreferenced aggregators clean up after themselves
+        del aggregator
+        assert not os.listdir(self.dir)
+
+    def test_update(self):
+        aggregator = Aggregator(limit=2)
+        partial = Aggregator(limit=2)
+        for i in range(3):
+            aggregator.add('foo', i)
+            partial.add('bar', i)
+        # partial states are merged across separate processes
+        state = pickle.loads(pickle.dumps(partial))
+        aggregator.update(state)
+        assert len(aggregator) == 6
+        # run files are owned by the merged aggregator
+        partial.close()
+        state.close()
+        assert len(self.runs()) == 3
+        assert list(aggregator.items()) == [('bar', [0, 1, 2]), ('foo', [0, 1, 2])]
+        aggregator.close()
+        assert not os.listdir(self.dir)
+
+    def test_forked(self):
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        with Aggregator(limit=2) as aggregator:
+            p = ctx.Process(target=_fill, args=(aggregator, queue))
+            p.start()
+            state = queue.get()
+            p.join()
+            # runs are written to the shared run dir
+            assert len(os.listdir(self.dir)) == 1
+            aggregator.update(state)
+            assert list(aggregator.items()) == [('foo', [0, 1, 2])]
+        assert not os.listdir(self.dir)
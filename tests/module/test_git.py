@@ -0,0 +1,134 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from pkgcheck import git
+
+
+class TestGitFiles:
+
+    def git(self, *args):
+        subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test.com'] + list(args),
+            cwd=self.dir, check=True, stdout=subprocess.DEVNULL)
+
+    @pytest.fixture(autouse=True)
+    def _git_repo(self, tmp_path):
+        self.dir = str(tmp_path)
+        (tmp_path / 'cat' / 'pkg' / 'files').mkdir(parents=True)
+        (tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild').write_text('EAPI=7\n')
+        (tmp_path / 'cat' / 'pkg' / 'files' / 'foo.patch').write_text('foo\n')
+        (tmp_path / 'cat' / 'pkg' / 'files' / 'foo.patch').chmod(0o755)
+        (tmp_path / '.gitignore').write_text('*.o\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+
+    def test_tracked(self):
+        files = git.GitFiles.from_repo(self.dir)
+        assert sorted(x for x, _ in files.walk()) == [
+            '.gitignore', 'cat/pkg/files/foo.patch', 'cat/pkg/pkg-0.ebuild']
+        assert sorted(files.listdir()) == ['.gitignore', 'cat']
+        assert sorted(files.listdir('cat/pkg')) == ['files', 'pkg-0.ebuild']
+        assert files.listdir('nonexistent') == []
+        assert [x for x, _ in files.walk('cat/pkg/files')] == ['cat/pkg/files/foo.patch']
+        assert files.isdir('cat/pkg')
+        assert not files.isdir('cat/pkg/pkg-0.ebuild')
+        assert 'cat/pkg' in files
+        assert 'cat/pkg/pkg-0.ebuild' in files
+        assert 'cat/other' not in files
+
+        entry = files.get('cat/pkg/files/foo.patch')
+        assert entry.mode == 0o100755
+        blob = subprocess.run(
+            ['git', 'hash-object', 'cat/pkg/files/foo.patch'], cwd=self.dir,
+            stdout=subprocess.PIPE, encoding='utf8').stdout.strip()
+        assert entry.blob == blob
+        assert files.get('cat/pkg') is None
+
+    def test_paths(self):
+        files = git.GitFiles.from_repo(self.dir, ['cat/pkg'])
+        assert sorted(x for x, _ in files.walk()) == [
+            'cat/pkg/files/foo.patch', 'cat/pkg/pkg-0.ebuild']
+
+    def test_working_tree_changes(self):
+        with open(os.path.join(self.dir, 'cat', 'pkg', 'pkg-0.ebuild'), 'a') as f:
+            f.write('SLOT=0\n')
+        os.unlink(os.path.join(self.dir, 'cat', 'pkg', 'files', 'foo.patch'))
+        for name in ('pkg-1.ebuild', 'pkg.o'):
+            with open(os.path.join(self.dir, 'cat', 'pkg', name), 'w') as f:
+                f.write('EAPI=7\n')
+
+        files = git.GitFiles.from_repo(self.dir)
+        # removed files and their empty dirs are dropped
+        assert files.get('cat/pkg/files/foo.patch') is None
+        assert not files.isdir('cat/pkg/files')
+        # modified and untracked files have unknown modes and blobs
+        assert files.get('cat/pkg/pkg-0.ebuild') == git.GitFile(None, None)
+        assert files.get('cat/pkg/pkg-1.ebuild') == git.GitFile(None, None)
+        # ignored files are skipped
+        assert 'cat/pkg/pkg.o' not in files
+
+
+class TestGitRepoSnapshot:
+
+    def git(self, *args, cwd=None):
+        subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test.com'] + list(args),
+            cwd=cwd or self.dir, check=True, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+
+    @pytest.fixture(autouse=True)
+    def _git_repo(self, tmp_path):
+        upstream = tmp_path / 'upstream'
+        (upstream / 'cat' / 'pkg').mkdir(parents=True)
+        (upstream / 'cat' / 'pkg' / 'pkg-0.ebuild').write_text('EAPI=7\n')
+        self.git('init', '-q', cwd=str(upstream))
+        self.git('symbolic-ref', 'HEAD', 'refs/heads/master', cwd=str(upstream))
+        self.git('add', '.', cwd=str(upstream))
+        self.git('commit', '-q', '-m', 'init', cwd=str(upstream))
+
+        self.dir = str(tmp_path / 'local')
+        self.git('clone', '-q', str(upstream), self.dir, cwd=str(tmp_path))
+        (tmp_path / 'local' / 'cat' / 'pkg' / 'pkg-1.ebuild').write_text('EAPI=7\n')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'cat/pkg: version bump')
+        (tmp_path / 'local' / 'README').write_text('readme\n')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'add readme')
+
+    def test_local_commits(self):
+        snapshot = git.GitRepoSnapshot(self.dir)
+        assert snapshot.local
+        assert [x.message for x in snapshot.commits] == [['add readme'], ['cat/pkg: version bump']]
+        assert [(str(x.atom), x.status) for x in snapshot.pkg_changes] == [('=cat/pkg-1', 'A')]
+        # package changes reference the same commit objects
+        assert snapshot.pkg_changes[0].commit is snapshot.commits[1]
+        assert list(snapshot.pkg_repo['cat']['pkg']) == [('1', 'A')]
+
+    def test_memoized_refs(self):
+        snapshot = git.GitRepoSnapshot(self.dir)
+        with patch('pkgcheck.git.GitAddon.get_commit_hash') as get_commit_hash:
+            get_commit_hash.side_effect = lambda path, commit: commit * 2
+            assert snapshot.get_commit_hash() == 'origin/HEAD' * 2
+            assert snapshot.local
+            assert snapshot.get_commit_hash('master') == 'master' * 2
+            assert get_commit_hash.call_count == 2
+
+            # failures are memoized as well
+            get_commit_hash.side_effect = ValueError('failed')
+            for _ in range(2):
+                with pytest.raises(ValueError, match='failed'):
+                    snapshot.get_commit_hash('nonexistent')
+            assert get_commit_hash.call_count == 3
+
+    def test_changed_paths(self):
+        snapshot = git.GitRepoSnapshot(self.dir)
+        paths = snapshot.changed_paths('origin')
+        assert paths == ('README', 'cat/pkg/pkg-1.ebuild')
+        assert snapshot.changed_paths('origin', ['cat']) == ('cat/pkg/pkg-1.ebuild',)
+        assert snapshot.changed_paths('origin') is paths
+        with pytest.raises(ValueError):
+            snapshot.changed_paths('nonexistent')
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from pkgcheck import inotify
+
+try:
+    inotify._libc()
+    has_inotify = True
+except Exception:
+    has_inotify = False
+
+
+@pytest.mark.skipif(not has_inotify, reason='requires inotify support')
+class TestWatcher:
+
+    def test_changes(self, tmp_path):
+        (tmp_path / 'cat' / 'pkg').mkdir(parents=True)
+        with inotify.Watcher(str(tmp_path), delay=0.01) as watcher:
+            changes = iter(watcher)
+            (tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild').write_text('EAPI=7\n')
+            (tmp_path / 'cat' / 'pkg' / '.pkg-0.ebuild.swp').write_text('')
+            (tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild~').write_text('')
+            assert next(changes) == {str(tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild')}
+
+            os.unlink(tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild')
+            assert next(changes) == {str(tmp_path / 'cat' / 'pkg' / 'pkg-0.ebuild')}
+
+    def test_new_dirs(self, tmp_path):
+        with inotify.Watcher(str(tmp_path), delay=0.01) as watcher:
+            changes = iter(watcher)
+            (tmp_path / 'cat').mkdir()
+            assert next(changes) == {str(tmp_path / 'cat')}
+
+            # newly created dirs are watched
+            (tmp_path / 'cat' / 'pkg').mkdir()
+            (tmp_path / 'cat' / 'pkg' / 'metadata.xml').write_text('')
+            assert next(changes) == {
+                str(tmp_path / 'cat' / 'pkg'),
+                str(tmp_path / 'cat' / 'pkg' / 'metadata.xml'),
+            }
+
+    def test_hidden_dirs(self, tmp_path):
+        (tmp_path / '.git').mkdir()
+        (tmp_path / 'eclass').mkdir()
+        with inotify.Watcher(str(tmp_path), delay=0.01) as watcher:
+            changes = iter(watcher)
+            (tmp_path / '.git' / 'index').write_text('')
+            (tmp_path / 'eclass' / 'foo.eclass').write_text('')
+            assert next(changes) == {str(tmp_path / 'eclass' / 'foo.eclass')}
@@ -0,0 +1,38 @@
+from pkgcheck import base, objects, results
+from pkgcheck.checks import Check, GitCheck, NetworkCheck
+
+
+class TestRegistry:
+
+    def test_keywords(self):
+        for name, cls in objects.KEYWORDS.items():
+            assert issubclass(cls, results.Result)
+            data = objects.KEYWORDS.data(name)
+            assert data['name'] == cls.name
+            assert data['scope'] == cls.scope.desc
+
+        for base_cls in (results.Error, results.Warning, results.Info):
+            path = f'results.{base_cls.__name__}'
+            assert set(objects.KEYWORDS.select(path)) == {
+                k for k, v in objects.KEYWORDS.items() if issubclass(v, base_cls)}
+
+    def test_checks(self):
+        for name, cls in objects.CHECKS.items():
+            assert issubclass(cls, Check)
+            data = objects.CHECKS.data(name)
+            assert data['results'] == tuple(sorted(x.__name__ for x in cls.known_results))
+            for addon in data['addons']:
+                assert issubclass(objects.ADDONS[addon], base.Addon)
+
+        for base_cls in (GitCheck, NetworkCheck):
+            path = f'checks.{base_cls.__name__}'
+            assert set(objects.CHECKS.select(path)) == {
+                k for k, v in objects.CHECKS.items() if issubclass(v, base_cls)}
+
+    def test_argparser(self):
+        checks = {k for k in objects.CHECKS if objects.CHECKS.data(k)['argparser']}
+        assert 'ImlateCheck' in checks
+        assert 'WhitespaceCheck' not in checks
+
+    def test_unknown(self):
+        assert 'NonexistentCheck' not in objects.CHECKS
@@ -1,6 +1,7 @@
 import os
 import shlex
 import shutil
+import signal
 import subprocess
 import tempfile
 from collections import defaultdict
@@ -14,6 +15,7 @@ from pkgcore import const as pkgcore_const
 from pkgcore.ebuild import atom, restricts
 from pkgcore.ebuild.repository import UnconfiguredTree
 from pkgcore.restrictions import packages
+from snakeoil.cli import arghparse
 from snakeoil.contexts import chdir
 from snakeoil.fileutils import touch
 from snakeoil.formatters import PlainTextFormatter
@@ -496,6 +498,51 @@ class TestPkgcheckScan(object):
                     output = self._render_results(unknown_results)
                     pytest.fail(f'{repo} repo has unknown results:\n{output}')
 
+    @pytest.mark.parametrize('jobs', (1, 2, 4))
+    def test_scan_pkg_metadata_errors(self, jobs, capsys, cache_dir):
+        """Verify metadata errors are reported using their original exceptions."""
+        repo_dir = pjoin(self.repos_dir, 'standalone')
+        args = [
+            '-r', repo_dir, '--cache', 'no', '-j', str(jobs), '-R', 'StrReporter',
+            'SourcingCheck/InvalidSlot',
+        ]
+        with patch('sys.argv', self.args + args), \
+                patch('pkgcheck.const.USER_CACHE_DIR', cache_dir):
+            with pytest.raises(SystemExit) as excinfo:
+                self.script()
+            out, err = capsys.readouterr()
+            assert excinfo.value.code == 0
+            assert out.splitlines() == [
+                "SourcingCheck/InvalidSlot-0: invalid SLOT: '?'",
+                "SourcingCheck/InvalidSlot-1: invalid SLOT: '0/1'",
+                "SourcingCheck/InvalidSlot-2: invalid SLOT: '0/-1'",
+                "SourcingCheck/InvalidSlot-3: invalid SLOT: '0/foo?'",
+            ]
+
+    def test_scan_dead_consumer(self, capsys, cache_dir):
+        """Verify scans fail instead of hanging when scanning processes die."""
+        repo_dir = pjoin(self.repos_dir, 'standalone')
+        args = ['-r', repo_dir, '--cache', 'no', '-j', '2', '-c', 'GlobalUseCheck']
+        kill = os.kill
+
+        class Interrupted(Exception):
+            """Replacement for interrupting the test process."""
+
+        def sigint(pid, sig):
+            if sig == signal.SIGINT:
+                assert pid == os.getpid()
+                raise Interrupted
+            kill(pid, sig)
+
+        with patch('sys.argv', self.args + args), \
+                patch('pkgcheck.const.USER_CACHE_DIR', cache_dir), \
+                patch('pkgcheck.pipeline.Pipeline._run_checks', lambda *args: os._exit(1)), \
+                patch('os.kill', sigint):
+            with pytest.raises(Interrupted):
+                self.script()
+            out, err = capsys.readouterr()
+            assert 'scanning process exited unexpectedly' in out
+
     @pytest.mark.parametrize('check, result', results)
     def test_fix(self, check, result, capsys, cache_dir, tmp_path):
         """Apply fixes to pkgs, verifying the related results are fixed."""
@@ -683,3 +730,59 @@ class TestPkgcheckReplay(object):
                     out, err = capsys.readouterr()
                     assert not err
                     assert out == 'profile warning: foo\n'
+
+
+class TestPkgcheckDaemon(object):
+
+    def test_preloaded_scan(self):
+        def mk_options(**kwargs):
+            return arghparse.Namespace(cache={'git': True}, jobs=2, **kwargs)
+
+        # addon values are retained while target related options are replaced
+        preloaded_options = mk_options(
+            restrictions=[], verbosity=0, arches=('amd64',), stable_arches={'amd64'})
+        values = pkgcheck._addon_options(mk_options(arches=('amd64',)))
+        addons_map = {checks.git.GitCheck: object()}
+        with patch.object(pkgcheck, '_preloaded_scans', [(values, preloaded_options, addons_map)]):
+            # other option values lead to addons being initialized for the scan
+            options = mk_options(restrictions=[], arches=('x86',))
+            assert pkgcheck._preloaded_scan(options) == (options, None)
+
+            # while scans that only change targets or don't use all preloaded addons reuse them
+            restrictions = [(base.package_scope, atom.atom('dev-util/foo'))]
+            options, scan_addons = pkgcheck._preloaded_scan(mk_options(restrictions=restrictions))
+            assert options is preloaded_options
+            assert options.restrictions == restrictions
+            assert options.stable_arches == {'amd64'}
+            assert 'verbosity' not in options
+            assert scan_addons == addons_map
+            assert scan_addons is not addons_map
+
+
+class TestPkgcheckWatch(object):
+
+    def test_watch_target(self, tmp_path):
+        repo = arghparse.Namespace(location=str(tmp_path), categories=('cat',))
+
+        def target(*parts):
+            return pkgcheck._watch_target(repo, pjoin(str(tmp_path), *parts))
+
+        assert target() == ''
+        assert target('cat') == 'cat'
+        assert target('cat', 'metadata.xml') == 'cat'
+        assert target('cat', 'pkg', 'files', 'foo.patch') == pjoin('cat', 'pkg')
+        assert target('eclass', 'foo.eclass') == pjoin('eclass', 'foo.eclass')
+        assert target('eclass', 'tests', 'foo.sh') is None
+        assert target('README') is None
+
+        # licenses, repo metadata, and profiles trigger full rescans
+        for parts in (
+                ('licenses', 'GPL-2'),
+                ('metadata', 'layout.conf'),
+                ('metadata', 'dtd', 'metadata.dtd'),
+                ('profiles', 'package.mask'),
+                ('profiles', 'desc', 'foo.desc'),
+                ('profiles', 'default', 'linux', 'make.defaults')):
+            assert target(*parts) == ''
+        # while regenerated metadata cache entries are skipped
+        assert target('metadata', 'md5-cache', 'cat', 'pkg-1') is None
@@ -8,9 +8,28 @@ import pytest
 from snakeoil.formatters import PlainTextFormatter
 
 from pkgcheck import base, reporters, results
+from pkgcheck.pipeline import SequencedResults
 from pkgcheck.checks import pkgdir, profiles, metadata, metadata_xml, git
 
 
+class _FakePipe:
+    """Pipeline stub queuing predefined task results in arrival order."""
+
+    pkg_scan = False
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.released = 0
+
+    def run(self, results_q):
+        for results in self.tasks:
+            results_q.put(results)
+        results_q.put(None)
+
+    def release(self, tasks=1):
+        self.released += tasks
+
+
 class BaseReporter(object):
 
     reporter_cls = reporters.Reporter
@@ -64,6 +83,26 @@ class TestStrReporter(BaseReporter):
     """)
     filtered_report_output = """profile error\n"""
 
+    def test_ordered_stream(self, capsys):
+        pkgs = [FakePkg(f'dev-libs/{x}-0') for x in ('a', 'b', 'c')]
+        pipe = _FakePipe([
+            SequencedResults(2, [metadata.BadFilename(('2.tar.gz',), pkg=pkgs[2])]),
+            [self.log_warning],
+            SequencedResults(1),
+            SequencedResults(0, [metadata.BadFilename(('0.tar.gz',), pkg=pkgs[0])]),
+        ])
+        with self.mk_reporter() as reporter:
+            reporter(pipe)
+        out, err = capsys.readouterr()
+        assert not err
+        # sequenced results are output in task order, with deferred results last
+        assert out == dedent("""\
+            dev-libs/a-0: bad filename: [ 0.tar.gz ]
+            dev-libs/c-0: bad filename: [ 2.tar.gz ]
+            profile warning
+        """)
+        assert pipe.released == 3
+
 
 class TestFancyReporter(BaseReporter):
 
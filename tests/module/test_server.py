@@ -0,0 +1,119 @@
+import os
+import socket
+
+import pytest
+from pkgcore.ebuild import repo_objs, repository
+from snakeoil.cli.exceptions import UserException
+
+from pkgcheck import server
+
+
+class TestRequests:
+
+    def test_roundtrip(self):
+        request = {'args': ['-k', 'Foo', 'cat/pkg'], 'cwd': '/', 'env': {'FOO': 'x' * 10000}}
+        parent, child = socket.socketpair()
+        with parent, child:
+            server._send_request(parent, request)
+            received, fds = server._recv_request(child)
+        assert received == request
+        assert len(fds) == 3
+        for i, fd in enumerate(fds):
+            assert os.path.sameopenfile(fd, i)
+            os.close(fd)
+
+    def test_missing_daemon(self, tmp_path):
+        with pytest.raises(UserException, match='failed connecting'):
+            server.client([], str(tmp_path / 'daemon.sock'))
+
+
+class FakeRepo:
+
+    def __init__(self, location, categories=()):
+        self.location = location
+        self.categories = categories
+        self.packages = {}
+
+
+class FakeConfig:
+
+    def __init__(self, repos):
+        self.repos = repos
+
+    def get_default(self, key):
+        return self
+
+    @property
+    def ebuild_repos_raw(self):
+        return self.repos
+
+
+class TestScanDaemon:
+
+    def test_refresh(self, tmp_path):
+        (tmp_path / 'cat').mkdir()
+        configs = []
+
+        def load_config():
+            configs.append(FakeConfig([FakeRepo(str(tmp_path), ('cat',))]))
+            return configs[-1]
+
+        scan_daemon = server.ScanDaemon(str(tmp_path / 'daemon.sock'), load_config, None)
+        scan_daemon.refresh()
+        assert scan_daemon.config is configs[0]
+
+        # unchanged repo state keeps the preloaded config
+        scan_daemon.refresh()
+        assert len(configs) == 1
+
+        # adding a package triggers reloading
+        (tmp_path / 'cat' / 'pkg').mkdir()
+        os.utime(tmp_path / 'cat', ns=(0, 0))
+        scan_daemon.refresh()
+        assert len(configs) == 2
+        assert scan_daemon.config is configs[1]
+
+    def test_preload(self, tmp_path):
+        (tmp_path / 'profiles').mkdir()
+        (tmp_path / 'profiles' / 'package.mask').write_text('')
+        preloaded = []
+        config = FakeConfig([FakeRepo(str(tmp_path))])
+        scan_daemon = server.ScanDaemon(
+            str(tmp_path / 'daemon.sock'), lambda: config, None, preloaded.append)
+        scan_daemon.refresh()
+        assert preloaded == [config.repos]
+
+        # profile changes trigger reloading since they're used by preloaded addons
+        os.utime(tmp_path / 'profiles' / 'package.mask', ns=(0, 0))
+        scan_daemon.refresh()
+        assert len(preloaded) == 2
+
+    def test_new_version(self, tmp_path):
+        repo_dir = tmp_path / 'repo'
+        for d in ('metadata', 'profiles', 'cat/pkg'):
+            (repo_dir / d).mkdir(parents=True)
+        (repo_dir / 'metadata' / 'layout.conf').write_text('masters=\n')
+        (repo_dir / 'profiles' / 'repo_name').write_text('test\n')
+        (repo_dir / 'profiles' / 'categories').write_text('cat\n')
+        (repo_dir / 'cat' / 'pkg' / 'pkg-0.ebuild').write_text('EAPI=7\nSLOT=0\n')
+
+        def load_config():
+            repo_config = repo_objs.RepoConfig(location=str(repo_dir))
+            return FakeConfig([repository.UnconfiguredTree(str(repo_dir), repo_config=repo_config)])
+
+        def preload(repos):
+            # populate cached versions as done by cache updates
+            for repo in repos:
+                tuple(repo.versions.values())
+
+        scan_daemon = server.ScanDaemon(str(tmp_path / 'daemon.sock'), load_config, None, preload)
+        scan_daemon.refresh()
+        repo = scan_daemon._repos[0]
+        assert repo.versions[('cat', 'pkg')] == ('0',)
+
+        # versions added while the daemon is running are picked up
+        (repo_dir / 'cat' / 'pkg' / 'pkg-1.ebuild').write_text('EAPI=7\nSLOT=0\n')
+        os.utime(repo_dir / 'cat' / 'pkg', ns=(0, 0))
+        scan_daemon.refresh()
+        assert scan_daemon._repos[0] is not repo
+        assert sorted(scan_daemon._repos[0].versions[('cat', 'pkg')]) == ['0', '1']
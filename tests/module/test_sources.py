@@ -0,0 +1,215 @@
+import mmap
+
+import pytest
+from pkgcore.ebuild import repo_objs, repository
+from pkgcore.ebuild.cpv import VersionedCPV
+from pkgcore.restrictions import packages
+from snakeoil.data_source import local_source, text_data_source
+
+from pkgcheck import sources
+
+from .misc import Options
+
+
+class FakeEbuildPkg:
+
+    def __init__(self, ebuild):
+        self.ebuild = ebuild
+
+
+class TestSourcePkg:
+
+    def mk_pkg(self, tmp_path, data):
+        path = tmp_path / 'foo-0.ebuild'
+        path.write_bytes(data)
+        return sources._SourcePkg(FakeEbuildPkg(local_source(str(path))))
+
+    def test_empty(self, tmp_path):
+        pkg = self.mk_pkg(tmp_path, b'')
+        assert pkg.data == b''
+        assert pkg.text == ''
+        assert pkg.line_offsets == ()
+        assert tuple(pkg.lines) == ()
+
+    def test_lines(self, tmp_path):
+        pkg = self.mk_pkg(tmp_path, b'EAPI=7\n\nDESCRIPTION="foo"\n')
+        assert pkg.data[:6] == b'EAPI=7'
+        assert pkg.text == 'EAPI=7\n\nDESCRIPTION="foo"\n'
+        assert pkg.line_offsets == (0, 7, 8)
+        assert tuple(pkg.lines) == ('EAPI=7\n', '\n', 'DESCRIPTION="foo"\n')
+        assert len(pkg.lines) == 3
+        assert pkg.lines[-1] == 'DESCRIPTION="foo"\n'
+        assert pkg.lines[:2] == ('EAPI=7\n', '\n')
+        with pytest.raises(IndexError):
+            pkg.lines[3]
+
+    def test_no_final_newline(self, tmp_path):
+        pkg = self.mk_pkg(tmp_path, b'EAPI=7\nSLOT=0')
+        assert tuple(pkg.lines) == ('EAPI=7\n', 'SLOT=0')
+
+    def test_universal_newlines(self, tmp_path):
+        pkg = self.mk_pkg(tmp_path, b'EAPI=7\r\nSLOT=0\rKEYWORDS=""\n')
+        assert pkg.line_offsets == (0, 8, 15)
+        assert tuple(pkg.lines) == ('EAPI=7\n', 'SLOT=0\n', 'KEYWORDS=""\n')
+
+    def test_unicode(self, tmp_path):
+        data = 'DESCRIPTION="föö bar"\n'
+        pkg = self.mk_pkg(tmp_path, data.encode())
+        assert pkg.text == data
+        assert tuple(pkg.lines) == (data,)
+
+    def test_matches_text_fileobj(self, tmp_path):
+        data = 'a\n\x0bb\x0c\n c\n\n'
+        pkg = self.mk_pkg(tmp_path, data.encode())
+        with pkg.ebuild.text_fileobj() as f:
+            assert tuple(pkg.lines) == tuple(f)
+
+    def test_non_local_source(self):
+        pkg = sources._SourcePkg(FakeEbuildPkg(text_data_source('a\nb\n')))
+        assert pkg.text == 'a\nb\n'
+        assert tuple(pkg.lines) == ('a\n', 'b\n')
+
+    def test_mmap(self, tmp_path):
+        # small files are read into memory
+        pkg = self.mk_pkg(tmp_path, b'EAPI=7\n')
+        assert isinstance(pkg.data, bytes)
+
+        data = b'EAPI=7\n' + b'#' * sources._SourcePkg.mmap_size + b'\n'
+        pkg = self.mk_pkg(tmp_path, data)
+        assert isinstance(pkg.data, mmap.mmap)
+        assert pkg.data[:] == data
+        assert len(pkg.lines) == 2
+
+    def test_close(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sources._SourcePkg, 'mmap_size', 1)
+        pkg = self.mk_pkg(tmp_path, b'EAPI=7\n')
+        data = pkg.data
+        lines = pkg.lines
+        assert lines[0] == 'EAPI=7\n'
+        pkg.close()
+        assert data.closed
+        # closed packages read their file into memory on access
+        assert pkg.data == b'EAPI=7\n'
+        assert isinstance(pkg.data, bytes)
+        assert tuple(pkg.lines) == ('EAPI=7\n',)
+        pkg.close()
+
+
+class FakeRepo:
+
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def itermatch(self, restrict, **kwargs):
+        return iter(self.pkgs)
+
+
+class TestFusedPkgs:
+
+    def test_views(self):
+        pkgs = [FakeEbuildPkg(text_data_source('a\n')), FakeEbuildPkg(text_data_source('b\n'))]
+        fused_pkgs = sources._FusedPkgs()
+
+        # views aren't cached outside of tasks
+        assert fused_pkgs.view(sources._SourcePkg, pkgs[0]) is not \
+            fused_pkgs.view(sources._SourcePkg, pkgs[0])
+
+        with fused_pkgs(FakeRepo(pkgs), None) as task_pkgs:
+            assert task_pkgs == tuple(pkgs)
+            view = fused_pkgs.view(sources._SourcePkg, pkgs[0])
+            assert tuple(view.lines) == ('a\n',)
+            assert fused_pkgs.view(sources._SourcePkg, pkgs[0]) is view
+            assert fused_pkgs.view(sources._SourcePkg, pkgs[1]) is not view
+
+        # cached views are closed and dropped when tasks finish
+        assert view._data is None
+        assert fused_pkgs.view(sources._SourcePkg, pkgs[0]) is not view
+
+    def test_active(self):
+        fused_pkgs = sources._FusedPkgs()
+        assert not fused_pkgs.active
+        with fused_pkgs(FakeRepo([]), None):
+            assert fused_pkgs.active
+        assert not fused_pkgs.active
+
+
+class TestInitSource:
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        repo_dir = tmp_path / 'repo'
+        (repo_dir / 'metadata').mkdir(parents=True)
+        (repo_dir / 'metadata' / 'layout.conf').write_text('masters=\n')
+        (repo_dir / 'profiles').mkdir()
+        (repo_dir / 'profiles' / 'repo_name').write_text('test\n')
+        (repo_dir / 'profiles' / 'categories').write_text('cat\n')
+        (repo_dir / 'cat' / 'pkg').mkdir(parents=True)
+        (repo_dir / 'cat' / 'pkg' / 'pkg-0.ebuild').write_text(
+            'EAPI=7\nSLOT=0\nKEYWORDS="~amd64"\n')
+        # ebuild with a bad SLOT
+        (repo_dir / 'cat' / 'pkg' / 'pkg-1.ebuild').write_text(
+            'EAPI=7\nSLOT=""\nKEYWORDS="~x86"\n')
+        repo_config = repo_objs.RepoConfig(location=str(repo_dir))
+        self.repo = repository.UnconfiguredTree(str(repo_dir), repo_config=repo_config)
+        self.options = Options(target_repo=self.repo, filter=None)
+
+    def test_sourced(self):
+        source = sources.init_source(sources.RepoSource, self.options)
+        assert source.sourced
+        errors = []
+        pkgs = list(source.itermatch(packages.AlwaysTrue, error_callback=errors.append))
+        assert [x.cpvstr for x in pkgs] == ['cat/pkg-0']
+        assert [x.attr for x in errors] == ['slot']
+
+    def test_cpv(self):
+        source = sources.init_source(
+            sources.RepoSource, self.options, pkg_attrs=frozenset(['fullver']))
+        assert not source.sourced
+        errors = []
+        pkgs = list(source.itermatch(packages.AlwaysTrue, error_callback=errors.append))
+        assert all(isinstance(x, VersionedCPV) for x in pkgs)
+        # packages with bad metadata are filtered
+        assert [x.fullver for x in pkgs] == ['0']
+        assert [x.attr for x in errors] == ['slot']
+
+        # and previously masked packages aren't revalidated
+        pkgs = list(source.itermatch(packages.AlwaysTrue, error_callback=errors.append))
+        assert [x.fullver for x in pkgs] == ['0']
+        assert errors[0] is errors[1]
+
+    def test_cached(self):
+        source = sources.init_source(
+            sources.RepoSource, self.options, pkg_attrs=frozenset(['keywords']))
+        assert not source.sourced
+        pkgs = list(source.itermatch(packages.AlwaysTrue))
+        assert [x.keywords for x in pkgs] == [('~amd64',), ('~x86',)]
+
+        # packages with bad metadata for used attributes are filtered
+        source = sources.init_source(
+            sources.RepoSource, self.options, pkg_attrs=frozenset(['keywords', 'slot']))
+        errors = []
+        pkgs = list(source.itermatch(packages.AlwaysTrue, error_callback=errors.append))
+        assert [x.cpvstr for x in pkgs] == ['cat/pkg-0']
+        assert [x.attr for x in errors] == ['slot']
+
+    def test_unknown_attrs(self):
+        source = sources.init_source(
+            sources.RepoSource, self.options, pkg_attrs=frozenset(['environment']))
+        assert source.sourced
+
+    def test_wrapped(self):
+        # wrapped sources use attributes required by their wrappers
+        source = sources.init_source(
+            (sources.PackageRepoSource, (), (('source', sources.RepoSource),)),
+            self.options, pkg_attrs=frozenset(['fullver']))
+        assert not source.sourced
+        self.options['filter'] = 'latest'
+        source = sources.init_source(
+            (sources.PackageRepoSource, (), (('source', sources.RepoSource),)),
+            self.options, pkg_attrs=frozenset(['fullver']))
+        assert not source.sourced
+        assert [[x.fullver for x in pkgs] for pkgs in source.itermatch(packages.AlwaysTrue)] == [['0']]
+        source = sources.init_source(
+            (sources.RestrictionRepoSource, (packages.AlwaysTrue,)),
+            self.options, pkg_attrs=frozenset(['fullver']))
+        assert source.sourced